@@ -1,45 +1,71 @@
 import time
 
+from metrics import METRICS, timed
+from password_engine import DEFAULT_USER, PasswordEngine
+
 SECUENCIA_CORRECTA = ['A', 'C', 'D', 'B']
 TIEMPO_RESET = 5.0   # segundos sin patrón para borrar buffer
 
 
 class DetectorContrasena:
-    def __init__(self, secuencia_correcta, tiempo_reset=5.0):
-        self.secuencia_correcta = secuencia_correcta
+    """
+    Desbloquea cuando los últimos patrones observados forman la
+    secuencia de algún usuario.
+
+    Con secuencia_correcta hay un único usuario (DEFAULT_USER);
+    con engine se comparte un PasswordEngine con cientos de usuarios
+    (y entre varias estaciones). usuario indica quién ha desbloqueado.
+
+    update() usa time.time() salvo que se le pase el instante del
+    frame (p. ej. el timestamp grabado al reproducir una sesión).
+    """
+
+    def __init__(self, secuencia_correcta=None, tiempo_reset=5.0, engine=None):
+        if engine is None:
+            engine = PasswordEngine({DEFAULT_USER: secuencia_correcta})
+        self.engine = engine
         self.tiempo_reset = tiempo_reset
-        self.buffer = []
         self.unlocked = False
-        self._ultimo_tiempo = time.time()
+        self.usuario = None
+        self._matcher = engine.matcher()
+        self._ultimo_tiempo = None
+
+    @property
+    def secuencia_correcta(self):
+        return list(self.engine.default_sequence())
+
+    @property
+    def buffer(self):
+        # Parte de alguna secuencia reconocida hasta ahora
+        return list(self._matcher.prefix)
 
     def reset(self):
-        self.buffer = []
+        self._matcher.reset()
         self.unlocked = False
-        self._ultimo_tiempo = time.time()
+        self.usuario = None
+        self._ultimo_tiempo = None
 
-    def update(self, patron_detectado):
-        ahora = time.time()
+    @timed("password.update")
+    def update(self, patron_detectado, ahora=None):
+        if ahora is None:
+            ahora = time.time()
 
-        if ahora - self._ultimo_tiempo > self.tiempo_reset:
-            self.buffer = []
+        # Sin update previo el buffer ya está vacío
+        if self._ultimo_tiempo is not None and ahora - self._ultimo_tiempo > self.tiempo_reset:
+            self._matcher.reset()
 
         self._ultimo_tiempo = ahora
 
         if patron_detectado is None:
             return
 
-        if patron_detectado not in self.secuencia_correcta:
-            self.buffer = []
-            return
-
-        self.buffer.append(patron_detectado)
-
-        if len(self.buffer) > len(self.secuencia_correcta):
-            self.buffer.pop(0)
-
-        if self.buffer == self.secuencia_correcta:
+        # Un patrón que no aparece en ninguna secuencia devuelve el
+        # autómata a la raíz (equivale a vaciar el buffer)
+        usuarios = self._matcher.feed(patron_detectado)
+        if usuarios:
             self.unlocked = True
-            self.buffer = []
+            self.usuario = usuarios[0]
+            METRICS.inc("unlocks")
 
     def esta_desbloqueado(self):
         return self.unlocked
@@ -0,0 +1,241 @@
+# batch_detect.py
+#
+# Detección offline sobre carpetas de imágenes o vídeos grabados,
+# repartida en un ProcessPoolExecutor. Los resultados se escriben en
+# orden de frame y de forma incremental (JSONL o CSV), así que la
+# memoria no crece con la longitud de la entrada.
+#
+# Ejemplos (desde la raíz del repositorio):
+#   python src/batch_detect.py "data/*.jpg" -o resultados.jsonl
+#   python src/batch_detect.py sesion.mp4 --detector pattern --format csv
+#
+# --detector acepta cualquier detector de detectors.REGISTRY.
+
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+
+from detectors import REGISTRY, result_fields, worker_detector
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+FIELDS = ["frame", "source", "label", "area", "cx", "cy", "ms"]
+
+
+# ----------------------------
+# Entradas
+# ----------------------------
+
+def expand_inputs(inputs: List[str]) -> List[str]:
+    """
+    Expande globs y carpetas a una lista ordenada de ficheros.
+    Los vídeos se dejan tal cual.
+    """
+    paths: List[str] = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(
+                os.path.join(item, name) for name in os.listdir(item)
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+            ))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item)))
+        else:
+            paths.append(item)
+    return paths
+
+
+def _is_video(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def iter_chunks(paths: List[str], chunk_size: int) -> Iterator[Tuple[int, List[Tuple[str, Any]]]]:
+    """
+    Genera (id_primer_frame, [(origen, ruta o frame), ...]).
+    Las imágenes viajan como ruta (las decodifica el worker);
+    los vídeos se decodifican aquí, un trozo cada vez.
+    """
+    frame_id = 0
+    chunk: List[Tuple[str, Any]] = []
+
+    def flush():
+        nonlocal frame_id, chunk
+        task = (frame_id, chunk)
+        frame_id += len(chunk)
+        chunk = []
+        return task
+
+    for path in paths:
+        if not _is_video(path):
+            chunk.append((path, path))
+            if len(chunk) >= chunk_size:
+                yield flush()
+            continue
+
+        cap = cv2.VideoCapture(path)
+        idx = 0
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                chunk.append((f"{path}#{idx}", frame))
+                idx += 1
+                if len(chunk) >= chunk_size:
+                    yield flush()
+        finally:
+            cap.release()
+
+    if chunk:
+        yield flush()
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+
+def _init_worker():
+    # Un hilo de OpenCV por proceso: el paralelismo lo da el pool
+    cv2.setNumThreads(1)
+
+
+def _detect_one(frame, options: Dict[str, Any]) -> Tuple[Optional[str], Optional[float], Optional[Tuple[int, int]]]:
+    detector = worker_detector(options["detector"], options["min_area"], options["pyramid_scale"], options["bgr_lut"])
+    fields = result_fields(detector(frame))
+    return fields["label"], fields.get("area"), fields.get("center")
+
+
+def _detect_chunk(task: Tuple[int, List[Tuple[str, Any]]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    first_id, items = task
+    records = []
+    for offset, (source, item) in enumerate(items):
+        t0 = time.perf_counter()
+        frame = cv2.imread(item) if isinstance(item, str) else item
+        if frame is None:
+            label, area, center = None, None, None
+        else:
+            label, area, center = _detect_one(frame, options)
+        records.append({
+            "frame": first_id + offset,
+            "source": source,
+            "label": label,
+            "area": area,
+            "cx": center[0] if center is not None else None,
+            "cy": center[1] if center is not None else None,
+            "ms": round(1000 * (time.perf_counter() - t0), 3),
+        })
+    return records
+
+
+# ----------------------------
+# Ejecución
+# ----------------------------
+
+def run_batch(
+    paths: List[str],
+    options: Dict[str, Any],
+    workers: Optional[int] = None,
+    chunk_size: int = 16
+) -> Iterator[Dict[str, Any]]:
+    """
+    Genera los registros en el orden original de los frames. Como
+    mucho hay 2 * workers trozos en vuelo, así que la memoria se
+    mantiene acotada aunque la entrada sea muy larga.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending: deque = deque()
+        for task in iter_chunks(paths, chunk_size):
+            pending.append(pool.submit(_detect_chunk, task, options))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class _JsonlWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record: Dict[str, Any]):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class _CsvWriter:
+    def __init__(self, stream):
+        self.writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        self.writer.writeheader()
+
+    def write(self, record: Dict[str, Any]):
+        self.writer.writerow(record)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detección por lotes sobre imágenes o vídeos.")
+    parser.add_argument("inputs", nargs="+", help="globs (\"data/*.jpg\"), carpetas o ficheros de vídeo")
+    parser.add_argument("--detector", choices=sorted(REGISTRY), default="color",
+                        help="color = detect_color_shape, pattern = main.detect_pattern, letter = utils.detect_pattern")
+    parser.add_argument("-o", "--output", default="-", help="fichero de salida (- = stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None,
+                        help="por defecto según la extensión de --output (jsonl si no)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--min-area", type=float, default=None,
+                        help="área mínima del objeto, para cualquier --detector "
+                             "(por defecto, la de cada uno: color 1000, pattern 800, letter 1000)")
+    parser.add_argument("--pyramid-scale", type=float, default=1.0)
+    parser.add_argument("--bgr-lut", action="store_true", help="etiquetado directo BGR (sólo --detector color)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("No se han encontrado entradas.", file=sys.stderr)
+        return 1
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.output.lower().endswith(".csv") else "jsonl"
+
+    options = {
+        "detector": args.detector,
+        "min_area": args.min_area,
+        "pyramid_scale": args.pyramid_scale,
+        "bgr_lut": args.bgr_lut,
+    }
+
+    stream = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    writer = _CsvWriter(stream) if fmt == "csv" else _JsonlWriter(stream)
+
+    t0 = time.perf_counter()
+    n = 0
+    try:
+        for record in run_batch(paths, options, args.workers, args.chunk_size):
+            writer.write(record)
+            n += 1
+            if n % 100 == 0:
+                stream.flush()
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    elapsed = time.perf_counter() - t0
+    print(f"{n} frames en {elapsed:.1f} s ({n / elapsed:.1f} fps)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
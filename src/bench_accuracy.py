@@ -0,0 +1,289 @@
+# bench_accuracy.py
+#
+# Velocidad y precisión juntas sobre escenas sintéticas
+# (synthetic_scenes.py): detecciones por segundo y precision / recall
+# por etiqueta para cada detector, con las mismas escenas para todos.
+# Así una optimización que gana velocidad perdiendo aciertos se ve en
+# la misma tabla.
+#
+# Emparejamiento por escena: una detección acierta si su centro cae
+# dentro del bounding box de un objeto (con un margen) y la etiqueta
+# coincide. Con detectores que devuelven un solo patrón la referencia
+# es el objeto dominante; con los que devuelven candidatos
+# ("candidates") son todos los objetos, lo que mide _classify_shape en
+# cada figura.
+#
+# Ejemplos (desde la raíz del repositorio):
+#   python src/bench_accuracy.py --frames 2000 -o acc_base.json
+#   python src/bench_accuracy.py --detectors default,bgr_lut,pyramid --noise 8 --blur 1.2
+#   python src/bench_accuracy.py --baseline acc_base.json --max-drop 0.02
+
+from __future__ import annotations
+from collections import Counter
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from color_shape_detector import ColorShapeDetector, _find_candidates, detect_color_shape
+from synthetic_scenes import GroundTruth, SceneConfig, generate_scenes
+
+MATCH_MARGIN = 4   # píxeles de holgura alrededor del bounding box
+
+# Cada entrada crea el detector: frame -> DetectedPattern | None | lista
+DETECTORS: Dict[str, Callable[[], Callable]] = {
+    "default": lambda: detect_color_shape,
+    "bgr_lut": lambda: partial(detect_color_shape, use_bgr_lut=True),
+    "pyramid": lambda: partial(detect_color_shape, pyramid_scale=0.5),
+    "prealloc": lambda: ColorShapeDetector(),
+    "candidates": lambda: partial(_find_candidates, min_area=1000.0),
+}
+
+
+def _tiled():
+    from tiled_detector import TiledColorShapeDetector
+    return TiledColorShapeDetector()
+
+
+DETECTORS["tiled"] = _tiled
+
+
+# ----------------------------
+# Emparejamiento y recuento
+# ----------------------------
+
+def _inside(center: Tuple[int, int], obj: GroundTruth) -> bool:
+    x, y, w, h = obj.bbox
+    cx, cy = center
+    m = MATCH_MARGIN
+    return x - m <= cx <= x + w + m and y - m <= cy <= y + h + m
+
+
+def match_scene(predictions: Sequence[Any], truths: Sequence[GroundTruth]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Pares (etiqueta detectada, etiqueta real); None en un lado si la
+    detección no corresponde a ningún objeto o el objeto no se detectó.
+    """
+    pairs = []
+    free = list(truths)
+    for p in sorted(predictions, key=lambda p: p.area, reverse=True):
+        hit = next((o for o in free if _inside(p.center, o)), None)
+        if hit is None:
+            pairs.append((p.label, None))
+        else:
+            free.remove(hit)
+            pairs.append((p.label, hit.label))
+    pairs.extend((None, o.label) for o in free)
+    return pairs
+
+
+class Tally:
+    """Aciertos, falsos positivos y falsos negativos por etiqueta."""
+
+    def __init__(self):
+        self.tp: Counter = Counter()
+        self.fp: Counter = Counter()
+        self.fn: Counter = Counter()
+        self.confusions: Counter = Counter()
+
+    def add(self, pairs: List[Tuple[Optional[str], Optional[str]]]):
+        for predicted, truth in pairs:
+            if predicted is not None and predicted == truth:
+                self.tp[predicted] += 1
+                continue
+            if predicted is not None:
+                self.fp[predicted] += 1
+            if truth is not None:
+                self.fn[truth] += 1
+            self.confusions[(truth, predicted)] += 1
+
+    def per_label(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        for label in sorted(set(self.tp) | set(self.fp) | set(self.fn)):
+            tp, fp, fn = self.tp[label], self.fp[label], self.fn[label]
+            stats[label] = _prf(tp, fp, fn)
+        stats["all"] = _prf(sum(self.tp.values()), sum(self.fp.values()), sum(self.fn.values()))
+        return stats
+
+
+def _prf(tp: int, fp: int, fn: int) -> Dict[str, float]:
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "tp": tp, "fp": fp, "fn": fn,
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+    }
+
+
+# ----------------------------
+# Ejecución
+# ----------------------------
+
+def evaluate(
+    detect_fn: Callable,
+    config: SceneConfig,
+    frames: int,
+    seed: int = 0
+) -> Tuple[Dict[str, Any], Tally]:
+    """
+    Pasa detect_fn por frames escenas. Sólo se cronometra la llamada al
+    detector; el render se mide aparte.
+    """
+    tally = Tally()
+    detect_s = 0.0
+    t_start = time.perf_counter()
+    scenes = generate_scenes(config, frames, seed)
+
+    detect_fn(next(generate_scenes(config, 1, seed + 1)).frame)   # calentamiento (LUTs)
+    for scene in scenes:
+        t0 = time.perf_counter()
+        result = detect_fn(scene.frame)
+        detect_s += time.perf_counter() - t0
+
+        if isinstance(result, list):
+            predictions, truths = result, scene.objects
+        else:
+            predictions = [] if result is None else [result]
+            truths = [] if scene.dominant is None else [scene.dominant]
+        tally.add(match_scene(predictions, truths))
+
+    total_s = time.perf_counter() - t_start
+    speed = {
+        "frames": frames,
+        "detect_ms": round(1000 * detect_s / frames, 3),
+        "detections_per_s": round(frames / detect_s, 1) if detect_s > 0 else None,
+        "render_ms": round(1000 * (total_s - detect_s) / frames, 3),
+    }
+    return speed, tally
+
+
+def compare(results: Dict, baseline: Dict, max_drop: float, threshold: float) -> List[str]:
+    """
+    Regresiones respecto a la referencia: precision / recall por
+    etiqueta que bajan más de max_drop (absoluto) o detecciones por
+    segundo que bajan más de threshold (relativo).
+    """
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for label, s in cur["labels"].items():
+            b = base["labels"].get(label)
+            if not b:
+                continue
+            for metric in ("precision", "recall"):
+                if s[metric] < b[metric] - max_drop:
+                    regressions.append(f"{name} {label}: {metric} {b[metric]:.3f} -> {s[metric]:.3f}")
+        b_dps, c_dps = base["speed"].get("detections_per_s"), cur["speed"].get("detections_per_s")
+        if b_dps and c_dps and c_dps < b_dps * (1.0 - threshold):
+            regressions.append(f"{name}: detecciones/s {b_dps:.1f} -> {c_dps:.1f}")
+    return regressions
+
+
+def print_table(name: str, speed: Dict[str, Any], labels: Dict[str, Dict[str, float]], tally: Tally):
+    print(f"\n== {name}: {speed['detections_per_s']} detecciones/s "
+          f"({speed['detect_ms']:.2f} ms/frame, render {speed['render_ms']:.2f} ms)")
+    print(f"{'etiqueta':20s} {'tp':>6s} {'fp':>6s} {'fn':>6s} {'prec':>7s} {'recall':>7s} {'f1':>7s}")
+    for label, s in labels.items():
+        print(f"{label:20s} {s['tp']:6d} {s['fp']:6d} {s['fn']:6d} "
+              f"{s['precision']:7.3f} {s['recall']:7.3f} {s['f1']:7.3f}")
+    worst = tally.confusions.most_common(3)
+    if worst:
+        print("errores más frecuentes (real -> detectado):",
+              ", ".join(f"{t} -> {p} x{n}" for (t, p), n in worst))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Precisión y velocidad sobre escenas sintéticas")
+    parser.add_argument("--detectors", default="default,prealloc,bgr_lut,pyramid",
+                        help="lista separada por comas de: " + ",".join(DETECTORS))
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--noise", type=float, default=4.0)
+    parser.add_argument("--blur", type=float, default=0.0)
+    parser.add_argument("--lighting", type=float, default=0.2)
+    parser.add_argument("--distractors", type=float, default=20.0, help="por megapíxel")
+    parser.add_argument("--rotation", type=float, default=45.0, help="giro máximo de las figuras (grados)")
+    parser.add_argument("-o", "--output", default=None, help="guardar resultados en JSON")
+    parser.add_argument("--baseline", default=None, help="JSON de una ejecución anterior")
+    parser.add_argument("--max-drop", type=float, default=0.02,
+                        help="bajada absoluta de precision/recall que se marca como regresión")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="bajada relativa de detecciones/s que se marca como regresión")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.frames < 1:
+        print("--frames debe ser al menos 1")
+        return 1
+    names = [n.strip() for n in args.detectors.split(",") if n.strip()]
+    unknown = [n for n in names if n not in DETECTORS]
+    if unknown:
+        print("Detectores desconocidos:", ", ".join(unknown))
+        return 1
+
+    config = SceneConfig(
+        width=args.width, height=args.height, noise=args.noise, blur=args.blur,
+        lighting=args.lighting, distractors=args.distractors, rotation=args.rotation,
+    )
+    print(f"{args.frames} escenas {args.width}x{args.height}, semilla {args.seed}")
+
+    results = {}
+    for name in names:
+        detector = DETECTORS[name]()
+        try:
+            speed, tally = evaluate(detector, config, args.frames, args.seed)
+        finally:
+            if hasattr(detector, "close"):
+                detector.close()
+        labels = tally.per_label()
+        results[name] = {"speed": speed, "labels": labels}
+        print_table(name, speed, labels, tally)
+
+    if args.output:
+        report = {
+            "meta": {
+                "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "frames": args.frames,
+                "seed": args.seed,
+                "config": {k: v for k, v in vars(config).items() if k not in ("colors", "shapes")},
+                "python": platform.python_version(),
+                "opencv": cv2.__version__,
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+            },
+            "detectors": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print("\nResultados guardados en", args.output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["detectors"]
+        regressions = compare(results, baseline, args.max_drop, args.threshold)
+        if regressions:
+            print("\nREGRESIONES:")
+            for r in regressions:
+                print(" ", r)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# bench_pyramid.py
+#
+# Tabla resolución / velocidad / precisión del modo pirámide sobre
+# data/*.jpg. La referencia es el mismo detector a escala 1.0.
+#
+# Uso (desde la raíz del repositorio):
+#   python src/bench_pyramid.py [patrón] [factor_upscale ...]
+
+import glob
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import main as main_mod
+import utils
+from color_shape_detector import detect_color_shape
+
+SCALES = [1.0, 0.5, 0.25]
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def _run_color(frame, scale):
+    p, dt = _timed(detect_color_shape, frame, 1000.0, False, scale)
+    if p is None:
+        return (None, None, None), dt
+    return (p.label, p.center, p.area), dt
+
+
+def _run_utils(frame, scale):
+    letra, dt = _timed(utils.detect_pattern, frame, scale)
+    # Centro y área sólo para medir la precisión (fuera del tiempo)
+    c, area, _ = utils.find_largest_contour(frame, 1000, scale)
+    if c is None:
+        return (letra, None, None), dt
+    x, y, w, h = cv2.boundingRect(c)
+    return (letra, (x + w // 2, y + h // 2), area), dt
+
+
+def _run_main(frame, scale):
+    (letra, _, bbox), dt = _timed(main_mod.detect_pattern, frame, scale)
+    if bbox is None:
+        return (letra, None, None), dt
+    x, y, w, h = bbox
+    return (letra, (x + w // 2, y + h // 2), None), dt
+
+
+DETECTORS = {
+    "detect_color_shape": _run_color,
+    "utils.detect_pattern": _run_utils,
+    "main.detect_pattern": _run_main,
+}
+
+
+def main(pattern="data/*.jpg", *upscales):
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        print("No se han encontrado imágenes en", pattern)
+        return 1
+    upscales = [float(u) for u in upscales] or [1.0, 2.0]
+    images = [cv2.imread(p) for p in paths]
+
+    print("| detector | resolución | escala | ms/frame | misma etiqueta | error centro (px) | error área |")
+    print("|---|---|---|---|---|---|---|")
+
+    for up in upscales:
+        frames = images if up == 1.0 else [
+            cv2.resize(img, None, fx=up, fy=up, interpolation=cv2.INTER_LINEAR) for img in images
+        ]
+        h, w = frames[0].shape[:2]
+
+        for name, run in DETECTORS.items():
+            reference = None
+            for scale in SCALES:
+                runs = [run(f, scale) for f in frames]
+                results = [r for r, _ in runs]
+                ms = 1000 * sum(dt for _, dt in runs) / len(frames)
+
+                if reference is None:
+                    reference = results
+
+                same = sum(r[0] == ref[0] for r, ref in zip(results, reference))
+                center_err = [
+                    np.hypot(r[1][0] - ref[1][0], r[1][1] - ref[1][1])
+                    for r, ref in zip(results, reference)
+                    if r[1] is not None and ref[1] is not None
+                ]
+                area_err = [
+                    abs(r[2] - ref[2]) / ref[2]
+                    for r, ref in zip(results, reference)
+                    if r[2] is not None and ref[2]
+                ]
+                center_txt = f"{np.mean(center_err):.1f}" if center_err else "-"
+                area_txt = f"{100 * np.mean(area_err):.2f}%" if area_err else "-"
+
+                print(f"| {name} | {w}x{h} | {scale:g} | {ms:.1f} | "
+                      f"{same}/{len(frames)} | {center_txt} | {area_txt} |")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
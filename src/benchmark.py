@@ -0,0 +1,286 @@
+# benchmark.py
+#
+# Benchmark por etapas de los caminos críticos (detección y
+# calibración) usando las imágenes de data/*.jpg.
+#
+# Ejemplos (desde la raíz del repositorio):
+#   python src/benchmark.py -o bench_base.json
+#   python src/benchmark.py --baseline bench_base.json --threshold 0.10
+
+from __future__ import annotations
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import datetime
+import glob
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import calibracion
+import main as main_mod
+import utils
+from color_shape_detector import (
+    COLOR_RANGES,
+    ColorShapeDetector,
+    _build_color_mask,
+    _build_label_image,
+    _classify_shape,
+    _clean_label_image,
+    detect_color_shape,
+    get_color_lut,
+)
+
+SUITES = ["color", "patterns", "calibration"]
+
+# Detector con buffers reservados: tras la primera imagen no reserva
+# memoria, así que su mem KB es sólo el de contornos y resultado
+COLOR_DETECTOR = ColorShapeDetector()
+
+
+class StageTimer:
+    """
+    Acumula tiempos por etapa. Con track_memory=True mide además el
+    pico de memoria (tracemalloc) de cada llamada; esa pasada se hace
+    aparte porque tracemalloc encarece las asignaciones.
+    """
+
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.peaks: Dict[str, int] = defaultdict(int)
+
+    def run(self, name: str, fn: Callable, *args) -> Any:
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+
+        t0 = time.perf_counter()
+        out = fn(*args)
+        dt = time.perf_counter() - t0
+
+        if self.track_memory:
+            peak = tracemalloc.get_traced_memory()[1] - base
+            self.peaks[name] = max(self.peaks[name], peak)
+        else:
+            self.samples[name].append(dt)
+        return out
+
+    def add(self, name: str, seconds: float):
+        """Tiempo medido fuera (p. ej. las etapas de un CornerResult)."""
+        if not self.track_memory:
+            self.samples[name].append(seconds)
+
+
+# ----------------------------
+# Suites
+# ----------------------------
+
+def run_color(timer: StageTimer, frame: np.ndarray, min_area: float = 1000.0):
+    blurred = timer.run("color.blur", cv2.GaussianBlur, frame, (5, 5), 0)
+    hsv = timer.run("color.hsv", cv2.cvtColor, blurred, cv2.COLOR_BGR2HSV)
+
+    lut = get_color_lut()
+    labels = timer.run("color.label_lut", _build_label_image, hsv, lut)
+    labels = timer.run("color.morphology", _clean_label_image, labels)
+
+    # Camino anterior (una máscara por color) como referencia
+    timer.run(
+        "color.build_color_mask_per_color",
+        lambda: [_build_color_mask(hsv, name) for name in COLOR_RANGES]
+    )
+
+    masks = [cv2.compare(labels, idx, cv2.CMP_EQ) for idx in range(1, len(lut.color_names) + 1)]
+    contours = timer.run(
+        "color.find_contours",
+        lambda: [
+            cnt for mask in masks
+            for cnt in cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+        ]
+    )
+    big = [cnt for cnt in contours if cv2.contourArea(cnt) >= min_area]
+    timer.run("color.classify_shape", lambda: [_classify_shape(cnt) for cnt in big])
+
+    timer.run("color.detect_color_shape", detect_color_shape, frame, min_area)
+    timer.run("color.detector_prealloc", COLOR_DETECTOR, frame, min_area)
+
+
+def run_patterns(timer: StageTimer, frame: np.ndarray):
+    timer.run("patterns.utils_detect_pattern", utils.detect_pattern, frame)
+    timer.run("patterns.main_detect_pattern", main_mod.detect_pattern, frame)
+
+
+def run_calibration(timer: StageTimer, paths: List[str], coarse_scale: float = 0.5):
+    """
+    El camino de calibracion.main: detect_image_corners por imagen a
+    resolución completa y en dos etapas (coarse_scale), con el desglose
+    carga / búsqueda / refinado de cada CornerResult, y una pasada de
+    iter_corner_results con la caché de esquinas ya llena.
+    """
+    for scale in (1.0, coarse_scale):
+        tag = "calibration.full" if scale >= 1.0 else f"calibration.coarse_{scale:g}"
+        corners_refined = []
+        image_size = None
+        for path in paths:
+            r = timer.run(f"{tag}.detect_image_corners", calibracion.detect_image_corners,
+                          path, calibracion.pattern_size, calibracion.criteria, scale)
+            timer.add(f"{tag}.load", r.t_load)
+            timer.add(f"{tag}.find", r.t_find)
+            timer.add(f"{tag}.refine", r.t_refine)
+            image_size = image_size or r.image_size
+            if r.found:
+                corners_refined.append(r.corners)
+        timer.run(f"{tag}.calibrate_camera", calibracion.calibrate, corners_refined, image_size)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = calibracion.CornerCache(cache_dir, calibracion.pattern_size, calibracion.criteria)
+        list(calibracion.iter_corner_results(paths, workers=1, cache=cache))   # llena la caché
+        timer.run("calibration.cached.iter_corner_results",
+                  lambda: list(calibracion.iter_corner_results(paths, workers=1, cache=cache)))
+
+
+def run_suites(timer: StageTimer, paths: List[str], suites: List[str], coarse_scale: float = 0.5):
+    if "color" in suites or "patterns" in suites:
+        for path in paths:
+            frame = cv2.imread(path)
+            if "color" in suites:
+                run_color(timer, frame)
+            if "patterns" in suites:
+                run_patterns(timer, frame)
+    if "calibration" in suites:
+        run_calibration(timer, paths, coarse_scale)
+
+
+# ----------------------------
+# Estadísticas y comparación
+# ----------------------------
+
+def summarize(timer: StageTimer, memory: StageTimer) -> Dict[str, Dict[str, float]]:
+    stats = {}
+    for name, samples in timer.samples.items():
+        ms = 1000 * np.asarray(samples)
+        mean = float(ms.mean())
+        stats[name] = {
+            "n": len(samples),
+            "mean_ms": round(mean, 3),
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "fps": round(1000 / mean, 2) if mean > 0 else None,
+            "peak_mem_kb": round(memory.peaks.get(name, 0) / 1024, 1),
+        }
+    return stats
+
+
+def compare(stats: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Devuelve las etapas cuyo p50 ha empeorado más de threshold
+    (fracción) respecto a la referencia.
+    """
+    regressions = []
+    for name, cur in stats.items():
+        base = baseline.get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        ratio = cur["p50_ms"] / base["p50_ms"]
+        if ratio > 1.0 + threshold:
+            regressions.append(f"{name}: p50 {base['p50_ms']:.2f} -> {cur['p50_ms']:.2f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def print_table(stats: Dict, baseline: Optional[Dict] = None):
+    header = f"{'etapa':45s} {'n':>5s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'fps':>9s} {'mem KB':>10s}"
+    if baseline:
+        header += f" {'vs base':>8s}"
+    print(header)
+    for name in sorted(stats):
+        s = stats[name]
+        line = (f"{name:45s} {s['n']:5d} {s['p50_ms']:9.2f} {s['p95_ms']:9.2f} "
+                f"{s['p99_ms']:9.2f} {s['fps'] or 0:9.1f} {s['peak_mem_kb']:10.1f}")
+        if baseline and name in baseline and baseline[name].get("p50_ms"):
+            line += f" {s['p50_ms'] / baseline[name]['p50_ms']:7.2f}x"
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark por etapas sobre data/*.jpg")
+    parser.add_argument("--images", default="data/*.jpg")
+    parser.add_argument("--repeat", type=int, default=3, help="pasadas de medición de tiempos")
+    parser.add_argument("--suites", default=",".join(SUITES), help="subconjunto de: " + ",".join(SUITES))
+    parser.add_argument("--coarse-scale", type=float, default=0.5,
+                        help="escala de la búsqueda en dos etapas de la suite de calibración")
+    parser.add_argument("-o", "--output", default=None, help="guardar resultados en JSON")
+    parser.add_argument("--baseline", default=None, help="JSON de una ejecución anterior")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="empeoramiento relativo de p50 que se marca como regresión")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = sorted(glob.glob(args.images))
+    if not paths:
+        print("No se han encontrado imágenes en", args.images)
+        return 1
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+
+    # Calentamiento (LUTs, cachés de OpenCV)
+    run_suites(StageTimer(), paths[:1], [s for s in suites if s != "calibration"])
+
+    timer = StageTimer()
+    for _ in range(args.repeat):
+        run_suites(timer, paths, suites, args.coarse_scale)
+
+    memory = StageTimer(track_memory=True)
+    tracemalloc.start()
+    try:
+        run_suites(memory, paths, suites, args.coarse_scale)
+    finally:
+        tracemalloc.stop()
+
+    stats = summarize(timer, memory)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+
+    print_table(stats, baseline)
+
+    if args.output:
+        report = {
+            "meta": {
+                "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "images": len(paths),
+                "repeat": args.repeat,
+                "python": platform.python_version(),
+                "opencv": cv2.__version__,
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "processor": platform.processor(),
+            },
+            "stages": stats,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print("Resultados guardados en", args.output)
+
+    if baseline:
+        regressions = compare(stats, baseline, args.threshold)
+        if regressions:
+            print("\nREGRESIONES:")
+            for r in regressions:
+                print(" ", r)
+            return 1
+        print("\nSin regresiones respecto a", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,18 @@
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
 import numpy as np
 import cv2
 import copy  
 import glob
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from undistort import CALIBRATION_FILE, CameraCalibration, save_calibration
 
 def show_image(name,img):
     cv2.imshow("drawchessboard"+name, img)
@@ -27,69 +37,397 @@ def get_chessboard_points(chessboard_shape, dx, dy):
 def write_image(name, img):
     cv2.imwrite(f"drawchessboard_{name}.jpg", img)
 
-# --- Carga de imágenes
-imgs_path = [item for item in glob.glob("data/*.jpg")]
-imgs = load_images(imgs_path)
-
 pattern_size = (7, 9)  # (cols, rows) esquinas internas
+criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+subpix_win = (7, 9)         # ventana de cornerSubPix
+subpix_zero_zone = (-1, -1)
 
-# --- Detección de esquinas
-imgs_gray = [cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) for img in imgs]
-corners = [cv2.findChessboardCorners(img_gray, pattern_size) for img_gray in imgs_gray]
+# Búsqueda rápida en la imagen reducida (descarta pronto las imágenes sin tablero)
+coarse_flags = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
 
-criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+CORNER_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "corners")
+
+
+# --- Detección en paralelo (una tarea por imagen)
+
+@dataclass
+class CornerResult:
+    path: str
+    found: bool
+    corners: Optional[np.ndarray]          # esquinas refinadas (None si no se encuentra)
+    image_size: Optional[Tuple[int, int]]  # (width, height)
+    t_load: float = 0.0
+    t_find: float = 0.0
+    t_refine: float = 0.0
+    cached: bool = False
+    key: Optional[str] = None              # clave en CornerCache (si se usa)
+
+def _init_worker():
+    # El paralelismo lo da el pool: un hilo de OpenCV por proceso
+    cv2.setNumThreads(1)
+
+def find_corners_two_stage(img_gray, pattern_size=pattern_size, criteria=criteria, coarse_scale=0.5):
+    """
+    Busca el tablero en la imagen reducida con FAST_CHECK (las imágenes
+    sin tablero o muy borrosas se descartan a bajo coste), refina ahí
+    y lleva las esquinas a coordenadas de resolución completa.
+    Devuelve (found, pts) como cv2.findChessboardCorners; las esquinas
+    son semillas para refine_seeded_corners.
+    """
+    small = cv2.resize(img_gray, None, fx=coarse_scale, fy=coarse_scale, interpolation=cv2.INTER_AREA)
+    found, pts = cv2.findChessboardCorners(small, pattern_size, coarse_flags)
+    if not found:
+        return False, None
+    pts = cv2.cornerSubPix(small, pts, subpix_win, subpix_zero_zone, criteria)
+    return True, ((pts + 0.5) / coarse_scale - 0.5).astype(np.float32)
+
+# Una semilla que cornerSubPix mueve más de media ventana ha caído
+# cerca de otra esquina o de un borde
+SEED_MAX_SHIFT = min(subpix_win) / 2
+# Desviación máxima de cada esquina respecto a la recta de sus dos
+# vecinas, relativa a la distancia entre ellas. La perspectiva y la
+# distorsión de data/ no pasan de 0.12; una esquina equivocada da 0.4
+GRID_MAX_BEND = 0.25
+
+def grid_bend(pts, pattern_size=pattern_size) -> float:
+    """Máxima segunda diferencia normalizada en filas y columnas de la rejilla."""
+    cols, rows = pattern_size
+    g = pts.reshape(rows, cols, 2).astype(np.float64)
+    bend = 0.0
+    for a, b, c in ((g[:, :-2], g[:, 1:-1], g[:, 2:]), (g[:-2], g[1:-1], g[2:])):
+        if b.size:
+            ratio = np.linalg.norm(a - 2 * b + c, axis=2) / np.maximum(np.linalg.norm(c - a, axis=2), 1e-6)
+            bend = max(bend, float(ratio.max()))
+    return bend
+
+def canonical_corner_order(pts):
+    """
+    Con un tablero de lados impares (7x9) findChessboardCorners puede
+    devolver la rejilla en cualquiera de los dos sentidos según la
+    escala. Se fija el que empieza por la esquina más cercana al origen
+    de la imagen, el mismo en las dos búsquedas.
+    """
+    flat = pts.reshape(-1, 2)
+    first, last = flat[0], flat[-1]
+    if last[0] + last[1] < first[0] + first[1]:
+        return np.ascontiguousarray(pts[::-1])
+    return pts
+
+def refine_seeded_corners(img_gray, seeds, pattern_size=pattern_size, criteria=criteria):
+    """
+    cornerSubPix a resolución completa sobre las semillas de
+    find_corners_two_stage. Si alguna se mueve más de SEED_MAX_SHIFT o
+    la rejilla refinada se dobla más de GRID_MAX_BEND, la búsqueda
+    reducida no era fiable y se repite findChessboardCorners a
+    resolución completa. Devuelve (found, pts) con las esquinas ya
+    refinadas y en orden canónico.
+    """
+    pts = cv2.cornerSubPix(img_gray, seeds.copy(), subpix_win, subpix_zero_zone, criteria)
+    shift = float(np.abs(pts - seeds).max())
+    if shift > SEED_MAX_SHIFT or grid_bend(pts, pattern_size) > GRID_MAX_BEND:
+        found, pts = cv2.findChessboardCorners(img_gray, pattern_size)
+        if not found:
+            return False, None
+        pts = cv2.cornerSubPix(img_gray, pts, subpix_win, subpix_zero_zone, criteria)
+    return True, canonical_corner_order(pts)
+
+def detect_image_corners(path: str, pattern_size=pattern_size, criteria=criteria,
+                         coarse_scale: float = 1.0) -> CornerResult:
+    t0 = time.perf_counter()
+    img_gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img_gray is None:
+        return CornerResult(path, False, None, None, time.perf_counter() - t0)
+    image_size = (img_gray.shape[1], img_gray.shape[0])
+    t1 = time.perf_counter()
 
-# Refinar solo si se han encontrado
-corners_refined = []
-for img_gray, cor in zip(imgs_gray, corners):
-    found, pts = cor
-    if found:
-        pts_refined = cv2.cornerSubPix(img_gray, pts, (7, 9), (-1, -1), criteria)
-        corners_refined.append(pts_refined)
+    if coarse_scale < 1.0:
+        found, pts = find_corners_two_stage(img_gray, pattern_size, criteria, coarse_scale)
     else:
-        # no añadimos nada si no se encuentra
-        pass
-
-# Dibujar (opcional)
-imgs_draw = []
-for img, cor in zip(imgs, corners):
-    found, pts = cor
-    img_draw = img.copy()
-    if found:
-        cv2.drawChessboardCorners(img_draw, pattern_size, pts, found)
-    imgs_draw.append(img_draw)
-
-print("Número de imágenes totales:", len(imgs))
-print("Número de imágenes válidas:", len(corners_refined))
-
-# --- Puntos 3D (objpoints) alineados con imágenes válidas
-chessboard_points = get_chessboard_points(pattern_size, 20, 20)
-
-objpoints = [chessboard_points for _ in range(len(corners_refined))]
-imgpoints = corners_refined  # ya son np.float32
-
-# --- Calibración
-cameraMat_init = None
-distcoef_init = None
-
-image_size = (imgs[0].shape[1], imgs[0].shape[0])  # (width, height) CORRECTO
-
-rms, intrinsics, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(
-    objpoints,
-    imgpoints,
-    image_size,
-    cameraMat_init,
-    distcoef_init,
-    criteria=criteria
-)
-
-# Extrínsecas
-extrinsics = [
-    np.hstack((cv2.Rodrigues(rvec)[0], tvec))
-    for rvec, tvec in zip(rvecs, tvecs)
-]
-
-print("Extrinsics (primeras):", extrinsics[:2])
-print("Intrinsics:\n", intrinsics)
-print("Distortion coefficients:\n", dist_coeffs)
-print("Root mean squared reprojection error:\n", rms)
+        found, pts = cv2.findChessboardCorners(img_gray, pattern_size)
+    t2 = time.perf_counter()
+
+    # En dos etapas el refinado incluye la comprobación de las semillas
+    # (y, si fallan, la búsqueda a resolución completa)
+    pts_refined = None
+    if found and coarse_scale < 1.0:
+        found, pts_refined = refine_seeded_corners(img_gray, pts, pattern_size, criteria)
+    elif found:
+        pts_refined = canonical_corner_order(
+            cv2.cornerSubPix(img_gray, pts, subpix_win, subpix_zero_zone, criteria))
+    t3 = time.perf_counter()
+
+    return CornerResult(path, bool(found), pts_refined, image_size, t1 - t0, t2 - t1, t3 - t2)
+
+def iter_corner_results(paths: List[str], pattern_size=pattern_size, criteria=criteria,
+                        workers: Optional[int] = None, coarse_scale: float = 1.0,
+                        cache: Optional["CornerCache"] = None) -> Iterator[CornerResult]:
+    """
+    Genera un CornerResult por imagen, en el orden de paths. Sólo hay
+    en vuelo unas pocas imágenes (una en modo secuencial, 2 * workers
+    con el pool), así que la memoria no depende del número de imágenes.
+    Con cache, las imágenes ya vistas no se vuelven a procesar.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    def lookup(path):
+        if cache is None:
+            return None, None
+        key = cache.key(path)
+        return key, cache.get(key, path)
+
+    def finish(key, result):
+        if cache is not None and not result.cached:
+            cache.put(key, result)
+        result.key = key
+        return result
+
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            key, result = lookup(path)
+            if result is None:
+                result = detect_image_corners(path, pattern_size, criteria, coarse_scale)
+            yield finish(key, result)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), initializer=_init_worker) as pool:
+        pending: deque = deque()
+        for path in paths:
+            key, result = lookup(path)
+            if result is None:
+                result = pool.submit(detect_image_corners, path, pattern_size, criteria, coarse_scale)
+            pending.append((key, result))
+            if len(pending) >= 2 * workers:
+                key, result = pending.popleft()
+                yield finish(key, result if isinstance(result, CornerResult) else result.result())
+        while pending:
+            key, result = pending.popleft()
+            yield finish(key, result if isinstance(result, CornerResult) else result.result())
+
+# --- Caché de esquinas en disco
+
+class CornerCache:
+    """
+    Guarda en disco (un .npz por imagen) el resultado de
+    findChessboardCorners + cornerSubPix. La clave es el hash del
+    contenido de la imagen más pattern_size y los parámetros de
+    refinamiento, así que cambiar cualquiera de ellos invalida la entrada.
+    """
+
+    def __init__(self, cache_dir=CORNER_CACHE_DIR, pattern_size=pattern_size, criteria=criteria,
+                 coarse_scale: float = 1.0):
+        self.cache_dir = cache_dir
+        # "gray": decodificación directa con IMREAD_GRAYSCALE; "canon": orden
+        # canónico y semillas comprobadas (invalidan las entradas anteriores)
+        params = (tuple(pattern_size), tuple(criteria), subpix_win, subpix_zero_zone, "gray", "canon")
+        if coarse_scale < 1.0:
+            params += (coarse_scale, coarse_flags, SEED_MAX_SHIFT, GRID_MAX_BEND)
+        params = repr(params)
+        self._params_hash = hashlib.sha1(params.encode("utf-8")).hexdigest()[:12]
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, path: str) -> str:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return f"{h.hexdigest()}_{self._params_hash}"
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def get(self, key: str, path: str) -> Optional[CornerResult]:
+        try:
+            with np.load(self._file(key)) as data:
+                found = bool(data["found"])
+                corners = data["corners"] if found else None
+                image_size = tuple(int(v) for v in data["image_size"])
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CornerResult(path, found, corners, image_size, cached=True)
+
+    def put(self, key: str, result: CornerResult):
+        if result.image_size is None:
+            return  # imagen ilegible: no se guarda
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Temporal propio de cada escritura (como get_bgr_lut): otra
+        # ejecución o un worker con la misma clave no lo pisa. Sin
+        # extensión .npz para que _entries no lo cuente
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False) as f:
+            np.savez(
+                f,
+                found=np.array(result.found),
+                corners=result.corners if result.corners is not None else np.zeros((0, 1, 2), np.float32),
+                image_size=np.array(result.image_size),
+            )
+        os.replace(f.name, self._file(key))
+
+    def _entries(self) -> List[str]:
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [name[:-4] for name in os.listdir(self.cache_dir) if name.endswith(".npz")]
+
+    def prune(self, keep_keys) -> int:
+        """Borra las entradas que no están en keep_keys. Devuelve cuántas."""
+        keep = set(keep_keys)
+        removed = 0
+        for key in self._entries():
+            if key not in keep:
+                os.remove(self._file(key))
+                removed += 1
+        return removed
+
+    def clear(self) -> int:
+        return self.prune(())
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+def draw_result(result: CornerResult, pattern_size=pattern_size):
+    # La imagen en color sólo se decodifica aquí, cuando se pide dibujar
+    img = cv2.imread(result.path)
+    if img is None:
+        return
+    if result.found:
+        cv2.drawChessboardCorners(img, pattern_size, result.corners, True)
+    write_image(os.path.splitext(os.path.basename(result.path))[0], img)
+
+def print_timing_header():
+    print(f"{'imagen':40s} {'ok':>3s} {'carga ms':>9s} {'busca ms':>9s} {'refina ms':>10s}")
+
+def print_timing_row(r: CornerResult):
+    if r.cached:
+        print(f"{os.path.basename(r.path):40s} {'si' if r.found else 'no':>3s} {'(caché)':>9s}")
+        return
+    print(f"{os.path.basename(r.path):40s} {'si' if r.found else 'no':>3s} "
+          f"{1000 * r.t_load:9.1f} {1000 * r.t_find:9.1f} {1000 * r.t_refine:10.1f}")
+
+def print_timing_report(results: List[CornerResult]):
+    print_timing_header()
+    for r in results:
+        print_timing_row(r)
+    total = sum(r.t_load + r.t_find + r.t_refine for r in results)
+    print(f"Tiempo de CPU acumulado por imagen: {total:.2f} s")
+
+def calibrate(corners_refined: List, image_size, pattern_size=pattern_size, criteria=criteria):
+    # --- Puntos 3D (objpoints) alineados con imágenes válidas
+    chessboard_points = get_chessboard_points(pattern_size, 20, 20)
+
+    objpoints = [chessboard_points for _ in range(len(corners_refined))]
+    imgpoints = corners_refined  # ya son np.float32
+
+    # --- Calibración
+    cameraMat_init = None
+    distcoef_init = None
+
+    rms, intrinsics, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(
+        objpoints,
+        imgpoints,
+        image_size,
+        cameraMat_init,
+        distcoef_init,
+        criteria=criteria
+    )
+
+    # Extrínsecas
+    extrinsics = [
+        np.hstack((cv2.Rodrigues(rvec)[0], tvec))
+        for rvec, tvec in zip(rvecs, tvecs)
+    ]
+    return rms, intrinsics, dist_coeffs, extrinsics
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Calibración de cámara con tablero de ajedrez")
+    parser.add_argument("--images", default="data/*.jpg")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="procesos para la detección de esquinas (por defecto, núcleos)")
+    parser.add_argument("--coarse-scale", type=float, default=1.0,
+                        help="< 1: búsqueda rápida a esta escala y refinado a resolución completa")
+    parser.add_argument("--no-cache", action="store_true", help="no usar la caché de esquinas")
+    parser.add_argument("--clear-cache", action="store_true", help="vaciar la caché antes de empezar")
+    parser.add_argument("--prune-cache", action="store_true",
+                        help="borrar de la caché las entradas que no corresponden a esta ejecución")
+    parser.add_argument("-o", "--output", default=CALIBRATION_FILE,
+                        help="fichero JSON donde guardar la calibración")
+    parser.add_argument("--no-save", action="store_true", help="no guardar la calibración")
+    parser.add_argument("--draw", action="store_true",
+                        help="guardar drawchessboard_<imagen>.jpg con las esquinas dibujadas")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # --- Carga de imágenes (orden determinista)
+    imgs_path = sorted(glob.glob(args.images))
+    if not imgs_path:
+        print("No se han encontrado imágenes en", args.images)
+        return
+
+    cache = None
+    if not args.no_cache:
+        cache = CornerCache(CORNER_CACHE_DIR, pattern_size, criteria, args.coarse_scale)
+        if args.clear_cache:
+            print("Entradas de caché borradas:", cache.clear())
+
+    # --- Detección de esquinas en streaming: de cada imagen sólo se
+    # guardan las esquinas refinadas (unos cientos de bytes)
+    corners_refined = []
+    keys = []
+    image_size = None
+    n_images = 0
+    t_cpu = 0.0
+
+    t0 = time.perf_counter()
+    print_timing_header()
+    for r in iter_corner_results(imgs_path, pattern_size, criteria, args.workers, args.coarse_scale, cache):
+        print_timing_row(r)
+        n_images += 1
+        t_cpu += r.t_load + r.t_find + r.t_refine
+        keys.append(r.key)
+        if image_size is None and r.image_size is not None:
+            image_size = r.image_size  # (width, height) del primer frame decodificado
+        if r.found:
+            corners_refined.append(r.corners)
+        if args.draw:
+            draw_result(r, pattern_size)
+    t_detect = time.perf_counter() - t0
+
+    print(f"Tiempo de CPU acumulado por imagen: {t_cpu:.2f} s")
+    print(f"Detección de esquinas: {t_detect:.2f} s (workers={args.workers or os.cpu_count()})")
+    if cache is not None:
+        if args.prune_cache:
+            print("Entradas de caché obsoletas borradas:", cache.prune(keys))
+        print(f"Caché de esquinas: {cache.hits} aciertos, {cache.misses} fallos "
+              f"({100 * cache.hit_rate:.0f}% de aciertos)")
+
+    print("Número de imágenes totales:", n_images)
+    print("Número de imágenes válidas:", len(corners_refined))
+
+    if not corners_refined:
+        print("No se ha encontrado el tablero en ninguna imagen")
+        return
+
+    rms, intrinsics, dist_coeffs, extrinsics = calibrate(corners_refined, image_size, pattern_size, criteria)
+
+    print("Extrinsics (primeras):", extrinsics[:2])
+    print("Intrinsics:\n", intrinsics)
+    print("Distortion coefficients:\n", dist_coeffs)
+    print("Root mean squared reprojection error:\n", rms)
+
+    if not args.no_save:
+        save_calibration(args.output, CameraCalibration(
+            camera_matrix=intrinsics,
+            dist_coeffs=dist_coeffs,
+            image_size=image_size,
+            rms=rms,
+            pattern_size=pattern_size,
+            n_views=len(corners_refined),
+        ))
+        print("Calibración guardada en", args.output)
+
+if __name__ == "__main__":
+    main()
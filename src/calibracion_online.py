@@ -0,0 +1,310 @@
+# calibracion_online.py
+#
+# Calibración en línea desde una cámara o un vídeo. Sólo se guardan
+# las vistas cuya pose del tablero aporta cobertura nueva, la solución
+# se re-optimiza a partir de la anterior con cada vista aceptada y la
+# captura se detiene sola cuando el RMS y la matriz de cámara convergen
+# (o al llegar a --max-views; el resumen final dice cuál de los dos).
+#
+# Ejemplos (desde la raíz del repositorio):
+#   python src/calibracion_online.py            # cámara 0
+#   python src/calibracion_online.py sesion.mp4 --show
+
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from calibracion import (
+    canonical_corner_order,
+    criteria,
+    find_corners_two_stage,
+    get_chessboard_points,
+    pattern_size,
+    refine_seeded_corners,
+    subpix_win,
+    subpix_zero_zone,
+)
+from frame_source import open_source
+from undistort import CALIBRATION_FILE, CameraCalibration, save_calibration
+
+
+# ----------------------------
+# Diversidad de poses
+# ----------------------------
+
+def board_descriptor(corners: np.ndarray, image_size: Tuple[int, int], pattern_size=pattern_size) -> np.ndarray:
+    """
+    Resumen barato de la pose del tablero a partir de sus esquinas:
+    centro y tamaño normalizados a la imagen, inclinación (cociente
+    log de lados opuestos, por perspectiva) y giro en el plano.
+    """
+    cols, rows = pattern_size
+    grid = corners.reshape(rows, cols, 2)
+    tl, tr, bl, br = grid[0, 0], grid[0, -1], grid[-1, 0], grid[-1, -1]
+    width, height = image_size
+
+    top = np.linalg.norm(tr - tl)
+    bottom = np.linalg.norm(br - bl)
+    left = np.linalg.norm(bl - tl)
+    right = np.linalg.norm(br - tr)
+    area = cv2.contourArea(np.array([tl, tr, br, bl], dtype=np.float32))
+    angle = np.arctan2(tr[1] - tl[1], tr[0] - tl[0])
+
+    center = corners.reshape(-1, 2).mean(axis=0)
+    return np.array([
+        center[0] / width,
+        center[1] / height,
+        np.sqrt(area / (width * height)),
+        np.log(top / bottom),
+        np.log(left / right),
+        0.25 * np.cos(2 * angle),
+        0.25 * np.sin(2 * angle),
+    ])
+
+
+class OnlineCalibrator:
+    """
+    Acumula vistas del tablero y re-calibra de forma incremental.
+
+    - Una vista se acepta si su descriptor de pose está a más de
+      min_novelty de todas las ya aceptadas.
+    - A partir de min_views, cada vista aceptada lanza un
+      calibrateCamera que parte de la solución anterior
+      (CALIB_USE_INTRINSIC_GUESS), por lo que converge en pocas
+      iteraciones.
+    - stable pasa a True cuando en patience soluciones seguidas el
+      RMS y fx, fy, cx, cy cambian menos de rel_tol (relativo); full
+      cuando se llega a max_views. done es cualquiera de los dos.
+    """
+
+    def __init__(
+        self,
+        pattern_size=pattern_size,
+        criteria=criteria,
+        square_size: float = 20.0,
+        min_views: int = 8,
+        max_views: int = 40,
+        min_novelty: float = 0.08,
+        rel_tol: float = 0.01,
+        patience: int = 3,
+        coarse_scale: float = 0.5
+    ):
+        self.pattern_size = pattern_size
+        self.criteria = criteria
+        self.min_views = min_views
+        self.max_views = max_views
+        self.min_novelty = min_novelty
+        self.rel_tol = rel_tol
+        self.patience = patience
+        self.coarse_scale = coarse_scale
+
+        self.board_points = get_chessboard_points(pattern_size, square_size, square_size)
+        self.image_size: Optional[Tuple[int, int]] = None
+        self.corners: List[np.ndarray] = []
+        self.descriptors: List[np.ndarray] = []
+
+        self.rms: Optional[float] = None
+        self.camera_matrix: Optional[np.ndarray] = None
+        self.dist_coeffs: Optional[np.ndarray] = None
+        self.history: List[Tuple[int, float, float]] = []   # (vistas, rms, segundos del solve)
+        self._stable = 0
+
+        self.frames_seen = 0
+        self.boards_found = 0
+
+    @property
+    def stable(self) -> bool:
+        return self._stable >= self.patience
+
+    @property
+    def full(self) -> bool:
+        return len(self.corners) >= self.max_views
+
+    @property
+    def done(self) -> bool:
+        return self.stable or self.full
+
+    def novelty(self, descriptor: np.ndarray) -> float:
+        if not self.descriptors:
+            return float("inf")
+        return float(np.min(np.linalg.norm(np.asarray(self.descriptors) - descriptor, axis=1)))
+
+    def add_frame(self, frame: np.ndarray) -> bool:
+        """
+        Procesa un frame (BGR o gris). Devuelve True si la vista se ha
+        aceptado.
+        """
+        self.frames_seen += 1
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        size = (gray.shape[1], gray.shape[0])
+        if self.image_size is None:
+            self.image_size = size
+        elif size != self.image_size:
+            raise ValueError(f"Resolución cambiada durante la calibración: {self.image_size} -> {size}")
+
+        # Búsqueda rápida a escala reducida: los frames sin tablero
+        # (la mayoría en vivo) se descartan enseguida
+        if self.coarse_scale < 1.0:
+            found, pts = find_corners_two_stage(gray, self.pattern_size, self.criteria, self.coarse_scale)
+        else:
+            found, pts = cv2.findChessboardCorners(gray, self.pattern_size)
+        if not found:
+            return False
+        self.boards_found += 1
+
+        descriptor = board_descriptor(pts, size, self.pattern_size)
+        if self.novelty(descriptor) < self.min_novelty:
+            return False
+
+        if self.coarse_scale < 1.0:
+            found, pts = refine_seeded_corners(gray, pts, self.pattern_size, self.criteria)
+            if not found:
+                return False
+        else:
+            pts = canonical_corner_order(
+                cv2.cornerSubPix(gray, pts, subpix_win, subpix_zero_zone, self.criteria))
+        self.corners.append(pts)
+        self.descriptors.append(descriptor)
+
+        if len(self.corners) >= self.min_views:
+            self._solve()
+        return True
+
+    def _solve(self):
+        flags = 0
+        camera_matrix, dist_coeffs = None, None
+        if self.camera_matrix is not None:
+            flags = cv2.CALIB_USE_INTRINSIC_GUESS
+            camera_matrix, dist_coeffs = self.camera_matrix.copy(), self.dist_coeffs.copy()
+
+        t0 = time.perf_counter()
+        rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(
+            [self.board_points] * len(self.corners),
+            self.corners,
+            self.image_size,
+            camera_matrix,
+            dist_coeffs,
+            flags=flags,
+            criteria=self.criteria
+        )
+        dt = time.perf_counter() - t0
+
+        if self.camera_matrix is not None:
+            prev = np.array([self.rms, *self._params(self.camera_matrix)])
+            cur = np.array([rms, *self._params(camera_matrix)])
+            change = np.max(np.abs(cur - prev) / np.maximum(np.abs(prev), 1e-9))
+            self._stable = self._stable + 1 if change < self.rel_tol else 0
+
+        self.rms, self.camera_matrix, self.dist_coeffs = rms, camera_matrix, dist_coeffs
+        self.history.append((len(self.corners), rms, dt))
+
+    @staticmethod
+    def _params(camera_matrix: np.ndarray) -> Tuple[float, float, float, float]:
+        return camera_matrix[0, 0], camera_matrix[1, 1], camera_matrix[0, 2], camera_matrix[1, 2]
+
+    def result(self) -> Optional[CameraCalibration]:
+        if self.camera_matrix is None:
+            return None
+        return CameraCalibration(
+            camera_matrix=self.camera_matrix,
+            dist_coeffs=self.dist_coeffs,
+            image_size=self.image_size,
+            rms=self.rms,
+            pattern_size=self.pattern_size,
+            n_views=len(self.corners),
+        )
+
+
+# ----------------------------
+# Programa
+# ----------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Calibración en línea desde cámara o vídeo")
+    parser.add_argument("source", nargs="?", default="0", help="índice de cámara, vídeo o grabación .frames")
+    parser.add_argument("-o", "--output", default=CALIBRATION_FILE)
+    parser.add_argument("--min-views", type=int, default=8)
+    parser.add_argument("--max-views", type=int, default=40)
+    parser.add_argument("--min-novelty", type=float, default=0.08,
+                        help="distancia mínima de pose para aceptar una vista")
+    parser.add_argument("--rel-tol", type=float, default=0.01,
+                        help="cambio relativo de RMS/intrínsecos considerado estable")
+    parser.add_argument("--patience", type=int, default=3)
+    parser.add_argument("--coarse-scale", type=float, default=0.5)
+    parser.add_argument("--frame-step", type=int, default=1, help="procesar 1 de cada N frames")
+    parser.add_argument("--show", action="store_true", help="mostrar la captura (q para terminar)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cap = open_source(args.source, realtime=False)
+    if not cap.isOpened():
+        print("No se ha podido abrir la fuente:", args.source)
+        return 1
+
+    calibrator = OnlineCalibrator(
+        min_views=args.min_views,
+        max_views=args.max_views,
+        min_novelty=args.min_novelty,
+        rel_tol=args.rel_tol,
+        patience=args.patience,
+        coarse_scale=args.coarse_scale,
+    )
+
+    t0 = time.perf_counter()
+    idx = 0
+    try:
+        while not calibrator.done:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            idx += 1
+            if (idx - 1) % args.frame_step:
+                continue
+
+            if calibrator.add_frame(frame):
+                rms_txt = f"rms={calibrator.rms:.4f}" if calibrator.rms is not None else "rms=-"
+                print(f"frame {idx}: vista {len(calibrator.corners)} aceptada, {rms_txt}")
+
+            if args.show:
+                cv2.putText(frame, f"vistas: {len(calibrator.corners)}", (20, 40),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                cv2.imshow("Calibracion", frame)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+    finally:
+        cap.release()
+        if args.show:
+            cv2.destroyAllWindows()
+    elapsed = time.perf_counter() - t0
+
+    print(f"Frames leídos: {calibrator.frames_seen}, con tablero: {calibrator.boards_found}, "
+          f"vistas usadas: {len(calibrator.corners)} ({elapsed:.1f} s)")
+    calib = calibrator.result()
+    if calib is None:
+        print(f"No hay vistas suficientes para calibrar (mínimo {calibrator.min_views})")
+        return 1
+
+    if calibrator.stable:
+        print(f"Fin: solución estable ({calibrator.patience} soluciones seguidas con cambio < {calibrator.rel_tol})")
+    elif calibrator.full:
+        print(f"Fin: máximo de vistas ({calibrator.max_views}), la solución no se ha estabilizado")
+    else:
+        print("Fin: fin de la fuente, la solución no se ha estabilizado")
+    print("Intrinsics:\n", calib.camera_matrix)
+    print("Distortion coefficients:\n", calib.dist_coeffs)
+    print("Root mean squared reprojection error:\n", calib.rms)
+
+    save_calibration(args.output, calib)
+    print("Calibración guardada en", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
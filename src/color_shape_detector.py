@@ -1,12 +1,19 @@
 # color_shape_detector.py
 
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Optional, Tuple, List, Dict
+import hashlib
+import os
+import tempfile
+import time
 
 import cv2
 import numpy as np
 
+from metrics import METRICS, timed
+from pyramid import refine_roi, scaled_kernel
+
 
 # ----------------------------
 # Configuración de colores HSV
@@ -32,6 +39,12 @@ COLOR_RANGES: Dict[str, List[Tuple[Tuple[int, int, int], Tuple[int, int, int]]]]
 
 KERNEL = np.ones((5, 5), np.uint8)
 
+# Bits por canal de la LUT BGR -> color (8 bits = cubo 256^3, 16 MB,
+# exacto; con menos bits la cuantización cambia etiquetas, ver
+# check_bgr_lut.py)
+BGR_LUT_BITS = 8
+BGR_LUT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
 
 @dataclass
 class DetectedPattern:
@@ -47,7 +60,7 @@ class DetectedPattern:
 # Clasificación de formas
 # ----------------------------
 
-def _classify_shape(contour: np.ndarray) -> Optional[str]:
+def _classify_shape(contour: np.ndarray, area: Optional[float] = None) -> Optional[str]:
     """
     Clasifica la forma de un contorno en:
     - "triangle"
@@ -55,6 +68,7 @@ def _classify_shape(contour: np.ndarray) -> Optional[str]:
     - "circle"
     - "line"
     Devuelve None si no se reconoce.
+    area: área del contorno si ya se ha calculado (se reutiliza).
     """
     peri = cv2.arcLength(contour, True)
     if peri == 0:
@@ -62,7 +76,8 @@ def _classify_shape(contour: np.ndarray) -> Optional[str]:
 
     approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
     vertices = len(approx)
-    area = cv2.contourArea(contour)
+    if area is None:
+        area = cv2.contourArea(contour)
 
     if area <= 0:
         return None
@@ -121,60 +136,716 @@ def _build_color_mask(hsv: np.ndarray, color_name: str) -> np.ndarray:
     return mask
 
 
+# ----------------------------
+# Etiquetado por LUT (una sola pasada)
+# ----------------------------
+
+@dataclass
+class ColorLUT:
+    """
+    Tablas de consulta derivadas de COLOR_RANGES.
+    Los índices de color empiezan en 1 (0 = sin color) y siguen
+    el orden de color_names.
+
+    Los rangos se agrupan por sus límites de S y V: cada grupo
+    tiene una tabla H -> índice de color y un único inRange, así
+    que el coste no crece con el número de colores.
+    """
+    key: tuple
+    color_names: List[str]
+    groups: List[Tuple[np.ndarray, np.ndarray, np.ndarray]]  # (hue_to_color, low, high)
+
+
+_color_lut: Optional[ColorLUT] = None
+
+
+def _ranges_key(
+    color_ranges: Dict[str, List[Tuple[Tuple[int, int, int], Tuple[int, int, int]]]]
+) -> tuple:
+    return tuple(
+        (name, tuple((tuple(low), tuple(high)) for (low, high) in ranges))
+        for name, ranges in color_ranges.items()
+    )
+
+
+def build_color_lut(
+    color_ranges: Optional[Dict[str, List[Tuple[Tuple[int, int, int], Tuple[int, int, int]]]]] = None
+) -> ColorLUT:
+    """
+    Construye las tablas de consulta a partir de los rangos HSV.
+    Si dos rangos comparten tono, gana el primero en aparecer.
+    """
+    if color_ranges is None:
+        color_ranges = COLOR_RANGES
+
+    color_names = list(color_ranges.keys())
+    if len(color_names) > 255:
+        raise ValueError("COLOR_RANGES admite como máximo 255 colores")
+
+    # (s_low, v_low, s_high, v_high) -> tabla H -> índice de color
+    tables: Dict[Tuple[int, int, int, int], np.ndarray] = {}
+
+    for color_idx, color_name in enumerate(color_names, start=1):
+        for (low, high) in color_ranges[color_name]:
+            bounds = (low[1], low[2], high[1], high[2])
+            hue_to_color = tables.setdefault(bounds, np.zeros(256, dtype=np.uint8))
+
+            hues = np.arange(low[0], high[0] + 1)
+            free = hues[hue_to_color[hues] == 0]
+            hue_to_color[free] = color_idx
+
+    groups = [
+        (
+            hue_to_color,
+            np.array((0, s_low, v_low), dtype=np.uint8),
+            np.array((255, s_high, v_high), dtype=np.uint8),
+        )
+        for (s_low, v_low, s_high, v_high), hue_to_color in tables.items()
+    ]
+
+    return ColorLUT(
+        key=_ranges_key(color_ranges),
+        color_names=color_names,
+        groups=groups,
+    )
+
+
+def get_color_lut() -> ColorLUT:
+    """
+    Devuelve la LUT de COLOR_RANGES, reconstruyéndola sólo
+    si los rangos han cambiado desde la última llamada.
+    """
+    global _color_lut
+    if _color_lut is None or _color_lut.key != _ranges_key(COLOR_RANGES):
+        _color_lut = build_color_lut(COLOR_RANGES)
+    return _color_lut
+
+
+def _build_label_image(hsv: np.ndarray, lut: ColorLUT) -> np.ndarray:
+    """
+    Convierte la imagen HSV en una imagen de etiquetas uint8
+    (índice de color, 0 = fondo) en una sola pasada por grupo
+    de límites S/V, sin importar cuántos colores haya.
+    """
+    hue = cv2.extractChannel(hsv, 0)
+    labels: Optional[np.ndarray] = None
+
+    for (hue_to_color, low, high) in lut.groups:
+        group = cv2.LUT(hue, hue_to_color)
+        group &= cv2.inRange(hsv, low, high)
+
+        if labels is None:
+            labels = group
+        else:
+            # Los píxeles ya etiquetados por un grupo anterior se mantienen
+            cv2.bitwise_or(labels, group, dst=labels, mask=cv2.compare(labels, 0, cv2.CMP_EQ))
+
+    if labels is None:
+        labels = np.zeros(hsv.shape[:2], dtype=np.uint8)
+    return labels
+
+
+# ----------------------------
+# LUT directa BGR -> color (opcional)
+# ----------------------------
+
+@dataclass
+class BGRColorLUT:
+    """
+    Cubo BGR que asigna a cada píxel (ya suavizado) su índice de
+    color sin pasar por cvtColor(HSV) ni por los inRange de cada
+    grupo de tonos.
+
+    table está expandida para indexarse directamente con el píxel
+    BGRA leído como uint32: ((bgra >> shift) & mask). Con 8 bits el
+    cubo (16 MB, lo que se guarda en disco) y la tabla coinciden y el
+    etiquetado es idéntico al del camino HSV; con menos bits ocupa
+    menos pero la cuantización cambia etiquetas (ver check_bgr_lut.py).
+    """
+    key: str
+    color_names: List[str]
+    cube: np.ndarray    # [b, g, r] -> índice de color, cuantizado
+    table: np.ndarray
+    shift: int
+    mask: int
+
+
+_bgr_lut: Optional[BGRColorLUT] = None
+
+
+def _bgr_lut_key(lut: ColorLUT, bits: int) -> str:
+    digest = hashlib.sha1(repr((lut.key, bits)).encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+def build_bgr_cube(lut: ColorLUT, bits: int = BGR_LUT_BITS) -> np.ndarray:
+    """
+    Etiqueta los 2^24 colores BGR con el camino HSV y asigna a cada
+    celda del cubo cuantizado la etiqueta mayoritaria (con 8 bits
+    cada celda es un color: la etiqueta exacta).
+    """
+    n = 1 << bits
+    step = 256 >> bits
+
+    values = np.arange(256, dtype=np.uint8)
+    all_bgr = np.empty((256, 256, 256, 3), dtype=np.uint8)
+    all_bgr[..., 0] = values[:, None, None]
+    all_bgr[..., 1] = values[None, :, None]
+    all_bgr[..., 2] = values[None, None, :]
+
+    hsv = cv2.cvtColor(all_bgr.reshape(256 * 256, 256, 3), cv2.COLOR_BGR2HSV)
+    labels = _build_label_image(hsv, lut)
+    if step == 1:
+        return labels.reshape(n, n, n)
+    labels = labels.reshape(n, step, n, step, n, step)
+
+    counts = np.stack([
+        np.count_nonzero(labels == color_idx, axis=(1, 3, 5))
+        for color_idx in range(len(lut.color_names) + 1)
+    ])
+    return counts.argmax(axis=0).astype(np.uint8)
+
+
+def _expand_bgr_cube(cube: np.ndarray, bits: int) -> Tuple[np.ndarray, int, int]:
+    """
+    Reordena el cubo para indexarlo con el píxel BGRA como uint32
+    (little-endian: b en el byte bajo) tras desplazar y enmascarar.
+    """
+    n = 1 << bits
+    shift = 8 - bits
+    mask = (n - 1) * 0x010101
+
+    table = np.zeros((n, 256, 256), dtype=np.uint8)
+    table[:, :n, :n] = cube.transpose(2, 1, 0)    # [r, g, b]
+    return table.ravel()[:mask + 1].copy(), shift, mask
+
+
+def get_bgr_lut(bits: int = BGR_LUT_BITS) -> BGRColorLUT:
+    """
+    Devuelve la LUT BGR de COLOR_RANGES. Se guarda en disco con
+    un hash de los rangos y sólo se recalcula si éstos cambian.
+    """
+    global _bgr_lut
+    lut = get_color_lut()
+    key = _bgr_lut_key(lut, bits)
+    if _bgr_lut is not None and _bgr_lut.key == key:
+        return _bgr_lut
+
+    path = os.path.join(BGR_LUT_CACHE_DIR, f"bgr_lut_{key}.npy")
+    if os.path.exists(path):
+        cube = np.load(path)
+    else:
+        cube = build_bgr_cube(lut, bits)
+        os.makedirs(BGR_LUT_CACHE_DIR, exist_ok=True)
+        # Temporal propio de este proceso: varios workers pueden
+        # construir el cubo a la vez y el último os.replace gana
+        with tempfile.NamedTemporaryFile(dir=BGR_LUT_CACHE_DIR, suffix=".tmp.npy", delete=False) as f:
+            np.save(f, cube)
+        os.replace(f.name, path)
+
+    table, shift, mask = _expand_bgr_cube(cube, bits)
+    _bgr_lut = BGRColorLUT(
+        key=key,
+        color_names=lut.color_names,
+        cube=cube,
+        table=table,
+        shift=shift,
+        mask=mask,
+    )
+    return _bgr_lut
+
+
+def _build_label_image_bgr(blurred_bgr: np.ndarray, bgr_lut: BGRColorLUT) -> np.ndarray:
+    """
+    Imagen de etiquetas directamente desde BGR con una sola
+    consulta vectorizada al cubo. blurred_bgr es el frame ya
+    suavizado, como en el camino HSV.
+    """
+    bgra = cv2.cvtColor(blurred_bgr, cv2.COLOR_BGR2BGRA)
+    index = bgra.view(np.uint32).reshape(blurred_bgr.shape[:2])
+    index >>= bgr_lut.shift
+    index &= bgr_lut.mask
+    return bgr_lut.table.take(index)
+
+
+def _clean_label_image(labels: np.ndarray, kernel: np.ndarray = KERNEL) -> np.ndarray:
+    """
+    Apertura + cierre morfológico sobre la imagen de etiquetas,
+    equivalente a limpiar cada máscara de color por separado
+    (_build_color_mask). La única diferencia es un píxel que el
+    cierre de dos colores rellena a la vez: se queda con el primero.
+    """
+    # Apertura: un píxel sobrevive a la erosión si toda su vecindad
+    # tiene su misma etiqueta (mínimo == máximo). Al dilatar, la
+    # apertura de cada color queda dentro de su máscara original, así
+    # que las regiones de colores distintos no se pisan.
+    low = cv2.erode(labels, kernel, iterations=2)
+    high = cv2.dilate(labels, kernel, iterations=2)
+    eroded = cv2.bitwise_and(labels, labels, mask=cv2.compare(low, high, cv2.CMP_EQ))
+    opened = cv2.dilate(eroded, kernel, iterations=2)
+
+    # Cierre: por color, sólo para los presentes y sólo en su ventana
+    # (ver _closing_roi). Sobre la unión, el hueco entre dos colores
+    # distintos se rellenaría con el mayor.
+    clean = opened.copy()
+    stride = _sample_stride(kernel)
+    sample = _sample_labels(opened, stride)
+    for color_idx in _present_labels(opened, kernel, sample):
+        roi = _closing_roi(cv2.compare(sample, color_idx, cv2.CMP_EQ), stride, opened.shape, kernel)
+        mask = cv2.compare(opened[roi], color_idx, cv2.CMP_EQ)
+        closed = cv2.erode(cv2.dilate(mask, kernel, iterations=2), kernel, iterations=2)
+        sub = clean[roi]
+        free = cv2.bitwise_and(cv2.compare(sub, 0, cv2.CMP_EQ), closed)
+        sub[free > 0] = color_idx
+    return clean
+
+
+def _sample_stride(kernel: np.ndarray = KERNEL) -> int:
+    # Tras la apertura cada región contiene un bloque de 2*(k-1)+1
+    # píxeles de lado (recortado si toca el borde de la imagen):
+    # muestreando cada 2*(k-1) no se pierde ninguna
+    return max(1, 2 * (kernel.shape[0] - 1))
+
+
+def _sample_shape(h: int, w: int, stride: int) -> Tuple[int, int]:
+    return -(-h // stride) + ((h - 1) % stride != 0), -(-w // stride) + ((w - 1) % stride != 0)
+
+
+def _sample_labels(image: np.ndarray, stride: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    image muestreada cada stride filas/columnas, más la última fila y
+    la última columna: un bloque recortado por el borde inferior o
+    derecho puede quedar entre la última muestra y el borde. La
+    muestra i corresponde a la fila (columna) min(i * stride, h - 1).
+    """
+    h, w = image.shape[:2]
+    if out is None:
+        out = np.empty(_sample_shape(h, w, stride), image.dtype)
+    n_r, n_c = -(-h // stride), -(-w // stride)
+    out[:n_r, :n_c] = image[::stride, ::stride]
+    if out.shape[0] > n_r:
+        out[n_r, :n_c] = image[-1, ::stride]
+    if out.shape[1] > n_c:
+        out[:n_r, n_c] = image[::stride, -1]
+        if out.shape[0] > n_r:
+            out[n_r, n_c] = image[-1, -1]
+    return out
+
+
+def _closing_roi(
+    sample_mask: np.ndarray,
+    stride: int,
+    shape: Tuple[int, ...],
+    kernel: np.ndarray = KERNEL
+) -> Tuple[slice, slice]:
+    """
+    Ventana del cierre de un color a partir de su máscara sobre la
+    imagen abierta muestreada (_sample_labels), sin recorrer la imagen
+    completa. Cada píxel del color está a no más de stride de una
+    muestra suya, así que basta ampliar el bounding box muestreado en
+    stride más el radio de la dilatación y de la erosión (2
+    iteraciones cada una): fuera no cambia nada y dentro el resultado
+    es el mismo que en la imagen completa. Con un píxel más: con
+    kernel 1x1 (modo pirámide a escala 0.25) una ventana 1x1 llegaría
+    a cv2.compare como escalar.
+    """
+    margin = stride + 4 * (kernel.shape[0] // 2) + 1
+    x, y, w, h = cv2.boundingRect(sample_mask)
+    rows, cols = shape[:2]
+    y0, y1 = min(y * stride, rows - 1), min((y + h - 1) * stride, rows - 1)
+    x0, x1 = min(x * stride, cols - 1), min((x + w - 1) * stride, cols - 1)
+    return (slice(max(y0 - margin, 0), min(y1 + 1 + margin, rows)),
+            slice(max(x0 - margin, 0), min(x1 + 1 + margin, cols)))
+
+
+def _present_labels(
+    opened: np.ndarray,
+    kernel: np.ndarray = KERNEL,
+    sample: Optional[np.ndarray] = None
+) -> List[int]:
+    """
+    Etiquetas (sin el fondo) de una imagen de etiquetas tras la
+    apertura. Basta con la muestra de _sample_labels (ver
+    _sample_stride).
+    """
+    if sample is None:
+        sample = _sample_labels(opened, _sample_stride(kernel))
+    counts = np.bincount(sample.ravel())
+    return [int(i) for i in np.flatnonzero(counts[1:]) + 1]
+
+
+def _patterns_from_mask(
+    mask: np.ndarray,
+    color_name: str,
+    min_area: float
+) -> List[DetectedPattern]:
+    """
+    Extrae los contornos de una máscara binaria y devuelve
+    los que superan min_area y tienen una forma reconocible.
+    """
+    candidates: List[DetectedPattern] = []
+
+    with METRICS.time("color.contours"):
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    t0 = time.perf_counter() if METRICS.enabled else 0.0
+    for cnt in contours:
+        # Las manchas pequeñas se descartan con una sola llamada; el
+        # área se reutiliza en la clasificación y en el resultado
+        area = cv2.contourArea(cnt)
+        if area < min_area:
+            continue
+
+        shape = _classify_shape(cnt, area)
+        if shape is None:
+            continue
+
+        M = cv2.moments(cnt)
+        if M["m00"] == 0:
+            continue
+        cx = int(M["m10"] / M["m00"])
+        cy = int(M["m01"] / M["m00"])
+
+        label = f"{color_name}_{shape}"
+        candidates.append(
+            DetectedPattern(
+                color=color_name,
+                shape=shape,
+                label=label,
+                area=area,
+                center=(cx, cy),
+                contour=cnt
+            )
+        )
+
+    if METRICS.enabled:
+        METRICS.observe("color.classify", time.perf_counter() - t0)
+    return candidates
+
+
+def _find_candidates(
+    frame_bgr: np.ndarray,
+    min_area: float,
+    use_bgr_lut: bool = False,
+    kernel: np.ndarray = KERNEL
+) -> List[DetectedPattern]:
+    """
+    Etiqueta la imagen, la limpia y devuelve todos los patrones
+    (color + forma) que superan min_area.
+    """
+    # Suavizado para reducir ruido
+    with METRICS.time("color.blur"):
+        blurred = cv2.GaussianBlur(frame_bgr, (5, 5), 0)
+
+    if use_bgr_lut:
+        lut = get_bgr_lut()
+        with METRICS.time("color.label_bgr"):
+            labels = _build_label_image_bgr(blurred, lut)
+    else:
+        with METRICS.time("color.hsv"):
+            hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+
+        lut = get_color_lut()
+        with METRICS.time("color.label"):
+            labels = _build_label_image(hsv, lut)
+
+    with METRICS.time("color.morphology"):
+        labels = _clean_label_image(labels, kernel)
+
+    return _candidates_from_labels(labels, lut.color_names, min_area, kernel)
+
+
+def _candidates_from_labels(
+    labels: np.ndarray,
+    color_names: List[str],
+    min_area: float,
+    kernel: np.ndarray = KERNEL
+) -> List[DetectedPattern]:
+    """
+    Patrones de una imagen de etiquetas ya limpia (índice de color
+    según color_names, 0 = fondo).
+    """
+    # Sólo se buscan contornos de los colores presentes en la imagen
+    candidates: List[DetectedPattern] = []
+
+    for color_idx in _present_labels(labels, kernel):
+        with METRICS.time("color.mask"):
+            mask = cv2.compare(labels, color_idx, cv2.CMP_EQ)
+        candidates.extend(_patterns_from_mask(mask, color_names[color_idx - 1], min_area))
+
+    return candidates
+
+
+def offset_pattern(pattern: DetectedPattern, dx: int, dy: int) -> DetectedPattern:
+    """
+    Traslada un DetectedPattern detectado en una ROI a
+    coordenadas del frame completo.
+    """
+    if dx == 0 and dy == 0:
+        return pattern
+    cx, cy = pattern.center
+    return replace(
+        pattern,
+        center=(cx + dx, cy + dy),
+        contour=pattern.contour + np.array([dx, dy], dtype=pattern.contour.dtype)
+    )
+
+
+# ----------------------------
+# Modo pirámide (cámaras de alta resolución)
+# ----------------------------
+
+# Las candidatas de la imagen reducida se buscan con este factor del
+# área mínima: el área reducida de un objeto cerca del umbral puede
+# quedarse por debajo. El umbral real se aplica al refinar
+COARSE_AREA_SLACK = 0.5
+# Se refinan las candidatas cuya área reescalada llega a esta
+# fracción de la mejor ya confirmada (el orden reducido no es fiable
+# entre objetos de tamaño parecido)
+COARSE_AREA_MARGIN = 0.5
+
+
+def _detect_color_shape_pyramid(
+    frame_bgr: np.ndarray,
+    min_area: float,
+    use_bgr_lut: bool,
+    scale: float
+) -> Optional[DetectedPattern]:
+    """
+    Busca candidatas en la imagen reducida (umbral de área y kernel
+    escalados) y las refina a resolución completa, de mayor a menor,
+    mientras puedan superar a la mejor confirmada. Sólo cuenta lo que
+    confirma el refinamiento: una candidata reducida sin patrón del
+    mismo color a resolución completa se descarta.
+    """
+    small = cv2.resize(frame_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    area_scale = scale * scale
+    candidates = _find_candidates(small, min_area * area_scale * COARSE_AREA_SLACK, use_bgr_lut,
+                                  scaled_kernel(scale, KERNEL))
+
+    best: Optional[DetectedPattern] = None
+    for coarse in sorted(candidates, key=lambda p: p.area, reverse=True):
+        if best is not None and coarse.area / area_scale < COARSE_AREA_MARGIN * best.area:
+            break
+        # Refinamiento a resolución completa alrededor de la candidata
+        x0, y0, x1, y1 = refine_roi(cv2.boundingRect(coarse.contour), scale, frame_bgr.shape)
+        for p in _find_candidates(frame_bgr[y0:y1, x0:x1], min_area, use_bgr_lut):
+            if p.color == coarse.color and (best is None or p.area > best.area):
+                best = offset_pattern(p, x0, y0)
+    return best
+
+
+@timed("color.detect_color_shape")
 def detect_color_shape(
     frame_bgr: np.ndarray,
-    min_area: float = 1000.0
+    min_area: float = 1000.0,
+    use_bgr_lut: bool = False,
+    pyramid_scale: float = 1.0
 ) -> Optional[DetectedPattern]:
     """
     Detecta el patrón dominante (color + forma) en la imagen.
     Devuelve un DetectedPattern o None si no se detecta nada fiable.
+
+    Con use_bgr_lut=True se etiqueta directamente desde BGR con el
+    cubo cuantizado (sin suavizado ni conversión a HSV).
+    Con pyramid_scale < 1 la búsqueda se hace en la imagen reducida
+    y sólo el patrón ganador se refina a resolución completa.
     """
     if frame_bgr is None or frame_bgr.size == 0:
         return None
 
-    # Suavizado para reducir ruido
-    blurred = cv2.GaussianBlur(frame_bgr, (5, 5), 0)
-    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+    if pyramid_scale < 1.0:
+        best = _detect_color_shape_pyramid(frame_bgr, min_area, use_bgr_lut, pyramid_scale)
+    else:
+        candidates = _find_candidates(frame_bgr, min_area, use_bgr_lut)
 
-    candidates: List[DetectedPattern] = []
+        # Elegimos el patrón con mayor área (el principal en la escena)
+        best = max(candidates, key=lambda p: p.area) if candidates else None
 
-    for color_name in COLOR_RANGES.keys():
-        mask = _build_color_mask(hsv, color_name)
+    if METRICS.enabled:
+        METRICS.inc("detections", detector="color", label=best.label if best is not None else "none")
+    return best
 
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area < min_area:
-                continue
 
-            shape = _classify_shape(cnt)
-            if shape is None:
-                continue
+# ----------------------------
+# Detector con buffers reservados
+# ----------------------------
 
-            M = cv2.moments(cnt)
-            if M["m00"] == 0:
+class ColorShapeDetector:
+    """
+    Mismo resultado que detect_color_shape(frame, min_area,
+    use_bgr_lut) (sin modo pirámide), pero con todos los buffers de
+    trabajo (blur, HSV, etiquetas, morfología, máscaras) reservados
+    una sola vez y escritos con dst=. En régimen estacionario sólo se
+    crean los contornos de findContours y el resultado.
+
+    Los buffers crecen hasta el mayor frame visto; los frames más
+    pequeños (p. ej. ROIs del tracker) usan vistas de esos buffers,
+    así que cambiar de tamaño de ROI no reserva memoria.
+
+    Se usa como detect_fn de ColorShapeTracker. No es seguro entre
+    hilos: uno por hilo de detección. La LUT de color se toma al
+    crearlo; si cambia COLOR_RANGES hay que crear otro.
+    """
+
+    def __init__(self, min_area: float = 1000.0, use_bgr_lut: bool = False, kernel: np.ndarray = KERNEL):
+        self.min_area = min_area
+        self.use_bgr_lut = use_bgr_lut
+        self.kernel = kernel
+        self.lut = get_color_lut()
+        self.bgr_lut = get_bgr_lut() if use_bgr_lut else None
+        self._stride = _sample_stride(kernel)
+        self._capacity = (0, 0)
+        self._views_shape: Optional[Tuple[int, int]] = None
+        self._views: tuple = ()
+        self.allocations = 0   # veces que se han (re)reservado los buffers
+
+    def _reserve(self, h: int, w: int):
+        cap_h, cap_w = self._capacity
+        if h <= cap_h and w <= cap_w:
+            return
+        h, w = max(h, cap_h), max(w, cap_w)
+        self._blurred = np.empty((h, w, 3), np.uint8)
+        if self.use_bgr_lut:
+            self._bgra = np.empty((h, w, 4), np.uint8)
+        else:
+            self._hsv = np.empty((h, w, 3), np.uint8)
+        # Planos de un canal: hue, labels, group, inrange, free, low,
+        # high, eroded, opened, grown, closed, clean, mask
+        self._planes = np.empty((13, h, w), np.uint8)
+        self._sample = np.empty((2,) + _sample_shape(h, w, self._stride), np.uint8)
+        self._capacity = (h, w)
+        self._views_shape = None
+        self.allocations += 1
+
+    def _views_for(self, h: int, w: int) -> tuple:
+        # Las vistas del último tamaño se reutilizan entre frames
+        if self._views_shape != (h, w):
+            planes = tuple(plane[:h, :w] for plane in self._planes)
+            if self.use_bgr_lut:
+                color = (self._blurred[:h, :w], self._bgra[:h, :w])
+            else:
+                color = (self._blurred[:h, :w], self._hsv[:h, :w])
+            sample_h, sample_w = _sample_shape(h, w, self._stride)
+            sample, sample_mask = (buf[:sample_h, :sample_w] for buf in self._sample)
+            self._views = (color, planes, sample, sample_mask)
+            self._views_shape = (h, w)
+        return self._views
+
+    def _label(self, frame_bgr: np.ndarray, color: tuple, planes: tuple) -> np.ndarray:
+        hue, labels, group, inrange, free = planes[:5]
+        blurred = color[0]
+        cv2.GaussianBlur(frame_bgr, (5, 5), 0, dst=blurred)
+        if self.use_bgr_lut:
+            bgra = color[1]
+            cv2.cvtColor(blurred, cv2.COLOR_BGR2BGRA, dst=bgra)
+            index = bgra.view(np.uint32)[..., 0]
+            index >>= self.bgr_lut.shift
+            index &= self.bgr_lut.mask
+            # mode="clip" evita el buffer intermedio de mode="raise"
+            np.take(self.bgr_lut.table, index, out=labels, mode="clip")
+            return labels
+
+        hsv = color[1]
+        cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV, dst=hsv)
+        cv2.extractChannel(hsv, 0, dst=hue)
+
+        if not self.lut.groups:
+            labels.fill(0)
+        for i, (hue_to_color, low, high) in enumerate(self.lut.groups):
+            target = labels if i == 0 else group
+            cv2.LUT(hue, hue_to_color, dst=target)
+            cv2.inRange(hsv, low, high, dst=inrange)
+            cv2.bitwise_and(target, inrange, dst=target)
+            if i > 0:
+                cv2.compare(labels, 0, cv2.CMP_EQ, dst=free)
+                cv2.bitwise_or(labels, group, dst=labels, mask=free)
+        return labels
+
+    def _clean(self, labels: np.ndarray, planes: tuple) -> np.ndarray:
+        # Igual que _clean_label_image; las máscaras 0/255 se aplican
+        # con bitwise_and en lugar de con mask= (que necesitaría un
+        # destino a cero)
+        k = self.kernel
+        _, _, _, _, equal, low, high, eroded, opened, grown, closed, clean, _ = planes
+        cv2.erode(labels, k, dst=low, iterations=2)
+        cv2.dilate(labels, k, dst=high, iterations=2)
+        cv2.compare(low, high, cv2.CMP_EQ, dst=equal)
+        cv2.bitwise_and(labels, equal, dst=eroded)
+        cv2.dilate(eroded, k, dst=opened, iterations=2)
+
+        # Cierre por color (ver _clean_label_image)
+        np.copyto(clean, opened)
+        s = self._stride
+        _, _, sample, sample_mask = self._views
+        _sample_labels(opened, s, out=sample)
+        for color_idx in range(1, len(self.lut.color_names) + 1):
+            cv2.compare(sample, color_idx, cv2.CMP_EQ, dst=sample_mask)
+            if cv2.countNonZero(sample_mask) == 0:
                 continue
-            cx = int(M["m10"] / M["m00"])
-            cy = int(M["m01"] / M["m00"])
-
-            label = f"{color_name}_{shape}"
-            candidates.append(
-                DetectedPattern(
-                    color=color_name,
-                    shape=shape,
-                    label=label,
-                    area=area,
-                    center=(cx, cy),
-                    contour=cnt
-                )
-            )
+            roi = _closing_roi(sample_mask, s, opened.shape, k)
+            cv2.compare(opened[roi], color_idx, cv2.CMP_EQ, dst=equal[roi])
+            cv2.dilate(equal[roi], k, dst=grown[roi], iterations=2)
+            cv2.erode(grown[roi], k, dst=closed[roi], iterations=2)
+            cv2.compare(clean[roi], 0, cv2.CMP_EQ, dst=equal[roi])
+            cv2.bitwise_and(equal[roi], closed[roi], dst=equal[roi])
+            cv2.add(clean[roi], color_idx, dst=clean[roi], mask=equal[roi])
+        return clean
+
+    def label_image(self, frame_bgr: np.ndarray) -> np.ndarray:
+        """
+        Imagen de etiquetas limpia del frame. Es una vista de un
+        buffer interno: válida hasta la siguiente llamada.
+        """
+        h, w = frame_bgr.shape[:2]
+        self._reserve(h, w)
+        color, planes, _, _ = self._views_for(h, w)
+
+        with METRICS.time("color.detector_label"):
+            labels = self._label(frame_bgr, color, planes)
+        with METRICS.time("color.detector_morphology"):
+            return self._clean(labels, planes)
+
+    def intermediates(self) -> Dict[str, np.ndarray]:
+        """
+        Imágenes intermedias del último label_image() (blurred, y hsv
+        en el camino HSV), con la misma validez que su resultado.
+        """
+        if self._views_shape is None:
+            return {}
+        if self.use_bgr_lut:
+            return {"blurred": self._views[0][0]}
+        blurred, hsv = self._views[0]
+        return {"blurred": blurred, "hsv": hsv}
+
+    def detect(self, frame_bgr: np.ndarray, min_area: Optional[float] = None) -> Optional[DetectedPattern]:
+        if frame_bgr is None or frame_bgr.size == 0:
+            return None
+        if min_area is None:
+            min_area = self.min_area
+
+        clean = self.label_image(frame_bgr)
+        # sample es la muestra de la imagen abierta: el cierre no añade
+        # colores, así que los presentes son los mismos
+        _, planes, sample, sample_mask = self._views
+
+        mask = planes[-1]
+        best: Optional[DetectedPattern] = None
+        for color_idx, color_name in enumerate(self.lut.color_names, start=1):
+            # Presencia sobre la imagen muestreada, como en _find_candidates
+            cv2.compare(sample, color_idx, cv2.CMP_EQ, dst=sample_mask)
+            if cv2.countNonZero(sample_mask) == 0:
+                continue
+            cv2.compare(clean, color_idx, cv2.CMP_EQ, dst=mask)
+            for p in _patterns_from_mask(mask, color_name, min_area):
+                if best is None or p.area > best.area:
+                    best = p
 
-    if not candidates:
-        return None
+        if METRICS.enabled:
+            METRICS.inc("detections", detector="color", label=best.label if best is not None else "none")
+        return best
 
-    # Elegimos el patrón con mayor área (el principal en la escena)
-    best = max(candidates, key=lambda p: p.area)
-    return best
+    __call__ = detect
 
 
 # ----------------------------
@@ -186,21 +857,20 @@ def draw_detected_pattern(
     pattern: Optional[DetectedPattern]
 ) -> np.ndarray:
     """
-    Dibuja contorno, centro y etiqueta del patrón detectado.
-    Si pattern es None, devuelve la imagen original.
+    Dibuja contorno, centro y etiqueta del patrón detectado sobre
+    frame_bgr (in place, como OverlayCompositor) y lo devuelve.
+    Si pattern es None, devuelve la imagen sin tocar.
     """
     if frame_bgr is None or pattern is None:
         return frame_bgr
 
-    out = frame_bgr.copy()
-
-    cv2.drawContours(out, [pattern.contour], -1, (0, 255, 0), 2)
+    cv2.drawContours(frame_bgr, [pattern.contour], -1, (0, 255, 0), 2)
     cx, cy = pattern.center
-    cv2.circle(out, (cx, cy), 5, (255, 255, 255), -1)
+    cv2.circle(frame_bgr, (cx, cy), 5, (255, 255, 255), -1)
 
     text = pattern.label
     cv2.putText(
-        out,
+        frame_bgr,
         text,
         (cx - 60, cy - 10),
         cv2.FONT_HERSHEY_SIMPLEX,
@@ -210,7 +880,7 @@ def draw_detected_pattern(
         cv2.LINE_AA
     )
     cv2.putText(
-        out,
+        frame_bgr,
         text,
         (cx - 60, cy - 10),
         cv2.FONT_HERSHEY_SIMPLEX,
@@ -220,4 +890,4 @@ def draw_detected_pattern(
         cv2.LINE_AA
     )
 
-    return out
+    return frame_bgr
@@ -0,0 +1,424 @@
+# detectors.py
+#
+# Registro de detectores sobre un contexto por frame. FrameContext
+# calcula las imágenes derivadas (gris, Otsu, blur, HSV, etiquetas de
+# color...) la primera vez que un detector las pide y las comparte
+# con el resto, así que ejecutar varios detectores sobre el mismo
+# frame no repite el preprocesado común.
+#
+# Detectores incluidos (mismo resultado que la función original):
+#   "pattern" -> main.detect_pattern: (letra, thresh, bbox)
+#   "letter"  -> utils.detect_pattern: letra
+#   "color"   -> color_shape_detector.detect_color_shape: DetectedPattern
+#
+# Un detector nuevo es una función ctx -> resultado:
+#   @register("mi_detector")
+#   def mi_detector(ctx):
+#       mask = ctx.get("mi_mascara", lambda: cv2.inRange(ctx.hsv, LOW, HIGH))
+#       ...
+#
+# Es la única tabla de detectores: batch_detect, shm_ring y
+# stream_server los usan por nombre a través de Detector (opciones
+# fijas y buffers propios), así que uno registrado aquí está
+# disponible en todos.
+#
+# Ejemplo (desde la raíz del repositorio):
+#   python src/detectors.py "data/*.jpg" --detectors pattern,letter,color
+
+from __future__ import annotations
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import argparse
+import glob
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from color_shape_detector import (
+    KERNEL,
+    ColorShapeDetector,
+    DetectedPattern,
+    _build_label_image,
+    _build_label_image_bgr,
+    _candidates_from_labels,
+    _clean_label_image,
+    _detect_color_shape_pyramid,
+    get_bgr_lut,
+    get_color_lut,
+)
+from metrics import METRICS
+
+DetectorFn = Callable[["FrameContext"], Any]
+
+REGISTRY: Dict[str, DetectorFn] = {}
+
+
+def register(name: str) -> Callable[[DetectorFn], DetectorFn]:
+    """Decorador: registra fn(ctx) con ese nombre (sustituye al anterior)."""
+    def decorator(fn: DetectorFn) -> DetectorFn:
+        REGISTRY[name] = fn
+        return fn
+    return decorator
+
+
+# ----------------------------
+# Contexto por frame
+# ----------------------------
+
+class FrameContext:
+    """
+    Frame BGR + imágenes derivadas calculadas bajo demanda. Cada
+    derivada se calcula como mucho una vez por contexto; los
+    detectores no deben modificarlas.
+
+    Opciones que leen los detectores: min_area (None = el de cada
+    detector), pyramid_scale (< 1: búsqueda en la imagen reducida y
+    refinado del ganador, sin compartir derivadas) y use_bgr_lut
+    (etiquetas de color desde BGR).
+    """
+
+    def __init__(
+        self,
+        frame: np.ndarray,
+        color_detector: Optional[ColorShapeDetector] = None,
+        min_area: Optional[float] = None,
+        pyramid_scale: float = 1.0,
+        use_bgr_lut: bool = False,
+        color_factory: Optional[Callable[[], ColorShapeDetector]] = None
+    ):
+        self.frame = frame
+        # Con un ColorShapeDetector, el camino de color usa sus buffers
+        # reservados; sus imágenes valen hasta que procese otro frame.
+        # color_factory lo da sólo si algún detector pide color_labels
+        self.color_detector = color_detector
+        self.color_factory = color_factory
+        self.min_area = min_area
+        self.pyramid_scale = pyramid_scale
+        self.use_bgr_lut = use_bgr_lut
+        self._cache: Dict[Any, Any] = {}
+        self.computed: List[Any] = []   # claves calculadas, en orden (para medir)
+
+    def get(self, key: Any, compute: Callable[[], Any]) -> Any:
+        """Valor de key, llamando a compute() sólo la primera vez."""
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = compute()
+            self.computed.append(key)
+            return value
+
+    def area(self, default: float) -> float:
+        """min_area del contexto, o default si no se ha fijado."""
+        return default if self.min_area is None else self.min_area
+
+    # Camino de umbral (main/utils.detect_pattern)
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self.get("gray", lambda: cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def otsu(self) -> Tuple[float, np.ndarray]:
+        """(umbral, máscara) de Otsu invertida: objetos oscuros a 255."""
+        return self.get("otsu", lambda: cv2.threshold(
+            self.gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU))
+
+    @property
+    def otsu_clean(self) -> np.ndarray:
+        """Máscara de Otsu tras apertura + cierre (utils._clean_thresh)."""
+        from utils import _clean_thresh
+        return self.get("otsu_clean", lambda: _clean_thresh(self.otsu[1]))
+
+    @property
+    def largest_dark(self) -> Tuple[Optional[np.ndarray], float]:
+        """(contorno, área) del mayor objeto de otsu_clean, o (None, 0.0)."""
+        def compute():
+            cnts, _ = cv2.findContours(self.otsu_clean, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            if not cnts:
+                return None, 0.0
+            c = max(cnts, key=cv2.contourArea)
+            return c, cv2.contourArea(c)
+        return self.get("largest_dark", compute)
+
+    # Camino de color (detect_color_shape)
+
+    @property
+    def blurred(self) -> np.ndarray:
+        return self.get("blurred", lambda: cv2.GaussianBlur(self.frame, (5, 5), 0))
+
+    @property
+    def hsv(self) -> np.ndarray:
+        return self.get("hsv", lambda: cv2.cvtColor(self.blurred, cv2.COLOR_BGR2HSV))
+
+    @property
+    def color_labels(self) -> np.ndarray:
+        """Imagen de etiquetas de COLOR_RANGES ya limpia."""
+        return self.get("color_labels", self._compute_color_labels)
+
+    def _compute_color_labels(self) -> np.ndarray:
+        det = self.color_detector
+        if det is None and self.color_factory is not None:
+            det = self.color_detector = self.color_factory()
+        if det is None and self.use_bgr_lut:
+            return _clean_label_image(_build_label_image_bgr(self.blurred, get_bgr_lut()), KERNEL)
+        if det is None:
+            return _clean_label_image(_build_label_image(self.hsv, get_color_lut()), KERNEL)
+        labels = det.label_image(self.frame)
+        for key, image in det.intermediates().items():
+            self._cache.setdefault(key, image)
+        return labels
+
+    def color_candidates(self, min_area: float = 1000.0) -> List[DetectedPattern]:
+        return self.get(("color_candidates", min_area), lambda: _candidates_from_labels(
+            self.color_labels, get_color_lut().color_names, min_area, KERNEL))
+
+
+# ----------------------------
+# Detectores incluidos
+# ----------------------------
+
+@register("pattern")
+def detect_pattern(ctx: FrameContext) -> Tuple[Optional[str], np.ndarray, Optional[Tuple[int, int, int, int]]]:
+    """main.detect_pattern sobre el contexto."""
+    from main import MIN_AREA, clasificar_contorno
+
+    min_area = ctx.area(MIN_AREA)
+    if ctx.pyramid_scale < 1.0:
+        from utils import find_largest_contour
+        c, area, thresh = find_largest_contour(ctx.frame, min_area, ctx.pyramid_scale)
+    else:
+        thresh = ctx.otsu_clean
+        c, area = ctx.largest_dark
+        if area < min_area:
+            c = None
+    letra, bbox = clasificar_contorno(c, area) if c is not None else (None, None)
+    if METRICS.enabled:
+        METRICS.inc("detections", detector="pattern", label=letra or "none")
+    return letra, thresh, bbox
+
+
+@register("letter")
+def detect_letter(ctx: FrameContext) -> Optional[str]:
+    """utils.detect_pattern sobre el contexto."""
+    from utils import MIN_AREA, classify_contour, find_largest_contour
+
+    min_area = ctx.area(MIN_AREA)
+    if ctx.pyramid_scale < 1.0:
+        c, area, _ = find_largest_contour(ctx.frame, min_area, ctx.pyramid_scale, full_thresh=False)
+    else:
+        c, area = ctx.largest_dark
+        if area < min_area:
+            c = None
+    letra = classify_contour(c, area) if c is not None else None
+    if METRICS.enabled:
+        METRICS.inc("detections", detector="letter", label=letra or "none")
+    return letra
+
+
+@register("color")
+def detect_color(ctx: FrameContext) -> Optional[DetectedPattern]:
+    """detect_color_shape sobre el contexto."""
+    min_area = ctx.area(1000.0)
+    if ctx.pyramid_scale < 1.0:
+        best = _detect_color_shape_pyramid(ctx.frame, min_area, ctx.use_bgr_lut, ctx.pyramid_scale)
+    else:
+        candidates = ctx.color_candidates(min_area)
+        best = max(candidates, key=lambda p: p.area) if candidates else None
+    if METRICS.enabled:
+        METRICS.inc("detections", detector="color", label=best.label if best is not None else "none")
+    return best
+
+
+# ----------------------------
+# Detector con opciones fijas
+# ----------------------------
+
+class Detector:
+    """
+    Un detector del registro como función frame -> resultado, con las
+    opciones de FrameContext fijas. Tiene su propio ColorShapeDetector,
+    creado la primera vez que se usa el camino de color (los detectores
+    de umbral no reservan buffers ni cargan la LUT), así que el camino
+    de color reutiliza buffers entre frames: no es seguro entre hilos,
+    uno por hilo o proceso de detección.
+
+    detector(frame, min_area) tiene la firma de ColorShapeDetector y
+    se puede usar como detect_fn de ColorShapeTracker (o de
+    PatternTracker con "pattern").
+    """
+
+    def __init__(
+        self,
+        name: str,
+        min_area: Optional[float] = None,
+        pyramid_scale: float = 1.0,
+        use_bgr_lut: bool = False
+    ):
+        if name not in REGISTRY:
+            raise ValueError(f"Detector desconocido: {name} (registrados: {', '.join(REGISTRY)})")
+        self.name = name
+        self.fn = REGISTRY[name]
+        self.min_area = min_area
+        self.pyramid_scale = pyramid_scale
+        self.use_bgr_lut = use_bgr_lut
+        self._color_detector: Optional[ColorShapeDetector] = None
+
+    @property
+    def color_detector(self) -> ColorShapeDetector:
+        if self._color_detector is None:
+            self._color_detector = ColorShapeDetector(use_bgr_lut=self.use_bgr_lut)
+        return self._color_detector
+
+    def context(self, frame: np.ndarray, min_area: Optional[float] = None) -> FrameContext:
+        return FrameContext(
+            frame,
+            self._color_detector,
+            self.min_area if min_area is None else min_area,
+            self.pyramid_scale,
+            self.use_bgr_lut,
+            color_factory=lambda: self.color_detector,
+        )
+
+    def __call__(self, frame: np.ndarray, min_area: Optional[float] = None) -> Any:
+        return self.fn(self.context(frame, min_area))
+
+
+@lru_cache(maxsize=None)
+def worker_detector(
+    name: str,
+    min_area: Optional[float] = None,
+    pyramid_scale: float = 1.0,
+    use_bgr_lut: bool = False
+) -> Detector:
+    """
+    Detector compartido por todas las llamadas del proceso con las
+    mismas opciones (workers de batch_detect y shm_ring, que detectan
+    en un solo hilo): los buffers se reservan una vez por proceso.
+    """
+    return Detector(name, min_area, pyramid_scale, use_bgr_lut)
+
+
+def result_label(result: Any) -> Optional[str]:
+    """Etiqueta de un resultado de los detectores incluidos."""
+    if result is None or isinstance(result, str):
+        return result
+    if isinstance(result, DetectedPattern):
+        return result.label
+    if isinstance(result, tuple):
+        return result[0]
+    return getattr(result, "label", None)
+
+
+def result_fields(result: Any) -> Dict[str, Any]:
+    """
+    Campos de un resultado para guardarlo o enviarlo a otro proceso:
+    label y, si el detector los da, color, shape, area, center,
+    contour (Nx2 int16) y bbox (x, y, w, h).
+    """
+    if isinstance(result, DetectedPattern):
+        return {
+            "label": result.label,
+            "color": result.color,
+            "shape": result.shape,
+            "area": float(result.area),
+            "center": result.center,
+            "contour": result.contour.reshape(-1, 2).astype(np.int16),
+            "bbox": cv2.boundingRect(result.contour),
+        }
+    fields: Dict[str, Any] = {"label": result_label(result)}
+    bbox = result[2] if isinstance(result, tuple) and len(result) > 2 else None
+    if bbox is not None:
+        x, y, w, h = bbox
+        fields["center"] = (x + w // 2, y + h // 2)
+        fields["bbox"] = bbox
+    return fields
+
+
+def run_detectors(
+    frame: np.ndarray,
+    names: Optional[Sequence[str]] = None,
+    ctx: Optional[FrameContext] = None,
+    color_detector: Optional[ColorShapeDetector] = None
+) -> Dict[str, Any]:
+    """
+    Ejecuta los detectores (todos por defecto) con un contexto
+    compartido. color_detector: ver FrameContext.
+    """
+    if ctx is None:
+        ctx = FrameContext(frame, color_detector)
+    results = {}
+    for name in names or list(REGISTRY):
+        with METRICS.time(f"detector.{name}"):
+            results[name] = REGISTRY[name](ctx)
+    return results
+
+
+# ----------------------------
+# Programa
+# ----------------------------
+
+def _separate(frame: np.ndarray, names: Sequence[str]) -> Dict[str, Any]:
+    """Las funciones originales, cada una con su propio preprocesado."""
+    import main
+    import utils
+    from color_shape_detector import detect_color_shape
+
+    originals = {"pattern": main.detect_pattern, "letter": utils.detect_pattern, "color": detect_color_shape}
+    return {name: originals[name](frame) for name in names}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Varios detectores sobre un contexto compartido")
+    parser.add_argument("images", nargs="?", default="data/*.jpg")
+    parser.add_argument("--detectors", default="pattern,letter,color",
+                        help="lista separada por comas de: " + ",".join(REGISTRY))
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = [n.strip() for n in args.detectors.split(",") if n.strip()]
+    unknown = [n for n in names if n not in REGISTRY]
+    if unknown:
+        print("Detectores desconocidos:", ", ".join(unknown))
+        return 1
+    frames = [cv2.imread(p) for p in sorted(glob.glob(args.images))]
+    if not frames:
+        print("No se han encontrado imágenes en", args.images)
+        return 1
+
+    def best_ms(fn) -> float:
+        fn(frames[0])
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            for frame in frames:
+                fn(frame)
+            best = min(best, (time.perf_counter() - t0) / len(frames))
+        return 1000 * best
+
+    for name in names:
+        print(f"{name:10s} solo:       {best_ms(lambda f: _separate(f, [name])):7.2f} ms/frame")
+    originals = [n for n in names if n in ("pattern", "letter", "color")]
+    if originals:
+        print(f"{'originales':10s} seguidos:   {best_ms(lambda f: _separate(f, originals)):7.2f} ms/frame")
+    print(f"{'registro':10s} compartido: {best_ms(lambda f: run_detectors(f, names)):7.2f} ms/frame")
+    color_detector = ColorShapeDetector()
+    print(f"{'registro':10s} + buffers:  "
+          f"{best_ms(lambda f: run_detectors(f, names, color_detector=color_detector)):7.2f} ms/frame")
+
+    mismatches = 0
+    for frame in frames:
+        expected = _separate(frame, originals)
+        for shared in (run_detectors(frame, originals),
+                       run_detectors(frame, originals, color_detector=color_detector)):
+            mismatches += sum(result_label(expected[n]) != result_label(shared[n]) for n in originals)
+    print(f"etiquetas distintas entre registro y originales: {mismatches}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
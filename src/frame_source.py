@@ -0,0 +1,381 @@
+# frame_source.py
+#
+# Fuentes de frames intercambiables con cv2.VideoCapture y formato de
+# grabación de sesiones.
+#
+# Una grabación (.frames) es un fichero de sólo-añadir: una cabecera
+# fija seguida de registros [timestamp float64 | frame uint8 en bruto],
+# todos del mismo tamaño. No hay índice: el número de frames sale del
+# tamaño del fichero, así que una grabación cortada a medias sigue
+# siendo legible (se ignora el último registro incompleto).
+#
+# La reproducción mapea el fichero en memoria y devuelve vistas NumPy
+# de cada registro: sin decodificar ni copiar, y con los mismos bytes
+# que se capturaron.
+#
+# Ejemplos (desde la raíz del repositorio):
+#   python src/frame_source.py record 0 -o sesion.frames --seconds 30
+#   python src/frame_source.py info sesion.frames
+#   python src/frame_source.py bench sesion.frames --detector color
+#   python src/run_color_shape_live.py --source sesion.frames
+
+from __future__ import annotations
+from typing import Any, Iterator, Optional, Tuple
+import argparse
+import hashlib
+import os
+import struct
+import sys
+import time
+
+import cv2
+import numpy as np
+
+RECORDING_MAGIC = b"CSDFRAME"
+RECORDING_VERSION = 1
+RECORDING_EXT = ".frames"
+
+# magic, versión, alto, ancho, canales, fps nominal; relleno hasta 64 bytes
+_HEADER = struct.Struct("<8sIIIId")
+HEADER_SIZE = 64
+
+
+def _record_dtype(height: int, width: int, channels: int) -> np.dtype:
+    shape = (height, width, channels) if channels > 1 else (height, width)
+    return np.dtype([("t", "<f8"), ("frame", np.uint8, shape)])
+
+
+def _read_header(path: str) -> Tuple[int, int, int, float]:
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"{path}: cabecera incompleta")
+    magic, version, height, width, channels, fps = _HEADER.unpack_from(raw)
+    if magic != RECORDING_MAGIC:
+        raise ValueError(f"{path}: no es una grabación de frames")
+    if version != RECORDING_VERSION:
+        raise ValueError(f"{path}: versión {version} no soportada (se esperaba {RECORDING_VERSION})")
+    return height, width, channels, fps
+
+
+def is_recording(path: str) -> bool:
+    return path.endswith(RECORDING_EXT) and os.path.isfile(path)
+
+
+# ----------------------------
+# Grabación
+# ----------------------------
+
+class FrameRecorder:
+    """
+    Añade frames a una grabación. Si el fichero ya existe, sus
+    dimensiones deben coincidir con las del primer frame y se
+    continúa al final.
+    """
+
+    def __init__(self, path: str, fps: float = 30.0):
+        self.path = path
+        self.fps = fps
+        self.count = 0
+        self._file = None
+        self._shape: Optional[Tuple[int, ...]] = None
+        self._record_size = 0
+
+    def _open(self, frame: np.ndarray):
+        h, w = frame.shape[:2]
+        c = frame.shape[2] if frame.ndim == 3 else 1
+        self._shape = frame.shape
+        self._record_size = _record_dtype(h, w, c).itemsize
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            if _read_header(self.path)[:3] != (h, w, c):
+                raise ValueError(f"{self.path}: las dimensiones no coinciden con {frame.shape}")
+            # Se descarta un posible registro incompleto al final
+            size = os.path.getsize(self.path)
+            n = (size - HEADER_SIZE) // self._record_size
+            with open(self.path, "r+b") as f:
+                f.truncate(HEADER_SIZE + n * self._record_size)
+        else:
+            header = _HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, h, w, c, self.fps)
+            with open(self.path, "wb") as f:
+                f.write(header.ljust(HEADER_SIZE, b"\0"))
+        self._file = open(self.path, "ab")
+
+    def write(self, frame: np.ndarray, timestamp: Optional[float] = None):
+        if frame.dtype != np.uint8:
+            raise ValueError("sólo se graban frames uint8")
+        if self._file is None:
+            self._open(frame)
+        elif frame.shape != self._shape:
+            raise ValueError(f"frame {frame.shape} distinto de {self._shape}")
+        t = time.time() if timestamp is None else timestamp
+        self._file.write(struct.pack("<d", t))
+        self._file.write(np.ascontiguousarray(frame).data)
+        self.count += 1
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "FrameRecorder":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class RecordingCapture:
+    """
+    Envuelve una captura y graba cada frame leído. Misma interfaz
+    que la captura envuelta.
+    """
+
+    def __init__(self, capture: Any, recorder: FrameRecorder):
+        self.capture = capture
+        self.recorder = recorder
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        ret, frame = self.capture.read()
+        if ret:
+            self.recorder.write(frame)
+        return ret, frame
+
+    def release(self):
+        self.recorder.close()
+        self.capture.release()
+
+    def __getattr__(self, name):
+        return getattr(self.capture, name)
+
+
+# ----------------------------
+# Reproducción
+# ----------------------------
+
+class ReplaySource:
+    """
+    Reproduce una grabación con la interfaz de cv2.VideoCapture.
+
+    realtime=True respeta los intervalos grabados (divididos por
+    speed); con False se entrega lo más rápido posible.
+
+    Los frames son vistas del fichero mapeado en modo copy-on-write:
+    dibujar sobre ellos no modifica la grabación. Al volver atrás
+    (set(CAP_PROP_POS_FRAMES, n) o loop) se mapea de nuevo, así que
+    cada pasada recibe exactamente los bytes grabados.
+    """
+
+    def __init__(self, path: str, realtime: bool = False, loop: bool = False, speed: float = 1.0):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.speed = speed
+        self.height, self.width, self.channels, self.fps = _read_header(path)
+        self._dtype = _record_dtype(self.height, self.width, self.channels)
+        self._records: Optional[np.ndarray] = None
+        self.pos = 0
+        self.timestamp: Optional[float] = None   # instante grabado del último frame
+        self._map()
+
+    def _map(self):
+        n = (os.path.getsize(self.path) - HEADER_SIZE) // self._dtype.itemsize
+        if n > 0:
+            self._records = np.memmap(self.path, dtype=self._dtype, mode="c", offset=HEADER_SIZE, shape=(n,))
+        else:
+            self._records = np.empty(0, self._dtype)
+        self._t_start: Optional[Tuple[float, float]] = None   # (reloj, timestamp) al empezar la pasada
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._records["t"]
+
+    def isOpened(self) -> bool:
+        return self._records is not None
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self._records is None:
+            return False, None
+        if self.pos >= len(self._records):
+            if not self.loop or len(self._records) == 0:
+                return False, None
+            self.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+        record = self._records[self.pos]
+        t = float(record["t"])
+        if self.realtime:
+            now = time.perf_counter()
+            if self._t_start is None:
+                self._t_start = (now, t)
+            else:
+                delay = self._t_start[0] + (t - self._t_start[1]) / self.speed - now
+                if delay > 0:
+                    time.sleep(delay)
+
+        self.pos += 1
+        self.timestamp = t
+        return True, record["frame"]
+
+    def frames(self) -> Iterator[np.ndarray]:
+        """Itera los frames restantes (sin pausas de tiempo real)."""
+        for i in range(self.pos, len(self._records)):
+            yield self._records[i]["frame"]
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self._records))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.pos)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        return 0.0
+
+    def set(self, prop: int, value: float) -> bool:
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        pos = int(value)
+        if pos < self.pos:
+            # Nueva pasada: se descartan las páginas modificadas
+            self._map()
+        self.pos = min(max(pos, 0), len(self._records))
+        self._t_start = None
+        return True
+
+    def release(self):
+        self._records = None
+
+
+def open_source(source: str, realtime: bool = True, loop: bool = False) -> Any:
+    """
+    Índice de cámara ("0"), grabación (.frames) o vídeo/imagen que
+    entienda cv2.VideoCapture.
+    """
+    if source.isdigit():
+        return cv2.VideoCapture(int(source))
+    if is_recording(source):
+        return ReplaySource(source, realtime=realtime, loop=loop)
+    return cv2.VideoCapture(source)
+
+
+def add_arguments(parser):
+    """Opciones --source / --record comunes a los programas en vivo."""
+    parser.add_argument("--source", default="0",
+                        help="índice de cámara, vídeo o grabación .frames (por defecto, cámara 0)")
+    parser.add_argument("--fast", action="store_true",
+                        help="reproducir la grabación lo más rápido posible en lugar de en tiempo real")
+    parser.add_argument("--record", default=None, metavar="FICHERO.frames",
+                        help="grabar los frames capturados (se añaden si el fichero existe)")
+
+
+def open_from_args(args) -> Any:
+    cap = open_source(args.source, realtime=not args.fast)
+    if args.record and cap.isOpened():
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        cap = RecordingCapture(cap, FrameRecorder(args.record, fps))
+    return cap
+
+
+# ----------------------------
+# Programa
+# ----------------------------
+
+def _cmd_record(args) -> int:
+    cap = open_source(args.source, realtime=False)
+    if not cap.isOpened():
+        print("No se ha podido abrir la fuente:", args.source)
+        return 1
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    deadline = None if args.seconds is None else time.perf_counter() + args.seconds
+    with FrameRecorder(args.output, fps) as recorder:
+        try:
+            while args.frames is None or recorder.count < args.frames:
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                recorder.write(frame)
+        except KeyboardInterrupt:
+            pass
+    cap.release()
+    print(f"{recorder.count} frames grabados en {args.output}")
+    return 0
+
+
+def _cmd_info(args) -> int:
+    src = ReplaySource(args.recording)
+    ts = src.timestamps
+    duration = float(ts[-1] - ts[0]) if len(ts) > 1 else 0.0
+    print(f"{args.recording}: {len(src)} frames {src.width}x{src.height}x{src.channels}, "
+          f"fps nominal {src.fps:.2f}, duración {duration:.2f} s")
+    return 0
+
+
+def _cmd_bench(args) -> int:
+    """Reproduce la grabación por un detector y un sistema de contraseña."""
+    from stream_server import default_users, make_detector
+    from DetectorContrasena import TIEMPO_RESET, DetectorContrasena
+    from password_engine import PasswordEngine
+
+    src = ReplaySource(args.recording, realtime=False)
+    detect = make_detector(args.detector)
+    password = DetectorContrasena(engine=PasswordEngine(default_users(args.detector)), tiempo_reset=TIEMPO_RESET)
+
+    digest = hashlib.sha1()
+    unlocks = 0
+    t0 = time.perf_counter()
+    # El reloj de la contraseña es el de la grabación: el resultado no
+    # depende de lo que tarde el detector
+    for t, frame in zip(src.timestamps, src.frames()):
+        label = detect(frame)
+        password.update(label, float(t))
+        digest.update((label or "-").encode() + b"\n")
+        if password.esta_desbloqueado():
+            unlocks += 1
+            password.reset()
+    elapsed = time.perf_counter() - t0
+
+    n = max(len(src), 1)
+    print(f"{len(src)} frames, {1000 * elapsed / n:.2f} ms/frame ({len(src) / max(elapsed, 1e-9):.1f} fps), "
+          f"{unlocks} desbloqueos, etiquetas sha1 {digest.hexdigest()[:12]}")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Grabación y reproducción de sesiones de frames")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record", help="grabar desde cámara o vídeo")
+    p.add_argument("source", nargs="?", default="0")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--frames", type=int, default=None)
+    p.add_argument("--seconds", type=float, default=None)
+
+    p = sub.add_parser("info", help="resumen de una grabación")
+    p.add_argument("recording")
+
+    from detectors import REGISTRY
+    p = sub.add_parser("bench", help="reproducir lo más rápido posible por un detector")
+    p.add_argument("recording")
+    p.add_argument("--detector", choices=sorted(REGISTRY), default="color")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    return {"record": _cmd_record, "info": _cmd_info, "bench": _cmd_bench}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,78 +1,38 @@
+import argparse
+
 import cv2
 import numpy as np
-import time
+ 
+import frame_source
+import metrics
+import motion_gate
+import undistort
+from DetectorContrasena import DetectorContrasena
+from metrics import METRICS, timed
+from overlay import OverlayCompositor, TextStyle
+from pipeline import LivePipeline
+from roi_tracker import PatternTracker
+from utils import find_largest_contour
  
 SECUENCIA_CORRECTA = ['A', 'C', 'D', 'B']
 TIEMPO_RESET = 5.0
+MIN_AREA = 800   # si no detecta nada, baja este número
  
  
-class DetectorContrasena:
-    def __init__(self, secuencia_correcta, tiempo_reset=5.0):
-        self.secuencia_correcta = secuencia_correcta
-        self.tiempo_reset = tiempo_reset
-        self.buffer = []
-        self.unlocked = False
-        self._ultimo_tiempo = time.time()
- 
-    def reset(self):
-        self.buffer = []
-        self.unlocked = False
-        self._ultimo_tiempo = time.time()
- 
-    def update(self, patron_detectado):
-        ahora = time.time()
- 
-        if ahora - self._ultimo_tiempo > self.tiempo_reset:
-            self.buffer = []
- 
-        self._ultimo_tiempo = ahora
- 
-        if patron_detectado is None:
-            return
- 
-        if patron_detectado not in self.secuencia_correcta:
-            self.buffer = []
-            return
- 
-        self.buffer.append(patron_detectado)
- 
-        if len(self.buffer) > len(self.secuencia_correcta):
-            self.buffer.pop(0)
- 
-        if self.buffer == self.secuencia_correcta:
-            self.unlocked = True
-            self.buffer = []
- 
-    def esta_desbloqueado(self):
-        return self.unlocked
- 
- 
-def detect_pattern(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+@timed("pattern.detect_pattern")
+def detect_pattern(frame, pyramid_scale=1.0, min_area=MIN_AREA):
+    c, area, thresh = find_largest_contour(frame, min_area, pyramid_scale)
  
-    _, thresh = cv2.threshold(
-        gray, 0, 255,
-        cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU
-    )
- 
-    kernel = np.ones((5, 5), np.uint8)
-    thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
-    thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
- 
-    contours, _ = cv2.findContours(
-        thresh, cv2.RETR_EXTERNAL,
-        cv2.CHAIN_APPROX_SIMPLE
-    )
- 
-    if len(contours) == 0:
+    if c is None:
         return None, thresh, None
  
-    c = max(contours, key=cv2.contourArea)
-    area = cv2.contourArea(c)
+    letra, bbox = clasificar_contorno(c, area)
+    METRICS.inc("detections", detector="pattern", label=letra or "none")
+    return letra, thresh, bbox
  
-    if area < 800:  # si no detecta nada, baja este número
-        return None, thresh, None
  
+def clasificar_contorno(c, area):
+    """Letra (o None) y bbox del contorno; compartido con detectors.py."""
     x, y, w, h = cv2.boundingRect(c)
     aspect_ratio = w / (h + 1e-6)
  
@@ -90,45 +50,96 @@ def detect_pattern(frame):
     elif 0.85 < aspect_ratio < 1.15:
         letra = 'D'
  
-    return letra, thresh, (x, y, w, h)
+    return letra, (x, y, w, h)
  
  
-def main():
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("No se puede abrir la cámara")
-        return
+ESTILO_PATRON = TextStyle(scale=1, color=(0, 0, 255), outline=None, thickness=2, line_type=cv2.LINE_8)
+ESTILO_DESBLOQUEO = TextStyle(scale=1.2, color=(0, 255, 0), outline=None, thickness=3, line_type=cv2.LINE_8)
  
-    detector = DetectorContrasena(SECUENCIA_CORRECTA, tiempo_reset=TIEMPO_RESET)
  
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Contraseña por secuencia de letras")
+    parser.add_argument("--headless", action="store_true",
+                        help="sin ventanas: sólo imprime los desbloqueos (Ctrl+C para salir)")
+    frame_source.add_arguments(parser)
+    motion_gate.add_arguments(parser)
+    metrics.add_arguments(parser)
+    undistort.add_arguments(parser)
+    return parser.parse_args(argv)
  
-        patron, thresh, bbox = detect_pattern(frame)
-        detector.update(patron)
  
-        if bbox is not None:
-            x, y, w, h = bbox
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+def main(argv=None):
+    args = parse_args(argv)
+    cap = frame_source.open_from_args(args)
+    if not cap.isOpened():
+        print("No se puede abrir la fuente:", args.source)
+        return
  
-        texto_patron = f"Patron: {patron}" if patron is not None else "Patron: ninguno"
-        cv2.putText(frame, texto_patron, (20, 40),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    dumper = metrics.setup_from_args(args)
+    detector = DetectorContrasena(SECUENCIA_CORRECTA, tiempo_reset=TIEMPO_RESET)
+    tracker = PatternTracker(detect_pattern)
  
-        if detector.esta_desbloqueado():
-            cv2.putText(frame, "DESBLOQUEADO", (20, 90),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
+    # Con calibración se corrige el frame completo (mapas de remap
+    # precalculados), porque el umbral y el bbox salen de la imagen
+    undistorter = undistort.undistorter_from_args(args)
+    preprocess = undistorter.undistort_frame if undistorter is not None else None
  
-        cv2.imshow("Seguridad", frame)
-        cv2.imshow("Thresh", thresh)
+    # Con la escena quieta se reutiliza la última detección; update()
+    # se sigue llamando en cada frame para que tiempo_reset no cambie
+    detectar = motion_gate.wrap_from_args(args, tracker.detect)
  
-        if cv2.waitKey(1) & 0xFF == 27:
-            break
+    def procesar(frame):
+        # Se ejecuta en el hilo de detección: ningún frame detectado
+        # se pierde para la secuencia de la contraseña
+        patron, thresh, bbox = detectar(frame)
+        detector.update(patron)
+        return patron, thresh, bbox
+ 
+    overlay = OverlayCompositor()
+    desbloqueado = False
+ 
+    # Se crea fuera del try: un Ctrl+C durante la construcción sale con
+    # su propio KeyboardInterrupt, y después pipeline siempre existe
+    pipeline = LivePipeline(cap, procesar, preprocess_fn=preprocess)
+    try:
+        with pipeline:
+            for frame, (patron, thresh, bbox) in pipeline.results():
+                if args.headless:
+                    if detector.esta_desbloqueado() and not desbloqueado:
+                        print("DESBLOQUEADO")
+                    desbloqueado = detector.esta_desbloqueado()
+                    continue
+ 
+                if bbox is not None:
+                    x, y, w, h = bbox
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+ 
+                texto_patron = f"Patron: {patron}" if patron is not None else "Patron: ninguno"
+                overlay.set_text("patron", texto_patron, (20, 40), ESTILO_PATRON)
+ 
+                if detector.esta_desbloqueado():
+                    overlay.set_text("desbloqueo", "DESBLOQUEADO", (20, 90), ESTILO_DESBLOQUEO)
+                else:
+                    overlay.remove("desbloqueo")
+                overlay.draw(frame)
+ 
+                cv2.imshow("Seguridad", frame)
+                cv2.imshow("Thresh", thresh)
+ 
+                if cv2.waitKey(1) & 0xFF == 27:
+                    break
+    except KeyboardInterrupt:
+        pass
+ 
+    print("Frames:", pipeline.stats())
+    if isinstance(detectar, motion_gate.MotionGate):
+        print("Puerta de movimiento:", detectar.stats())
+    if dumper is not None:
+        dumper.stop()
  
     cap.release()
-    cv2.destroyAllWindows()
+    if not args.headless:
+        cv2.destroyAllWindows()
  
  
 if __name__ == "__main__":
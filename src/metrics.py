@@ -0,0 +1,363 @@
+# metrics.py
+#
+# Instrumentación opcional: tiempos por etapa (histogramas), contadores
+# (frames, descartes, detecciones por etiqueta) y fps. Desactivada por
+# defecto; en ese caso cada punto de medida cuesta una comprobación de
+# un booleano, así que puede quedarse siempre en el código.
+#
+# Exportación:
+#   - HTTP local en formato de texto de Prometheus (/metrics)
+#   - volcado periódico a JSONL
+#
+# Uso:
+#   from metrics import METRICS
+#   with METRICS.time("color.blur"):
+#       ...
+#   METRICS.inc("detections", label="red_circle")
+
+from __future__ import annotations
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import functools
+import json
+import threading
+import time
+
+PREFIX = "csd"
+
+# Límites superiores (segundos) de los buckets de los histogramas
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Aproximación por buckets (límite superior del bucket)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        acc = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            acc += n
+            if acc >= target:
+                return bound
+        return float("inf")
+
+
+class _Meter:
+    """fps como media móvil exponencial del intervalo entre eventos."""
+    __slots__ = ("last", "fps")
+
+    def __init__(self):
+        self.last: Optional[float] = None
+        self.fps = 0.0
+
+    def mark(self, now: float):
+        if self.last is not None and now > self.last:
+            inst = 1.0 / (now - self.last)
+            self.fps = inst if self.fps == 0.0 else 0.9 * self.fps + 0.1 * inst
+        self.last = now
+
+
+class _StageTimer:
+    __slots__ = ("registry", "name", "t0")
+
+    def __init__(self, registry: "Metrics", name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Metrics:
+    """Registro de métricas del proceso (ver METRICS)."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stages: Dict[str, _Histogram] = {}
+            self._counters: Dict[str, Dict[LabelKey, float]] = {}
+            self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+            self._meters: Dict[Tuple[str, LabelKey], _Meter] = {}
+            self._t_start = time.time()
+
+    # ----------------------------
+    # Registro
+    # ----------------------------
+
+    def time(self, stage: str):
+        """Context manager que mide la duración de una etapa."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = _Histogram()
+            hist.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def mark(self, name: str, **labels):
+        """Cuenta un evento (name_total) y actualiza su fps (name_fps)."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        key = _label_key(labels)
+        with self._lock:
+            meter = self._meters.get((name, key))
+            if meter is None:
+                meter = self._meters[(name, key)] = _Meter()
+            meter.mark(now)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + 1
+
+    # ----------------------------
+    # Exportación
+    # ----------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                name: {
+                    "count": h.count,
+                    "sum_s": round(h.sum, 6),
+                    "mean_ms": round(1000 * h.sum / h.count, 3) if h.count else None,
+                    "p50_ms_le": 1000 * h.quantile(0.5) if h.count else None,
+                    "p95_ms_le": 1000 * h.quantile(0.95) if h.count else None,
+                }
+                for name, h in self._stages.items()
+            }
+            counters = {
+                name: {",".join(f"{k}={v}" for k, v in key): value for key, value in series.items()}
+                for name, series in self._counters.items()
+            }
+            gauges = {
+                name: {",".join(f"{k}={v}" for k, v in key): value for key, value in series.items()}
+                for name, series in self._gauges.items()
+            }
+            fps = {
+                name + ("{" + ",".join(f"{k}={v}" for k, v in key) + "}" if key else ""): round(m.fps, 2)
+                for (name, key), m in self._meters.items()
+            }
+        return {
+            "time": round(time.time(), 3),
+            "uptime_s": round(time.time() - self._t_start, 3),
+            "stages": stages,
+            "counters": counters,
+            "gauges": gauges,
+            "fps": fps,
+        }
+
+    def prometheus_text(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            if self._stages:
+                name = f"{PREFIX}_stage_seconds"
+                lines.append(f"# HELP {name} Duración de cada etapa")
+                lines.append(f"# TYPE {name} histogram")
+                for stage, h in sorted(self._stages.items()):
+                    key = (("stage", stage),)
+                    acc = 0
+                    for bound, n in zip(BUCKETS, h.counts):
+                        acc += n
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', repr(bound)),))} {acc}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum:.9f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+
+            for counter, series in sorted(self._counters.items()):
+                name = f"{PREFIX}_{counter}_total"
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+            for gauge, series in sorted(self._gauges.items()):
+                name = f"{PREFIX}_{gauge}"
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+            typed = set()
+            for (meter, key), m in sorted(self._meters.items()):
+                name = f"{PREFIX}_{meter}_fps"
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name}{_format_labels(key)} {m.fps:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def timed(stage: str) -> Callable:
+    """Decorador: mide cada llamada como la etapa stage."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                METRICS.observe(stage, time.perf_counter() - t0)
+        return wrapper
+    return decorator
+
+
+# ----------------------------
+# Servidor HTTP y volcado JSONL
+# ----------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    registry: Metrics = METRICS
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # sin una línea por petición en la consola
+
+
+def start_http_server(port: int = 9108, host: str = "127.0.0.1", registry: Metrics = METRICS) -> ThreadingHTTPServer:
+    """Sirve /metrics en un hilo daemon. Devuelve el servidor (shutdown() para pararlo)."""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class JsonlDumper:
+    """Escribe un snapshot() cada interval segundos en path (una línea por volcado)."""
+
+    def __init__(self, path: str, interval: float = 10.0, registry: Metrics = METRICS):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-jsonl", daemon=True)
+
+    def start(self) -> "JsonlDumper":
+        self._thread.start()
+        return self
+
+    def dump(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.registry.snapshot(), ensure_ascii=False) + "\n")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(self.interval + 1.0)
+        self.dump()   # último estado al salir
+
+
+def add_arguments(parser):
+    """Opciones --metrics-port / --metrics-jsonl comunes a los programas en vivo."""
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="activar métricas y servirlas en http://127.0.0.1:PUERTO/metrics")
+    parser.add_argument("--metrics-jsonl", default=None,
+                        help="activar métricas y volcarlas periódicamente a este fichero JSONL")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="segundos entre volcados JSONL")
+
+
+def setup_from_args(args) -> Optional[JsonlDumper]:
+    """Activa las métricas según las opciones. Devuelve el JsonlDumper (o None)."""
+    if args.metrics_port is None and args.metrics_jsonl is None:
+        return None
+    METRICS.enable()
+    if args.metrics_port is not None:
+        start_http_server(args.metrics_port)
+        print(f"Métricas en http://127.0.0.1:{args.metrics_port}/metrics")
+    if args.metrics_jsonl is not None:
+        return JsonlDumper(args.metrics_jsonl, args.metrics_interval).start()
+    return None
@@ -0,0 +1,144 @@
+# overlay.py
+#
+# Composición de textos sobre los frames en vivo. Cada texto (con su
+# contorno) se rasteriza una sola vez en un sprite pequeño con alfa
+# premultiplicado; en cada frame sólo se mezcla el sprite en su
+# posición, directamente sobre el frame (sin copiarlo). Un texto se
+# vuelve a rasterizar únicamente cuando cambia su contenido o estilo.
+
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from color_shape_detector import DetectedPattern
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+@dataclass(frozen=True)
+class TextStyle:
+    scale: float = 0.7
+    color: Tuple[int, int, int] = (255, 255, 255)
+    outline: Optional[Tuple[int, int, int]] = (0, 0, 0)   # None = sin contorno
+    thickness: int = 1
+    outline_thickness: int = 3
+    line_type: int = cv2.LINE_AA
+
+
+class TextSprite:
+    """
+    Texto rasterizado con cv2.putText sobre fondo negro (alfa
+    premultiplicado). Mezclarlo sobre un frame da el mismo resultado
+    que llamar a putText sobre el frame, salvo redondeos.
+    """
+
+    def __init__(self, text: str, style: TextStyle):
+        thick = max(style.thickness, style.outline_thickness if style.outline else 0)
+        (w, h), baseline = cv2.getTextSize(text, FONT, style.scale, thick)
+        pad = thick
+        self.anchor = (pad, pad + h)   # origen (x, y) de putText dentro del sprite
+
+        size = (h + baseline + 2 * pad, w + 2 * pad)
+        self.color = np.zeros(size + (3,), np.uint8)
+        alpha = np.zeros(size, np.uint8)
+        if style.outline is not None:
+            cv2.putText(self.color, text, self.anchor, FONT, style.scale, style.outline,
+                        style.outline_thickness, style.line_type)
+            cv2.putText(alpha, text, self.anchor, FONT, style.scale, 255, style.outline_thickness, style.line_type)
+        cv2.putText(self.color, text, self.anchor, FONT, style.scale, style.color, style.thickness, style.line_type)
+        cv2.putText(alpha, text, self.anchor, FONT, style.scale, 255, style.thickness, style.line_type)
+        self.inv_alpha = cv2.cvtColor(255 - alpha, cv2.COLOR_GRAY2BGR)
+
+    def blit(self, frame: np.ndarray, org: Tuple[int, int]):
+        """Mezcla el sprite en frame (in place); org como en putText."""
+        sh, sw = self.color.shape[:2]
+        x0 = org[0] - self.anchor[0]
+        y0 = org[1] - self.anchor[1]
+
+        # Recorte a los bordes del frame
+        fx0, fy0 = max(x0, 0), max(y0, 0)
+        fx1, fy1 = min(x0 + sw, frame.shape[1]), min(y0 + sh, frame.shape[0])
+        if fx0 >= fx1 or fy0 >= fy1:
+            return
+        sx0, sy0 = fx0 - x0, fy0 - y0
+        sx1, sy1 = sx0 + (fx1 - fx0), sy0 + (fy1 - fy0)
+
+        roi = frame[fy0:fy1, fx0:fx1]
+        cv2.multiply(roi, self.inv_alpha[sy0:sy1, sx0:sx1], dst=roi, scale=1.0 / 255)
+        cv2.add(roi, self.color[sy0:sy1, sx0:sx1], dst=roi)
+
+
+class OverlayCompositor:
+    """
+    Capas de texto con nombre. set_text() sólo rasteriza si el texto
+    o el estilo cambian (los sprites se guardan en una caché LRU, así
+    que volver a un texto anterior tampoco lo rasteriza); draw() mezcla
+    todas las capas sobre el frame.
+    """
+
+    def __init__(self, cache_size: int = 64):
+        self.cache_size = cache_size
+        self._sprites: "OrderedDict[Tuple[str, TextStyle], TextSprite]" = OrderedDict()
+        self._layers: Dict[str, Tuple[TextSprite, Tuple[int, int]]] = {}
+        self._buffer: Optional[np.ndarray] = None
+        self.rendered = 0   # rasterizaciones hechas (para medir)
+
+    def sprite(self, text: str, style: TextStyle = TextStyle()) -> TextSprite:
+        key = (text, style)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = TextSprite(text, style)
+            self.rendered += 1
+            self._sprites[key] = sprite
+            if len(self._sprites) > self.cache_size:
+                self._sprites.popitem(last=False)
+        else:
+            self._sprites.move_to_end(key)
+        return sprite
+
+    def set_text(self, name: str, text: str, org: Tuple[int, int], style: TextStyle = TextStyle()):
+        if not text:
+            self._layers.pop(name, None)
+            return
+        self._layers[name] = (self.sprite(text, style), org)
+
+    def remove(self, name: str):
+        self._layers.pop(name, None)
+
+    def draw(self, frame: np.ndarray) -> np.ndarray:
+        """Dibuja las capas sobre frame (in place) y lo devuelve."""
+        for sprite, org in self._layers.values():
+            sprite.blit(frame, org)
+        return frame
+
+    def draw_copy(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Como draw(), pero sobre una copia en un buffer reutilizado
+        (para cuando el frame original se necesita intacto).
+        """
+        if self._buffer is None or self._buffer.shape != frame.shape:
+            self._buffer = np.empty_like(frame)
+        np.copyto(self._buffer, frame)
+        return self.draw(self._buffer)
+
+    def draw_pattern(
+        self,
+        frame: np.ndarray,
+        pattern: Optional[DetectedPattern],
+        style: TextStyle = TextStyle()
+    ) -> np.ndarray:
+        """
+        Equivalente a draw_detected_pattern, pero con la etiqueta
+        cacheada como sprite.
+        """
+        if pattern is None:
+            return frame
+        cv2.drawContours(frame, [pattern.contour], -1, (0, 255, 0), 2)
+        cx, cy = pattern.center
+        cv2.circle(frame, (cx, cy), 5, (255, 255, 255), -1)
+        self.sprite(pattern.label, style).blit(frame, (cx - 60, cy - 10))
+        return frame
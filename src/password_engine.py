@@ -0,0 +1,218 @@
+# password_engine.py
+#
+# Motor de contraseñas compartido: todas las secuencias de todos los
+# usuarios se compilan en un autómata de Aho-Corasick sobre las
+# etiquetas (letras 'A'..'D' o labels como "red_circle"). Cada patrón
+# observado avanza el estado en O(1) y el estado final dice qué
+# usuario(s) han completado su secuencia.
+#
+# El autómata es inmutable: añadir o quitar usuarios compila uno
+# nuevo y lo sustituye de golpe, así que se puede hacer en caliente
+# desde otro hilo. Los matchers que tenían estado del autómata
+# anterior vuelven a empezar desde la raíz.
+
+from __future__ import annotations
+from collections import deque
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+import threading
+
+ROOT = 0
+DEFAULT_USER = "default"   # usuario de los sistemas con una única secuencia
+
+
+class _Automaton:
+    """
+    Trie + enlaces de fallo. Los nodos son enteros; la información
+    de cada nodo está en listas paralelas.
+    """
+
+    def __init__(self, sequences: Dict[Hashable, Tuple[str, ...]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.prefix: List[Tuple[str, ...]] = [()]
+        self.own: List[Tuple[Hashable, ...]] = [()]    # usuarios cuya secuencia acaba aquí
+
+        for user, seq in sequences.items():
+            node = ROOT
+            for label in seq:
+                nxt = self.goto[node].get(label)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][label] = nxt
+                    self.goto.append({})
+                    self.prefix.append(self.prefix[node] + (label,))
+                    self.own.append(())
+                node = nxt
+            self.own[node] += (user,)
+
+        # Enlaces de fallo en anchura; out incluye las secuencias que
+        # son sufijo de la del nodo
+        n = len(self.goto)
+        self.fail = [ROOT] * n
+        self.out: List[Tuple[Hashable, ...]] = list(self.own)
+        queue = deque(self.goto[ROOT].values())
+        while queue:
+            node = queue.popleft()
+            for label, child in self.goto[node].items():
+                f = self.fail[node]
+                while f != ROOT and label not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(label, ROOT)
+                self.out[child] = self.own[child] + self.out[self.fail[child]]
+                queue.append(child)
+
+        self.alphabet = frozenset(label for edges in self.goto for label in edges)
+        self.max_len = max((len(s) for s in sequences.values()), default=0)
+        # Transiciones ya resueltas (nodo, etiqueta) -> nodo: tras la
+        # primera vez cada paso es una consulta a un dict
+        self.delta: List[Dict[str, int]] = [dict(edges) for edges in self.goto]
+
+    def step(self, node: int, label: str) -> int:
+        nxt = self.delta[node].get(label)
+        if nxt is not None:
+            return nxt
+        if label not in self.alphabet:
+            return ROOT
+        f = node
+        while f != ROOT and label not in self.goto[f]:
+            f = self.fail[f]
+        nxt = self.goto[f].get(label, ROOT)
+        self.delta[node][label] = nxt
+        return nxt
+
+
+class PasswordEngine:
+    """
+    Conjunto de secuencias {usuario: [etiquetas, ...]} compartido por
+    cualquier número de estaciones/streams. El estado de cada flujo
+    de observaciones vive en un PasswordMatcher (engine.matcher()).
+    """
+
+    def __init__(self, sequences: Optional[Dict[Hashable, Sequence[str]]] = None):
+        self._sequences: Dict[Hashable, Tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+        for user, seq in (sequences or {}).items():
+            self._check(user, seq)
+            self._sequences[user] = tuple(seq)
+        self.automaton = _Automaton(self._sequences)
+
+    @staticmethod
+    def _check(user: Hashable, seq: Sequence[str]):
+        if not seq:
+            raise ValueError(f"La secuencia del usuario {user!r} está vacía")
+
+    def add_user(self, user: Hashable, sequence: Sequence[str]):
+        """Añade o reemplaza la secuencia de un usuario."""
+        self._check(user, sequence)
+        with self._lock:
+            sequences = dict(self._sequences)
+            sequences[user] = tuple(sequence)
+            self.automaton = _Automaton(sequences)
+            self._sequences = sequences
+
+    def remove_user(self, user: Hashable):
+        with self._lock:
+            if user not in self._sequences:
+                raise KeyError(user)
+            sequences = dict(self._sequences)
+            del sequences[user]
+            self.automaton = _Automaton(sequences)
+            self._sequences = sequences
+
+    def sequence(self, user: Hashable) -> Tuple[str, ...]:
+        return self._sequences[user]
+
+    def default_sequence(self) -> Tuple[str, ...]:
+        """
+        Secuencia de DEFAULT_USER; sin él, la del primer usuario
+        (() si no hay ninguno).
+        """
+        sequences = self._sequences
+        if DEFAULT_USER in sequences:
+            return sequences[DEFAULT_USER]
+        return next(iter(sequences.values()), ())
+
+    @property
+    def users(self) -> List[Hashable]:
+        return list(self._sequences)
+
+    @property
+    def max_len(self) -> int:
+        return self.automaton.max_len
+
+    def __len__(self) -> int:
+        return len(self._sequences)
+
+    def __contains__(self, user: Hashable) -> bool:
+        return user in self._sequences
+
+    def matcher(self) -> "PasswordMatcher":
+        return PasswordMatcher(self)
+
+
+class PasswordMatcher:
+    """
+    Estado de un flujo de observaciones sobre un PasswordEngine.
+
+    feed() busca las secuencias como sufijo de lo observado (ventana
+    deslizante, como DetectorContrasena); tras una coincidencia se
+    vuelve a la raíz, de modo que dos contraseñas no comparten
+    observaciones.
+    """
+
+    def __init__(self, engine: PasswordEngine):
+        self.engine = engine
+        self._automaton = engine.automaton
+        self.state = ROOT
+
+    def reset(self):
+        self._automaton = self.engine.automaton
+        self.state = ROOT
+
+    def _current(self) -> _Automaton:
+        automaton = self.engine.automaton
+        if automaton is not self._automaton:
+            # Usuarios cambiados en caliente: el estado anterior no vale
+            self._automaton = automaton
+            self.state = ROOT
+        return automaton
+
+    def feed(self, label: str) -> Tuple[Hashable, ...]:
+        """
+        Avanza con una etiqueta. Devuelve los usuarios cuya secuencia
+        acaba de completarse (tupla vacía si ninguno).
+        """
+        automaton = self._current()
+        state = ROOT if self.state is None else self.state
+        self.state = automaton.step(state, label)
+        matched = automaton.out[self.state]
+        if matched:
+            self.state = ROOT
+        return matched
+
+    def feed_prefix(self, label: str) -> Optional[Tuple[Hashable, ...]]:
+        """
+        Avance anclado al inicio (sin enlaces de fallo), para intentos
+        que empiezan siempre desde cero. Devuelve los usuarios cuya
+        secuencia completa es exactamente lo introducido, () si aún es
+        prefijo de alguna, o None si ya no coincide con ninguna.
+        """
+        automaton = self._current()
+        if self.state is None:
+            return None
+        nxt = automaton.goto[self.state].get(label)
+        self.state = nxt
+        if nxt is None:
+            return None
+        return automaton.own[nxt]
+
+    @property
+    def prefix(self) -> Tuple[str, ...]:
+        """Etiquetas que forman la coincidencia parcial actual."""
+        if self.state is None:
+            return ()
+        return self._automaton.prefix[self.state]
+
+    @property
+    def has_continuation(self) -> bool:
+        """True si alguna secuencia continúa desde el estado actual."""
+        return self.state is not None and bool(self._automaton.goto[self.state])
@@ -0,0 +1,198 @@
+# pipeline.py
+#
+# Pipeline captura -> detección -> render en hilos separados.
+# Cada etapa se comunica con la siguiente mediante una cola acotada
+# que descarta el elemento más antiguo, de modo que una detección
+# lenta nunca acumula frames viejos del buffer de la cámara.
+
+from __future__ import annotations
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+import threading
+import time
+
+import numpy as np
+
+from metrics import METRICS
+
+
+class DropOldestQueue:
+    """
+    Cola acotada con política "drop-oldest": si está llena, put()
+    descarta el elemento más antiguo y lo cuenta en dropped.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        if maxsize < 1:
+            raise ValueError("maxsize debe ser >= 1")
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item: Any) -> bool:
+        """Encola item. Devuelve True si ha descartado otro para hacerle sitio."""
+        with self._cond:
+            dropped = len(self._items) >= self.maxsize
+            if dropped:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        return dropped
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Devuelve el siguiente elemento, o None si la cola está
+        cerrada y vacía (o si vence el timeout).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._items:
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+
+class LivePipeline:
+    """
+    Captura y detección en hilos propios; el render se hace en el
+    hilo que itera results() (cv2.imshow debe llamarse desde el
+    hilo principal).
+
+    capture: objeto tipo cv2.VideoCapture (read() -> (ret, frame)).
+    detect_fn: función frame -> resultado; se ejecuta en el hilo de
+    detección, así que puede actualizar también el estado de la
+    contraseña sin perder frames detectados.
+    preprocess_fn: transformación opcional del frame (p. ej.
+    Undistorter.undistort_frame) aplicada en el hilo de detección;
+    results() devuelve el frame ya transformado.
+    """
+
+    def __init__(
+        self,
+        capture: Any,
+        detect_fn: Callable[[np.ndarray], Any],
+        queue_size: int = 1,
+        preprocess_fn: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    ):
+        self.capture = capture
+        self.detect_fn = detect_fn
+        self.preprocess_fn = preprocess_fn
+        self.frames = DropOldestQueue(queue_size)
+        self.results_queue = DropOldestQueue(queue_size)
+        self.capture_failed = False
+
+        self.captured = 0
+        self.detected = 0
+        self.rendered = 0
+
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ----------------------------
+    # Etapas
+    # ----------------------------
+
+    def _capture_loop(self):
+        try:
+            while not self._stop.is_set():
+                with METRICS.time("pipeline.capture"):
+                    ret, frame = self.capture.read()
+                if not ret:
+                    self.capture_failed = True
+                    break
+                self.captured += 1
+                METRICS.mark("frames_captured")
+                if self.frames.put((self.captured, frame)):
+                    METRICS.inc("frames_dropped", stage="detect")
+        finally:
+            self.frames.close()
+
+    def _detect_loop(self):
+        try:
+            while not self._stop.is_set():
+                item = self.frames.get()
+                if item is None:
+                    break
+                seq, frame = item
+                if self.preprocess_fn is not None:
+                    with METRICS.time("pipeline.preprocess"):
+                        frame = self.preprocess_fn(frame)
+                with METRICS.time("pipeline.detect"):
+                    result = self.detect_fn(frame)
+                self.detected += 1
+                METRICS.mark("frames_detected")
+                if self.results_queue.put((seq, frame, result)):
+                    METRICS.inc("frames_dropped", stage="render")
+        finally:
+            self.results_queue.close()
+
+    # ----------------------------
+    # Control
+    # ----------------------------
+
+    def start(self):
+        if self._threads:
+            return
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="captura", daemon=True),
+            threading.Thread(target=self._detect_loop, name="deteccion", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def results(self) -> Iterator[Tuple[np.ndarray, Any]]:
+        """
+        Genera (frame, resultado) con el resultado más reciente
+        disponible hasta que la captura termine o se llame a stop().
+        """
+        self.start()
+        while not self._stop.is_set():
+            item = self.results_queue.get()
+            if item is None:
+                break
+            _, frame, result = item
+            self.rendered += 1
+            METRICS.mark("frames_rendered")
+            # El render es lo que hace el consumidor entre dos next()
+            t0 = time.perf_counter()
+            yield frame, result
+            METRICS.observe("pipeline.render", time.perf_counter() - t0)
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        self.frames.close()
+        self.results_queue.close()
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "captured": self.captured,
+            "detected": self.detected,
+            "rendered": self.rendered,
+            "dropped_before_detect": self.frames.dropped,
+            "dropped_before_render": self.results_queue.dropped,
+        }
+
+    def __enter__(self) -> "LivePipeline":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
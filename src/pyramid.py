@@ -0,0 +1,44 @@
+# pyramid.py
+#
+# Utilidades del modo pirámide, compartidas por el camino de color
+# (color_shape_detector) y el de umbral (utils): kernel morfológico
+# equivalente en la imagen reducida y ROI de refinamiento a
+# resolución completa alrededor de un bounding box reducido.
+
+from __future__ import annotations
+from typing import Tuple
+
+import numpy as np
+
+
+def scaled_kernel(scale: float, base: np.ndarray) -> np.ndarray:
+    """
+    Kernel morfológico equivalente a base en una imagen escalada
+    por scale (tamaño impar, mínimo 1).
+    """
+    size = max(1, int(round(base.shape[0] * scale)))
+    if size % 2 == 0:
+        size += 1
+    return np.ones((size, size), np.uint8)
+
+
+def refine_roi(
+    bbox: Tuple[int, int, int, int],
+    scale: float,
+    frame_shape: Tuple[int, ...],
+    pad: int = 16
+) -> Tuple[int, int, int, int]:
+    """
+    Lleva un bounding box de la imagen reducida a la imagen completa
+    y lo amplía con un margen para el refinamiento.
+    Devuelve (x0, y0, x1, y1).
+    """
+    x, y, w, h = bbox
+    frame_h, frame_w = frame_shape[:2]
+    pad = pad + int(np.ceil(1.0 / scale))
+
+    x0 = max(int(x / scale) - pad, 0)
+    y0 = max(int(y / scale) - pad, 0)
+    x1 = min(int(np.ceil((x + w) / scale)) + pad, frame_w)
+    y1 = min(int(np.ceil((y + h) / scale)) + pad, frame_h)
+    return x0, y0, x1, y1
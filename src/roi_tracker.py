@@ -0,0 +1,175 @@
+# roi_tracker.py
+
+from __future__ import annotations
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from color_shape_detector import ColorShapeDetector, DetectedPattern, offset_pattern
+
+
+BBox = Tuple[int, int, int, int]   # (x, y, w, h)
+
+
+# ----------------------------
+# Utilidades de ROI
+# ----------------------------
+
+def expand_bbox(
+    bbox: BBox,
+    frame_shape: Tuple[int, ...],
+    margin: float = 0.5,
+    min_pad: int = 32
+) -> Tuple[int, int, int, int]:
+    """
+    Amplía el bounding box en margin * tamaño (y al menos min_pad
+    píxeles) por cada lado y lo recorta a la imagen.
+    Devuelve (x0, y0, x1, y1).
+    """
+    x, y, w, h = bbox
+    frame_h, frame_w = frame_shape[:2]
+    pad_x = max(int(w * margin), min_pad)
+    pad_y = max(int(h * margin), min_pad)
+
+    x0 = max(x - pad_x, 0)
+    y0 = max(y - pad_y, 0)
+    x1 = min(x + w + pad_x, frame_w)
+    y1 = min(y + h + pad_y, frame_h)
+    return x0, y0, x1, y1
+
+
+def _touches_roi_border(bbox: BBox, roi: Tuple[int, int, int, int], frame_shape) -> bool:
+    """
+    True si el bbox (en coords de frame) toca un borde de la ROI que
+    no es también borde de la imagen: el objeto puede estar cortado.
+    """
+    x, y, w, h = bbox
+    x0, y0, x1, y1 = roi
+    frame_h, frame_w = frame_shape[:2]
+    return (
+        (x <= x0 and x0 > 0)
+        or (y <= y0 and y0 > 0)
+        or (x + w >= x1 and x1 < frame_w)
+        or (y + h >= y1 and y1 < frame_h)
+    )
+
+
+# ----------------------------
+# Seguimiento por ROI
+# ----------------------------
+
+class _ROITracker:
+    """
+    Lógica común: tras una detección, los siguientes frames sólo se
+    procesan en una ROI alrededor del último objeto. Se vuelve al
+    frame completo si se pierde el objeto, si queda cortado por la
+    ROI o cada resync_every frames.
+    """
+
+    def __init__(self, margin: float = 0.5, resync_every: int = 30, min_pad: int = 32):
+        self.margin = margin
+        self.resync_every = resync_every
+        self.min_pad = min_pad
+        self.last_bbox: Optional[BBox] = None
+        self._frames_since_full = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def reset(self):
+        self.last_bbox = None
+        self._frames_since_full = 0
+
+    def _next_roi(self, frame_shape) -> Optional[Tuple[int, int, int, int]]:
+        if self.last_bbox is None or self._frames_since_full >= self.resync_every:
+            return None
+        return expand_bbox(self.last_bbox, frame_shape, self.margin, self.min_pad)
+
+    def _accept_roi(self, bbox: Optional[BBox], roi, frame_shape) -> bool:
+        self.roi_scans += 1
+        if bbox is None or _touches_roi_border(bbox, roi, frame_shape):
+            return False
+        self.last_bbox = bbox
+        self._frames_since_full += 1
+        return True
+
+    def _accept_full(self, bbox: Optional[BBox]):
+        self.full_scans += 1
+        self.last_bbox = bbox
+        self._frames_since_full = 0
+
+
+class ColorShapeTracker(_ROITracker):
+    """
+    Envuelve detect_color_shape (un ColorShapeDetector propio, salvo
+    que se pase detect_fn) con seguimiento por ROI.
+    Los resultados se devuelven en coordenadas del frame completo.
+    """
+
+    def __init__(
+        self,
+        min_area: float = 1000.0,
+        margin: float = 0.5,
+        resync_every: int = 30,
+        min_pad: int = 32,
+        detect_fn: Optional[Callable[..., Optional[DetectedPattern]]] = None
+    ):
+        super().__init__(margin, resync_every, min_pad)
+        self.min_area = min_area
+        # Por defecto, un ColorShapeDetector propio: las ROIs de tamaño
+        # variable reutilizan sus buffers en lugar de reservar por frame
+        self.detect_fn = detect_fn if detect_fn is not None else ColorShapeDetector(min_area)
+
+    def detect(self, frame_bgr: np.ndarray) -> Optional[DetectedPattern]:
+        if frame_bgr is None or frame_bgr.size == 0:
+            return None
+
+        roi = self._next_roi(frame_bgr.shape)
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            pattern = self.detect_fn(frame_bgr[y0:y1, x0:x1], self.min_area)
+            if pattern is not None:
+                pattern = offset_pattern(pattern, x0, y0)
+            bbox = cv2.boundingRect(pattern.contour) if pattern is not None else None
+            if self._accept_roi(bbox, roi, frame_bgr.shape):
+                return pattern
+
+        # Frame completo (primera vez, objeto perdido o re-sincronización)
+        pattern = self.detect_fn(frame_bgr, self.min_area)
+        self._accept_full(cv2.boundingRect(pattern.contour) if pattern is not None else None)
+        return pattern
+
+
+class PatternTracker(_ROITracker):
+    """
+    Seguimiento por ROI para detectores tipo main.detect_pattern,
+    que devuelven (letra, thresh, bbox). thresh se devuelve siempre
+    con el tamaño del frame completo (a cero fuera de la ROI).
+    """
+
+    def __init__(
+        self,
+        detect_fn: Callable[[np.ndarray], tuple],
+        margin: float = 0.5,
+        resync_every: int = 30,
+        min_pad: int = 32
+    ):
+        super().__init__(margin, resync_every, min_pad)
+        self.detect_fn = detect_fn
+
+    def detect(self, frame: np.ndarray) -> tuple:
+        roi = self._next_roi(frame.shape)
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            letra, thresh_roi, bbox = self.detect_fn(frame[y0:y1, x0:x1])
+            if bbox is not None:
+                x, y, w, h = bbox
+                bbox = (x + x0, y + y0, w, h)
+            if self._accept_roi(bbox, roi, frame.shape):
+                thresh = np.zeros(frame.shape[:2], dtype=np.uint8)
+                thresh[y0:y1, x0:x1] = thresh_roi
+                return letra, thresh, bbox
+
+        letra, thresh, bbox = self.detect_fn(frame)
+        self._accept_full(bbox)
+        return letra, thresh, bbox
@@ -1,61 +1,94 @@
 # run_color_shape_live.py
 
+import argparse
+
 import cv2
-from color_shape_detector import detect_color_shape, draw_detected_pattern
+import frame_source
+import metrics
+import motion_gate
+from overlay import OverlayCompositor, TextStyle
+from pipeline import LivePipeline
+from roi_tracker import ColorShapeTracker
+import undistort
+
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detección de color + forma en vivo")
+    parser.add_argument("--headless", action="store_true",
+                        help="sin ventana: sólo imprime los cambios de patrón (Ctrl+C para salir)")
+    frame_source.add_arguments(parser)
+    motion_gate.add_arguments(parser)
+    metrics.add_arguments(parser)
+    undistort.add_arguments(parser)
+    return parser.parse_args(argv)
 
-def main():
-    cap = cv2.VideoCapture(0)  # Cambia el índice si usas otra cámara
+
+def main(argv=None):
+    args = parse_args(argv)
+    cap = frame_source.open_from_args(args)
 
     if not cap.isOpened():
-        print("No se ha podido abrir la cámara.")
+        print("No se ha podido abrir la fuente:", args.source)
         return
 
-    print("Presiona 'q' para salir.")
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("No se pudo leer frame de la cámara.")
-            break
-
-        pattern = detect_color_shape(frame)
-        frame_vis = draw_detected_pattern(frame, pattern)
-
-        if pattern is not None:
-            text = f"Detectado: {pattern.label}"
-        else:
-            text = "Sin patrón"
-
-        cv2.putText(
-            frame_vis,
-            text,
-            (10, 30),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.8,
-            (0, 0, 0),
-            3,
-            cv2.LINE_AA
-        )
-        cv2.putText(
-            frame_vis,
-            text,
-            (10, 30),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.8,
-            (255, 255, 255),
-            1,
-            cv2.LINE_AA
-        )
-
-        cv2.imshow("Color + Forma (Live)", frame_vis)
-
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord("q"):
-            break
+    dumper = metrics.setup_from_args(args)
+    print("Ctrl+C para salir." if args.headless else "Presiona 'q' para salir.")
+
+    tracker = ColorShapeTracker()
+    detect = tracker.detect
+
+    # Con calibración, la forma se clasifica sobre el contorno corregido
+    # (sólo se corrigen sus puntos, no el frame completo)
+    undistorter = undistort.undistorter_from_args(args)
+    if undistorter is not None:
+        detect = lambda frame: undistorter.reclassify(tracker.detect(frame), frame.shape)
+
+    # Con la escena quieta se reutiliza la última detección
+    detect = motion_gate.wrap_from_args(args, detect)
+
+    overlay = OverlayCompositor()
+    last_label = None
+
+    # Se crea fuera del try: un Ctrl+C durante la construcción sale con
+    # su propio KeyboardInterrupt, y después pipeline siempre existe
+    pipeline = LivePipeline(cap, detect)
+    try:
+        with pipeline:
+            for frame, pattern in pipeline.results():
+                label = pattern.label if pattern is not None else None
+
+                if args.headless:
+                    # Sin render: sólo se informa cuando cambia el patrón
+                    if label != last_label:
+                        print("Detectado:", label or "sin patrón")
+                    last_label = label
+                    continue
+
+                # El frame es propio de esta iteración: se dibuja encima
+                overlay.draw_pattern(frame, pattern)
+                overlay.set_text("estado", f"Detectado: {label}" if label else "Sin patrón", (10, 30),
+                                 TextStyle(scale=0.8))
+                overlay.draw(frame)
+
+                cv2.imshow("Color + Forma (Live)", frame)
+
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord("q"):
+                    break
+    except KeyboardInterrupt:
+        pass
+
+    if pipeline.capture_failed:
+        print("No se pudo leer frame de la cámara.")
+    print("Frames:", pipeline.stats())
+    if isinstance(detect, motion_gate.MotionGate):
+        print("Puerta de movimiento:", detect.stats())
+    if dumper is not None:
+        dumper.stop()
 
     cap.release()
-    cv2.destroyAllWindows()
+    if not args.headless:
+        cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
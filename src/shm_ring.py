@@ -0,0 +1,408 @@
+# shm_ring.py
+#
+# Detección en varios procesos sin copiar frames: un anillo de slots
+# de tamaño fijo en multiprocessing.shared_memory. El proceso que
+# captura escribe cada frame en el slot seq % slots; los workers
+# reciben sólo el número de secuencia, detectan sobre una vista NumPy
+# del slot y devuelven un resultado pequeño (etiqueta, área, centro y
+# contorno como int16).
+#
+# El productor nunca espera: si los workers van lentos, los slots se
+# reutilizan. Cada slot guarda la secuencia del frame que contiene;
+# el worker la comprueba antes y después de detectar, y si el frame
+# se ha sobrescrito entretanto el resultado se marca como
+# "overwritten" en lugar de mezclar dos frames.
+#
+# Ejemplo (desde la raíz del repositorio):
+#   python src/shm_ring.py --source sesion.frames --workers 3 --detector color
+
+from __future__ import annotations
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, Optional, Tuple
+import argparse
+import multiprocessing as mp
+import queue
+import signal
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from color_shape_detector import DetectedPattern
+from detectors import REGISTRY, result_fields, worker_detector
+
+STATUS_OK = "ok"
+STATUS_OVERWRITTEN = "overwritten"   # el slot ya tenía otro frame
+STATUS_ERROR = "error"               # el detector lanzó una excepción (ver error)
+
+_META_DTYPE = np.dtype([("seq", "<i8"), ("t", "<f8")])
+_WRITING = -1   # seq de un slot a medio escribir
+_ALIGN = 64
+
+
+# ----------------------------
+# Anillo de frames
+# ----------------------------
+
+class FrameRing:
+    """
+    slots frames de forma shape (uint8) en un bloque de memoria
+    compartida, más una tabla (seq, timestamp) por slot y la última
+    secuencia escrita.
+
+    Un solo escritor. Los lectores (en cualquier proceso) usan
+    view(seq) y después is_current(seq) para saber si el frame
+    sigue siendo el mismo.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], slots: int = 8, name: Optional[str] = None):
+        if slots < 2:
+            raise ValueError("slots debe ser >= 2")
+        self.shape = tuple(shape)
+        self.slots = slots
+        frame_bytes = int(np.prod(self.shape))
+        meta_bytes = 8 + slots * _META_DTYPE.itemsize
+        self._frames_offset = -(-meta_bytes // _ALIGN) * _ALIGN
+        size = self._frames_offset + slots * frame_bytes
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if self.shm.size < size:
+                raise ValueError(f"bloque {name} demasiado pequeño para {slots} x {self.shape}")
+
+        buf = self.shm.buf
+        self._head = np.ndarray((1,), np.int64, buf, 0)
+        self.meta = np.ndarray((slots,), _META_DTYPE, buf, 8)
+        self.frames = np.ndarray((slots,) + self.shape, np.uint8, buf, self._frames_offset)
+        if self.owner:
+            self._head[0] = -1
+            self.meta["seq"] = _WRITING
+
+    @classmethod
+    def attach(cls, name: str, shape: Tuple[int, ...], slots: int) -> "FrameRing":
+        return cls(shape, slots, name)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def head(self) -> int:
+        """Última secuencia escrita (-1 si ninguna)."""
+        return int(self._head[0])
+
+    # ----------------------------
+    # Escritor
+    # ----------------------------
+
+    def write(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """Copia frame al siguiente slot y devuelve su secuencia."""
+        if frame.shape != self.shape:
+            raise ValueError(f"frame {frame.shape} distinto de {self.shape}")
+        seq = self.head + 1
+        i = seq % self.slots
+        # Primero se invalida el slot: un lector que lo mire a medias
+        # ve _WRITING y no la secuencia anterior
+        self.meta["seq"][i] = _WRITING
+        np.copyto(self.frames[i], frame)
+        self.meta["t"][i] = time.time() if timestamp is None else timestamp
+        self.meta["seq"][i] = seq
+        self._head[0] = seq
+        return seq
+
+    # ----------------------------
+    # Lectores
+    # ----------------------------
+
+    def is_current(self, seq: int) -> bool:
+        return int(self.meta["seq"][seq % self.slots]) == seq
+
+    def view(self, seq: int) -> Optional[np.ndarray]:
+        """Vista (sin copia) del frame seq, o None si ya se ha sobrescrito."""
+        if not self.is_current(seq):
+            return None
+        return self.frames[seq % self.slots]
+
+    def timestamp(self, seq: int) -> float:
+        return float(self.meta["t"][seq % self.slots])
+
+    def close(self):
+        # Las vistas deben soltarse antes de cerrar el bloque
+        self._head = self.meta = self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# ----------------------------
+# Resultados
+# ----------------------------
+
+@dataclass
+class RingResult:
+    seq: int
+    timestamp: float
+    status: str
+    label: Optional[str] = None
+    color: Optional[str] = None
+    shape: Optional[str] = None
+    area: Optional[float] = None
+    center: Optional[Tuple[int, int]] = None
+    contour: Optional[np.ndarray] = None     # (N, 2) int16
+    bbox: Optional[Tuple[int, int, int, int]] = None
+    ms: float = 0.0
+    worker: int = -1
+    error: Optional[str] = None
+
+    def to_pattern(self) -> Optional[DetectedPattern]:
+        """DetectedPattern equivalente (sólo detector "color")."""
+        if self.status != STATUS_OK or self.contour is None:
+            return None
+        return DetectedPattern(
+            color=self.color,
+            shape=self.shape,
+            label=self.label,
+            area=self.area,
+            center=self.center,
+            contour=self.contour.astype(np.int32).reshape(-1, 1, 2),
+        )
+
+
+# ----------------------------
+# Workers
+# ----------------------------
+
+def _detect(frame: np.ndarray, options: Dict[str, Any]) -> Dict[str, Any]:
+    detector = worker_detector(options["detector"], options["min_area"], options["pyramid_scale"])
+    return result_fields(detector(frame))
+
+
+def _worker_main(index: int, name: str, shape, slots: int, tasks, results, options: Dict[str, Any]):
+    # Ctrl+C lo gestiona el proceso principal, que cierra los workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cv2.setNumThreads(1)
+    ring = FrameRing.attach(name, shape, slots)
+    try:
+        while True:
+            seq = tasks.get()
+            if seq is None:
+                break
+            t0 = time.perf_counter()
+            frame = ring.view(seq)
+            if frame is None:
+                results.put(RingResult(seq, 0.0, STATUS_OVERWRITTEN, worker=index))
+                continue
+            timestamp = ring.timestamp(seq)
+            # Toda secuencia recibe un resultado: get() los entrega en
+            # orden y esperaría para siempre a una que faltase
+            try:
+                fields = _detect(frame, options)
+                status = STATUS_OK
+            except Exception as e:
+                fields = {"error": f"{type(e).__name__}: {e}"}
+                status = STATUS_ERROR
+            del frame
+            # Si el escritor ha dado la vuelta mientras se detectaba,
+            # el resultado mezcla dos frames y se descarta
+            if status == STATUS_OK and not ring.is_current(seq):
+                status = STATUS_OVERWRITTEN
+                fields = {}
+            results.put(RingResult(seq, timestamp, status, ms=1000 * (time.perf_counter() - t0),
+                                   worker=index, **fields))
+    finally:
+        ring.close()
+
+
+class RingDetectorPool:
+    """
+    FrameRing + workers de detección en procesos.
+
+    submit(frame) escribe en el anillo y encola la secuencia (nunca
+    bloquea); results() genera un RingResult por cada frame enviado,
+    en orden de secuencia, para que el estado de la contraseña vea
+    los patrones en el orden en que se capturaron.
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, ...],
+        workers: int = 2,
+        slots: Optional[int] = None,
+        detector: str = "color",
+        min_area: Optional[float] = None,
+        pyramid_scale: float = 1.0
+    ):
+        if workers < 1:
+            raise ValueError("workers debe ser >= 1")
+        self.workers = workers
+        # Holgura para que un frame no se sobrescriba mientras espera
+        # en la cola de un worker ocupado
+        self.ring = FrameRing(shape, slots or 2 * workers + 2)
+        self.options = {"detector": detector, "min_area": min_area, "pyramid_scale": pyramid_scale}
+
+        ctx = mp.get_context()
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._procs = [
+            ctx.Process(
+                target=_worker_main,
+                args=(i, self.ring.name, self.ring.shape, self.ring.slots, self._tasks, self._results, self.options),
+                name=f"ring-worker-{i}",
+                daemon=True,
+            )
+            for i in range(workers)
+        ]
+        for p in self._procs:
+            p.start()
+
+        self.submitted = 0
+        self._next = 0                       # siguiente secuencia a entregar
+        self._pending: Dict[int, RingResult] = {}
+        self._closed = False
+
+    def submit(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        seq = self.ring.write(frame, timestamp)
+        self._tasks.put(seq)
+        self.submitted += 1
+        return seq
+
+    def get(self, timeout: Optional[float] = None) -> Optional[RingResult]:
+        """Siguiente resultado en orden, o None si vence el timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._next not in self._pending:
+            if self._next >= self.submitted:
+                return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                if remaining is not None and remaining <= 0:
+                    r = self._results.get_nowait()
+                else:
+                    r = self._results.get(timeout=0.5 if remaining is None else min(remaining, 0.5))
+            except queue.Empty:
+                if remaining is not None and remaining <= 0:
+                    return None
+                if not any(p.is_alive() for p in self._procs):
+                    raise RuntimeError("todos los workers han terminado")
+                continue
+            self._pending[r.seq] = r
+        self._next += 1
+        return self._pending.pop(self._next - 1)
+
+    def results(self) -> Iterator[RingResult]:
+        """Resultados ya disponibles, en orden (no espera)."""
+        while True:
+            r = self.get(timeout=0)
+            if r is None:
+                return
+            yield r
+
+    def drain(self) -> Iterator[RingResult]:
+        """Espera y genera todos los resultados pendientes."""
+        while self._next < self.submitted:
+            r = self.get(timeout=1.0)
+            if r is not None:
+                yield r
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self._next
+
+    def close(self, timeout: float = 2.0):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._procs:
+            self._tasks.put(None)
+        for p in self._procs:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        self._tasks.close()
+        self._results.close()
+        self.ring.close()
+
+    def __enter__(self) -> "RingDetectorPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ----------------------------
+# Programa
+# ----------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detección en procesos con frames en memoria compartida")
+    parser.add_argument("--source", default="0", help="índice de cámara, vídeo o grabación .frames")
+    parser.add_argument("--fast", action="store_true", help="leer vídeos y grabaciones sin pausas")
+    parser.add_argument("--workers", type=int, default=None, help="procesos de detección (por defecto, núcleos)")
+    parser.add_argument("--slots", type=int, default=None)
+    parser.add_argument("--detector", choices=sorted(REGISTRY), default="color")
+    parser.add_argument("--pyramid-scale", type=float, default=1.0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from DetectorContrasena import TIEMPO_RESET, DetectorContrasena
+    from frame_source import open_source
+    from password_engine import PasswordEngine
+    from stream_server import default_users
+
+    args = parse_args(argv)
+    cap = open_source(args.source, realtime=not args.fast)
+    if not cap.isOpened():
+        print("No se ha podido abrir la fuente:", args.source)
+        return 1
+    ret, frame = cap.read()
+    if not ret:
+        print("La fuente no da frames:", args.source)
+        return 1
+
+    password = DetectorContrasena(engine=PasswordEngine(default_users(args.detector)), tiempo_reset=TIEMPO_RESET)
+    workers = args.workers or mp.cpu_count()
+    counts = {STATUS_OK: 0, STATUS_OVERWRITTEN: 0, STATUS_ERROR: 0}
+    last_label = None
+
+    def consume(r: RingResult):
+        nonlocal last_label
+        counts[r.status] += 1
+        if r.status == STATUS_ERROR and counts[STATUS_ERROR] == 1:
+            print(f"frame {r.seq}: error en el worker {r.worker}: {r.error}")
+        password.update(r.label)
+        if r.label != last_label:
+            print(f"frame {r.seq}: {r.label or 'sin patrón'}")
+            last_label = r.label
+        if password.esta_desbloqueado():
+            print(f"frame {r.seq}: DESBLOQUEADO por {password.usuario}")
+            password.reset()
+
+    t0 = time.perf_counter()
+    with RingDetectorPool(frame.shape, workers, args.slots, args.detector,
+                          pyramid_scale=args.pyramid_scale) as pool:
+        try:
+            while ret:
+                pool.submit(frame)
+                for r in pool.results():
+                    consume(r)
+                ret, frame = cap.read()
+            for r in pool.drain():
+                consume(r)
+        except KeyboardInterrupt:
+            pass
+    cap.release()
+
+    elapsed = time.perf_counter() - t0
+    print(f"{pool.submitted} frames en {elapsed:.2f} s ({pool.submitted / max(elapsed, 1e-9):.1f} fps), "
+          f"{counts[STATUS_OK]} detectados, {counts[STATUS_OVERWRITTEN]} sobrescritos, {counts[STATUS_ERROR]} errores")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+# stream_server.py
+#
+# Servidor multi-cámara: un único proceso abre N fuentes (índices de
+# cámara o ficheros de vídeo) y reparte la detección entre un pool de
+# hilos compartido. Cada stream tiene su propio tracker y su propio
+# estado de contraseña; las secuencias de los usuarios se comparten
+# en un único PasswordEngine.
+#
+# Reparto justo: cada stream guarda sólo su último frame y tiene como
+# mucho uno en detección; los streams con frame pendiente se atienden
+# por turno (round-robin). Una fuente lenta o bloqueada simplemente no
+# entra en la cola y no retrasa a las demás.
+#
+# Ejemplos (desde la raíz del repositorio):
+#   python src/stream_server.py 0 1 --workers 2
+#   python src/stream_server.py puerta1.mp4 puerta2.mp4 --detector color --users usuarios.json
+
+from __future__ import annotations
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import frame_source
+import metrics
+import motion_gate
+from DetectorContrasena import SECUENCIA_CORRECTA, TIEMPO_RESET, DetectorContrasena
+from detectors import REGISTRY, Detector, result_label
+from metrics import METRICS
+from password_engine import DEFAULT_USER, PasswordEngine
+from roi_tracker import ColorShapeTracker, PatternTracker
+
+LATENCY_WINDOW = 1000   # últimas latencias guardadas por stream
+
+
+# ----------------------------
+# Detectores por stream
+# ----------------------------
+
+# Detectores con bbox: se envuelven en seguimiento por ROI
+TRACKERS: Dict[str, Callable[[Detector], Any]] = {
+    "pattern": lambda detector: PatternTracker(detector),
+    "color": lambda detector: ColorShapeTracker(detect_fn=detector),
+}
+
+
+def make_detector(name: str) -> Callable[[np.ndarray], Optional[str]]:
+    """
+    Detector del registro (detectors.REGISTRY) -> etiqueta o None, con
+    seguimiento por ROI si está en TRACKERS. Uno por stream: el
+    tracker y los buffers son propios.
+    """
+    detect: Callable[[np.ndarray], Any] = Detector(name)
+    if name in TRACKERS:
+        detect = TRACKERS[name](detect).detect
+    return lambda frame: result_label(detect(frame))
+
+
+def default_users(detector: str) -> Dict[str, List[str]]:
+    if detector == "color":
+        from test_password_sequence import PASSWORD
+        return {DEFAULT_USER: list(PASSWORD)}
+    return {DEFAULT_USER: list(SECUENCIA_CORRECTA)}
+
+
+# ----------------------------
+# Streams
+# ----------------------------
+
+class Stream:
+    """
+    Estado de una fuente: captura, último frame pendiente, detector,
+    contraseña y métricas.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capture: Any,
+        detect_fn: Callable[[np.ndarray], Optional[str]],
+        password: DetectorContrasena,
+        frame_interval: float = 0.0,
+        loop: bool = False
+    ):
+        self.name = name
+        self.capture = capture
+        self.detect_fn = detect_fn
+        self.password = password
+        self.frame_interval = frame_interval   # > 0: ritmo de tiempo real para ficheros
+        self.loop = loop
+
+        # Protegidos por el lock del servidor
+        self.pending: Optional[Tuple[float, np.ndarray]] = None
+        self.queued = False
+        self.in_flight = False
+        self.finished = False
+
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.unlocks: List[Tuple[float, Any]] = []
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.last_label: Optional[str] = None
+        self.t_start = time.perf_counter()
+
+    def process(self, frame: np.ndarray) -> Optional[Any]:
+        """Detección + contraseña. Devuelve el usuario si desbloquea."""
+        label = self.detect_fn(frame)
+        self.last_label = label
+        self.password.update(label)
+        if not self.password.esta_desbloqueado():
+            return None
+        user = self.password.usuario
+        self.password.reset()
+        return user
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = max(time.perf_counter() - self.t_start, 1e-9)
+        lat = 1000 * np.asarray(self.latencies) if self.latencies else None
+        return {
+            "stream": self.name,
+            "captured": self.captured,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "fps": round(self.processed / elapsed, 2),
+            "latency_p50_ms": round(float(np.percentile(lat, 50)), 1) if lat is not None else None,
+            "latency_p95_ms": round(float(np.percentile(lat, 95)), 1) if lat is not None else None,
+            "unlocks": len(self.unlocks),
+            "finished": self.finished,
+        }
+
+
+class StreamServer:
+    """
+    Hilos de captura (uno por stream) + pool de workers de detección.
+    """
+
+    def __init__(self, streams: Sequence[Stream], workers: int = 2,
+                 on_unlock: Optional[Callable[[Stream, Any], None]] = None):
+        if workers < 1:
+            raise ValueError("workers debe ser >= 1")
+        self.streams = list(streams)
+        self.workers = workers
+        self.on_unlock = on_unlock
+        self._ready: deque = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # ----------------------------
+    # Captura
+    # ----------------------------
+
+    def _capture_loop(self, stream: Stream):
+        next_t = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                ret, frame = stream.capture.read()
+                if not ret:
+                    if stream.loop and stream.capture.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                        continue
+                    break
+                t = time.perf_counter()
+                with self._cond:
+                    if stream.pending is not None:
+                        stream.dropped += 1
+                        METRICS.inc("frames_dropped", stream=stream.name)
+                    stream.pending = (t, frame)
+                    stream.captured += 1
+                    self._schedule(stream)
+                METRICS.mark("frames_captured", stream=stream.name)
+
+                if stream.frame_interval > 0:
+                    next_t = max(next_t + stream.frame_interval, t - stream.frame_interval)
+                    delay = next_t - time.perf_counter()
+                    if delay > 0:
+                        self._stop.wait(delay)
+        finally:
+            with self._cond:
+                stream.finished = True
+                self._cond.notify_all()
+
+    def _schedule(self, stream: Stream):
+        # Con el lock tomado: a la cola si tiene frame y no está ya en ella
+        if stream.pending is not None and not stream.queued and not stream.in_flight:
+            stream.queued = True
+            self._ready.append(stream)
+            self._cond.notify()
+
+    # ----------------------------
+    # Detección
+    # ----------------------------
+
+    def _all_done(self) -> bool:
+        return all(s.finished and s.pending is None and not s.in_flight for s in self.streams)
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._ready:
+                    if self._stop.is_set() or self._all_done():
+                        self._cond.notify_all()
+                        return
+                    self._cond.wait(0.1)
+                stream = self._ready.popleft()
+                stream.queued = False
+                t_capture, frame = stream.pending
+                stream.pending = None
+                stream.in_flight = True
+
+            # Un fallo en un frame se cuenta y el worker sigue: si el
+            # hilo muriera, tras `workers` fallos no quedaría ninguno
+            user = None
+            error = None
+            try:
+                user = stream.process(frame)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+
+            t_done = time.perf_counter()
+            with self._cond:
+                stream.in_flight = False
+                stream.processed += 1
+                stream.latencies.append(t_done - t_capture)
+                if error is not None:
+                    # Se avisa del primero, de cada error distinto y
+                    # después uno de cada 100
+                    stream.errors += 1
+                    report = error != stream.last_error or stream.errors % 100 == 1
+                    stream.last_error = error
+                self._schedule(stream)
+                self._cond.notify_all()
+            METRICS.inc("frames_processed", stream=stream.name)
+            METRICS.observe("stream.latency", t_done - t_capture)
+            if error is not None:
+                METRICS.inc("stream_errors", stream=stream.name)
+                if report:
+                    print(f"[{stream.name}] error en la detección ({stream.errors}): {error}", file=sys.stderr)
+
+            if user is not None:
+                stream.unlocks.append((time.time(), user))
+                METRICS.inc("stream_unlocks", stream=stream.name)
+                if self.on_unlock is not None:
+                    self.on_unlock(stream, user)
+
+    # ----------------------------
+    # Control
+    # ----------------------------
+
+    def start(self):
+        if self._threads:
+            return
+        for stream in self.streams:
+            self._threads.append(threading.Thread(
+                target=self._capture_loop, args=(stream,), name=f"captura-{stream.name}", daemon=True))
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._worker_loop, name=f"deteccion-{i}", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que terminen todas las fuentes. True si han terminado."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._all_done():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 0.5)
+        return True
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [s.stats() for s in self.streams]
+
+    def __enter__(self) -> "StreamServer":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def print_stats(stats: List[Dict[str, Any]]):
+    print(f"{'stream':24s} {'capt':>6s} {'proc':>6s} {'desc':>6s} {'fps':>7s} "
+          f"{'p50 ms':>8s} {'p95 ms':>8s} {'desbl':>6s} {'err':>5s}")
+    for s in stats:
+        p50 = f"{s['latency_p50_ms']:.1f}" if s["latency_p50_ms"] is not None else "-"
+        p95 = f"{s['latency_p95_ms']:.1f}" if s["latency_p95_ms"] is not None else "-"
+        name = s["stream"] + (" (fin)" if s["finished"] else "")
+        print(f"{name:24s} {s['captured']:6d} {s['processed']:6d} {s['dropped']:6d} {s['fps']:7.1f} "
+              f"{p50:>8s} {p95:>8s} {s['unlocks']:6d} {s['errors']:5d}")
+
+
+# ----------------------------
+# Programa
+# ----------------------------
+
+def open_stream(source: str, detector: str, engine: PasswordEngine,
+                realtime: bool = True, loop: bool = False,
+                motion_threshold: Optional[float] = 0.001) -> Stream:
+    is_camera = source.isdigit()
+    is_recording = frame_source.is_recording(source)
+    # Las grabaciones siguen sus propios timestamps en tiempo real
+    cap = frame_source.open_source(source, realtime=realtime)
+    if not cap.isOpened():
+        raise OSError(f"No se ha podido abrir la fuente: {source}")
+
+    # Los vídeos se leen a su fps para simular una cámara
+    interval = 0.0
+    if realtime and not is_camera and not is_recording:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        interval = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+
+    name = f"cam{source}" if is_camera else os.path.basename(source)
+    password = DetectorContrasena(engine=engine, tiempo_reset=TIEMPO_RESET)
+    detect_fn = make_detector(detector)
+    if motion_threshold is not None:
+        # Con la escena quieta se reutiliza la última etiqueta (el
+        # estado de la contraseña sigue recibiendo cada frame)
+        detect_fn = motion_gate.MotionGate(detect_fn, min_changed=motion_threshold)
+    return Stream(name, cap, detect_fn, password, interval, loop)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detección y contraseñas sobre varias cámaras/vídeos")
+    parser.add_argument("sources", nargs="+", help="índices de cámara, vídeos o grabaciones .frames")
+    parser.add_argument("--detector", choices=sorted(REGISTRY), default="pattern")
+    parser.add_argument("--workers", type=int, default=None, help="hilos de detección (por defecto, núcleos)")
+    parser.add_argument("--users", default=None, help="JSON {usuario: [etiquetas, ...]}")
+    parser.add_argument("--no-realtime", action="store_true",
+                        help="leer vídeos y grabaciones lo más rápido posible en lugar de a su ritmo")
+    parser.add_argument("--loop", action="store_true", help="repetir los vídeos al terminar")
+    parser.add_argument("--report-every", type=float, default=5.0, help="segundos entre informes")
+    motion_gate.add_arguments(parser)
+    metrics.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.users:
+        with open(args.users, encoding="utf-8") as f:
+            users = json.load(f)
+    else:
+        users = default_users(args.detector)
+    engine = PasswordEngine(users)
+
+    try:
+        motion_threshold = None if args.no_motion_gate else args.motion_threshold
+        streams = [open_stream(src, args.detector, engine, not args.no_realtime, args.loop, motion_threshold)
+                   for src in args.sources]
+    except OSError as e:
+        print(e)
+        return 1
+
+    dumper = metrics.setup_from_args(args)
+
+    def on_unlock(stream, user):
+        print(f"[{stream.name}] DESBLOQUEADO por {user}")
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"{len(streams)} streams, {workers} workers, {len(engine)} usuarios. Ctrl+C para salir.")
+
+    server = StreamServer(streams, workers, on_unlock)
+    try:
+        with server:
+            while not server.wait(args.report_every):
+                print_stats(server.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for stream in streams:
+            stream.capture.release()
+        if dumper is not None:
+            dumper.stop()
+
+    print_stats(server.stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
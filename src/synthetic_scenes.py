@@ -0,0 +1,327 @@
+# synthetic_scenes.py
+#
+# Generador de escenas sintéticas etiquetadas para medir precisión y
+# velocidad de detect_color_shape / _classify_shape a escala. Las
+# imágenes de data/ son de calibración (tableros), así que sin esto no
+# hay ninguna verdad de referencia para los patrones de color.
+#
+# Cada escena tiene 0..N figuras (triangle, square, circle, line) en los
+# colores de COLOR_RANGES sobre un fondo gris, con distractores
+# (manchas grises sin saturación y motas de color por debajo del área
+# mínima), iluminación no uniforme, desenfoque y ruido configurables.
+# La escena lleva la lista de objetos dibujados (GroundTruth); el
+# mayor es el que debería devolver detect_color_shape.
+#
+# generate_scenes() es un generador: las escenas se crean al pedirlas y
+# no se guardan, así que una pasada de un millón de frames no necesita
+# disco ni memoria. Con la misma semilla la secuencia es idéntica.
+#
+# Uso:
+#   from synthetic_scenes import SceneConfig, generate_scenes
+#   for scene in generate_scenes(SceneConfig(width=1280, height=720, noise=6), count=1000):
+#       p = detect_color_shape(scene.frame)
+#       ... scene.dominant.label ...
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from color_shape_detector import COLOR_RANGES
+
+SHAPES = ("triangle", "square", "circle", "line")
+
+# Márgenes para que el color dibujado caiga dentro del rango HSV con
+# holgura frente al ruido y a la iluminación
+HUE_MARGIN = 3
+SAT_RANGE = (150, 255)
+VAL_RANGE = (150, 255)
+
+LINE_RATIO = (6.0, 10.0)   # largo / grosor (el clasificador pide > 4)
+LINE_MIN_THICKNESS = 14    # más fino no sobrevive a la apertura 5x5 x2
+
+
+@dataclass
+class SceneConfig:
+    """
+    Parámetros de las escenas.
+
+    objects: (mínimo, máximo) de figuras por escena.
+    empty: probabilidad de una escena sin figuras (mide falsos positivos).
+    min_size / max_size: radio de las figuras como fracción del lado
+    menor de la imagen.
+    min_area: área mínima de una figura (la de detect_color_shape); las
+    que quedarían por debajo no se dibujan.
+    rotation: giro máximo (grados) desde la posición recta. Con giros
+    grandes _classify_shape confunde líneas con cuadrados, porque mide
+    la proporción sobre el rectángulo alineado con los ejes.
+    noise: desviación típica del ruido gaussiano (niveles de 0-255).
+    blur: sigma del desenfoque gaussiano (0 = sin desenfoque).
+    lighting: variación de iluminación; ganancia global en
+    [1 - lighting, 1 + lighting] y un gradiente lineal de la misma
+    amplitud en una dirección aleatoria.
+    distractors: distractores por megapíxel.
+    dominant_ratio: el objeto mayor tiene al menos este factor de área
+    sobre los demás, para que el "patrón dominante" no sea ambiguo.
+    """
+    width: int = 640
+    height: int = 480
+    objects: Tuple[int, int] = (1, 3)
+    empty: float = 0.1
+    min_size: float = 0.1
+    max_size: float = 0.22
+    min_area: float = 1000.0
+    rotation: float = 45.0
+    noise: float = 4.0
+    blur: float = 0.0
+    lighting: float = 0.2
+    distractors: float = 20.0
+    dominant_ratio: float = 1.5
+    colors: Sequence[str] = field(default_factory=lambda: tuple(COLOR_RANGES))
+    shapes: Sequence[str] = SHAPES
+
+
+@dataclass
+class GroundTruth:
+    color: str
+    shape: str
+    label: str
+    area: float
+    center: Tuple[int, int]
+    bbox: Tuple[int, int, int, int]   # x, y, w, h
+
+
+@dataclass
+class Scene:
+    index: int
+    frame: np.ndarray
+    objects: List[GroundTruth]
+
+    @property
+    def dominant(self) -> Optional[GroundTruth]:
+        """Objeto de mayor área (el que debe devolver detect_color_shape)."""
+        return max(self.objects, key=lambda o: o.area) if self.objects else None
+
+
+# ----------------------------
+# Geometría
+# ----------------------------
+
+def _polygon(center: Tuple[float, float], radius: float, angles: np.ndarray) -> np.ndarray:
+    cx, cy = center
+    pts = np.stack([cx + radius * np.cos(angles), cy + radius * np.sin(angles)], axis=1)
+    return np.round(pts).astype(np.int32)
+
+
+def _shape_points(
+    shape: str,
+    center: Tuple[float, float],
+    radius: float,
+    rng: np.random.Generator,
+    rotation: float = 180.0
+) -> np.ndarray:
+    """
+    Polígono de la figura (los círculos, como polígono fino), girado
+    hasta ±rotation grados desde su posición recta.
+    """
+    theta = np.radians(rng.uniform(-rotation, rotation))
+    if shape == "circle":
+        return _polygon(center, radius, np.linspace(0, 2 * np.pi, 64, endpoint=False))
+    if shape == "square":
+        return _polygon(center, radius, theta + np.pi / 4 + np.arange(4) * np.pi / 2)
+    if shape == "triangle":
+        jitter = rng.uniform(-0.1, 0.1, 3)
+        return _polygon(center, radius, theta - np.pi / 2 + np.arange(3) * 2 * np.pi / 3 + jitter)
+    if shape == "line":
+        # Horizontal o vertical
+        theta += rng.integers(2) * np.pi / 2
+        thickness = max(LINE_MIN_THICKNESS, 2 * radius / rng.uniform(*LINE_RATIO))
+        box = ((center[0], center[1]), (2 * radius, thickness), np.degrees(theta))
+        return np.round(cv2.boxPoints(box)).astype(np.int32)
+    raise ValueError(f"Forma desconocida: {shape}")
+
+
+def _color_bgr(color: str, rng: np.random.Generator) -> Tuple[int, int, int]:
+    """Color BGR aleatorio dentro de uno de los rangos HSV de color."""
+    (h_lo, s_lo, v_lo), (h_hi, s_hi, v_hi) = COLOR_RANGES[color][rng.integers(len(COLOR_RANGES[color]))]
+    hue = rng.integers(min(h_lo + HUE_MARGIN, 179), max(h_hi - HUE_MARGIN, h_lo + HUE_MARGIN + 1))
+    sat = rng.integers(max(SAT_RANGE[0], s_lo), min(SAT_RANGE[1], s_hi) + 1)
+    val = rng.integers(max(VAL_RANGE[0], v_lo), min(VAL_RANGE[1], v_hi) + 1)
+    hsv = np.array([[[min(hue, 179), sat, val]]], np.uint8)
+    return tuple(int(c) for c in cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0])
+
+
+def _free_spot(
+    rng: np.random.Generator,
+    radius: float,
+    width: int,
+    height: int,
+    placed: List[Tuple[float, float, float]],
+    margin: float,
+    tries: int = 30
+) -> Optional[Tuple[float, float]]:
+    """Centro al azar cuyo círculo no toca el borde ni los ya colocados."""
+    if 2 * (radius + margin) >= min(width, height):
+        return None
+    for _ in range(tries):
+        cx = rng.uniform(radius + margin, width - radius - margin)
+        cy = rng.uniform(radius + margin, height - radius - margin)
+        if all((cx - x) ** 2 + (cy - y) ** 2 > (radius + r + margin) ** 2 for x, y, r in placed):
+            return cx, cy
+    return None
+
+
+# ----------------------------
+# Render
+# ----------------------------
+
+def _draw_distractors(
+    frame: np.ndarray,
+    config: SceneConfig,
+    rng: np.random.Generator,
+    placed: List[Tuple[float, float, float]]
+):
+    h, w = frame.shape[:2]
+    n = rng.poisson(config.distractors * w * h / 1e6)
+    side = min(w, h)
+    for _ in range(n):
+        if rng.random() < 0.5:
+            # Mancha sin saturación (cualquier tamaño): no es de ningún color
+            radius = rng.uniform(0.02, 0.12) * side
+            level = int(rng.integers(20, 236))
+            tint = rng.integers(-12, 13, 3)
+            color = tuple(int(np.clip(level + t, 0, 255)) for t in tint)
+            spot = (rng.uniform(0, w), rng.uniform(0, h))
+            shape = SHAPES[rng.integers(len(SHAPES))]
+            cv2.fillPoly(frame, [_shape_points(shape, spot, radius, rng)], color)
+        else:
+            # Mota de color: la apertura morfológica debe eliminarla
+            radius = rng.uniform(1.5, 4.0)
+            spot = _free_spot(rng, radius, w, h, placed, margin=12)
+            if spot is not None:
+                color = _color_bgr(config.colors[rng.integers(len(config.colors))], rng)
+                cv2.circle(frame, (int(spot[0]), int(spot[1])), int(radius), color, -1)
+
+
+NOISE_POOL_PAD = 64   # margen del banco de ruido para desplazar la ventana
+
+
+def make_noise_pool(config: SceneConfig, rng: np.random.Generator) -> np.ndarray:
+    """
+    Banco de ruido gaussiano algo mayor que un frame (filas x columnas
+    * canales). Cada escena toma una ventana en una posición aleatoria:
+    generar ruido nuevo por frame era ~90% del coste del render.
+    """
+    h = config.height + NOISE_POOL_PAD
+    w = (config.width + NOISE_POOL_PAD) * 3
+    return rng.standard_normal((h, w), dtype=np.float32) * np.float32(config.noise)
+
+
+def _apply_camera(
+    frame: np.ndarray,
+    config: SceneConfig,
+    rng: np.random.Generator,
+    noise_pool: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Iluminación, desenfoque y ruido."""
+    h, w = frame.shape[:2]
+    if config.blur > 0:
+        frame = cv2.GaussianBlur(frame, (0, 0), config.blur)
+    if config.lighting <= 0 and config.noise <= 0:
+        return frame
+
+    out = frame.astype(np.float32)
+    if config.lighting > 0:
+        gain = rng.uniform(1 - config.lighting, 1 + config.lighting)
+        angle = rng.uniform(0, 2 * np.pi)
+        ramp_x = np.linspace(-0.5, 0.5, w, dtype=np.float32) * np.float32(config.lighting * np.cos(angle))
+        ramp_y = np.linspace(-0.5, 0.5, h, dtype=np.float32) * np.float32(config.lighting * np.sin(angle))
+        light = np.float32(gain) * (1 + ramp_y[:, None] + ramp_x[None, :])
+        cv2.multiply(out, cv2.merge([light, light, light]), dst=out)
+    if config.noise > 0:
+        if noise_pool is None:
+            noise_pool = make_noise_pool(config, rng)
+        dy = int(rng.integers(noise_pool.shape[0] - h + 1))
+        dx = int(rng.integers(noise_pool.shape[1] - 3 * w + 1))
+        flat = out.reshape(h, 3 * w)
+        cv2.add(flat, noise_pool[dy:dy + h, dx:dx + 3 * w], dst=flat)
+    return np.clip(out, 0, 255, out=out).astype(np.uint8)
+
+
+def render_scene(
+    config: SceneConfig,
+    rng: np.random.Generator,
+    index: int = 0,
+    noise_pool: Optional[np.ndarray] = None
+) -> Scene:
+    """
+    Una escena aleatoria con su verdad de referencia. noise_pool: ver
+    make_noise_pool (sin él, ruido nuevo en cada escena).
+    """
+    w, h = config.width, config.height
+    side = min(w, h)
+    frame = np.empty((h, w, 3), np.uint8)
+    frame[:] = int(rng.integers(70, 190))
+
+    n_objects = 0 if rng.random() < config.empty else int(rng.integers(config.objects[0], config.objects[1] + 1))
+    radii = np.sort(rng.uniform(config.min_size, config.max_size, n_objects) * side)[::-1]
+
+    # Se colocan primero (para que las motas eviten las figuras) y se
+    # dibujan después de los distractores (encima de ellos)
+    planned = []
+    placed: List[Tuple[float, float, float]] = []
+    max_area = None
+    for radius in radii:
+        shape = config.shapes[rng.integers(len(config.shapes))]
+        color = config.colors[rng.integers(len(config.colors))]
+        spot = _free_spot(rng, radius, w, h, placed, margin=8)
+        if spot is None:
+            continue
+        pts = _shape_points(shape, spot, radius, rng, config.rotation)
+        area = cv2.contourArea(pts)
+        if max_area is not None:
+            # Los secundarios se encogen hasta dejar claro el dominante
+            while area * config.dominant_ratio > max_area and area >= config.min_area:
+                radius *= 0.85
+                pts = _shape_points(shape, spot, radius, rng, config.rotation)
+                area = cv2.contourArea(pts)
+        if area < config.min_area:
+            continue
+        if max_area is None:
+            max_area = area
+        placed.append((spot[0], spot[1], radius))
+        planned.append((shape, color, pts, area))
+
+    _draw_distractors(frame, config, rng, placed)
+
+    objects: List[GroundTruth] = []
+    for shape, color, pts, area in planned:
+        cv2.fillPoly(frame, [pts], _color_bgr(color, rng), lineType=cv2.LINE_8)
+        m = cv2.moments(pts)
+        objects.append(GroundTruth(
+            color=color,
+            shape=shape,
+            label=f"{color}_{shape}",
+            area=float(area),
+            center=(int(m["m10"] / m["m00"]), int(m["m01"] / m["m00"])),
+            bbox=tuple(int(v) for v in cv2.boundingRect(pts)),
+        ))
+
+    return Scene(index=index, frame=_apply_camera(frame, config, rng, noise_pool), objects=objects)
+
+
+def generate_scenes(
+    config: Optional[SceneConfig] = None,
+    count: Optional[int] = None,
+    seed: int = 0
+) -> Iterator[Scene]:
+    """Escenas una a una (count=None: sin fin)."""
+    config = config or SceneConfig()
+    rng = np.random.default_rng(seed)
+    noise_pool = make_noise_pool(config, rng) if config.noise > 0 else None
+    index = 0
+    while count is None or index < count:
+        yield render_scene(config, rng, index, noise_pool)
+        index += 1
@@ -1,20 +1,50 @@
 # test_password_sequence.py
 
+import argparse
+
 import cv2
-from color_shape_detector import detect_color_shape, draw_detected_pattern
+import frame_source
+import metrics
+import motion_gate
+from metrics import METRICS
+from overlay import OverlayCompositor, TextStyle
+from password_engine import DEFAULT_USER, PasswordEngine
+from pipeline import LivePipeline
+from roi_tracker import ColorShapeTracker
+import undistort
+
+# Define aquí tu contraseña (orden de patrones)
+PASSWORD = [
+    "red_circle",
+    "blue_triangle",
+    "green_square",
+    "yellow_line",
+]
 
 
 class PatternPasswordSystem:
-    def __init__(self, password_sequence):
+    def __init__(self, password_sequence=None, engine=None):
         """
         password_sequence: lista de labels, ej:
         ["red_circle", "blue_triangle", "green_square", "yellow_line"]
+        engine: PasswordEngine compartido con las contraseñas de varios
+        usuarios (en lugar de password_sequence). Si la contraseña de un
+        usuario es prefijo de la de otro, gana siempre la más corta.
         """
-        self.password = password_sequence
+        if engine is None:
+            engine = PasswordEngine({DEFAULT_USER: password_sequence})
+        self.engine = engine
         self.entered = []
+        self.user = None   # usuario del último ACCESS_GRANTED
+        self._matcher = engine.matcher()
+
+    @property
+    def password(self):
+        return list(self.engine.default_sequence())
 
     def reset(self):
         self.entered = []
+        self._matcher.reset()
 
     def add_observation(self, label: str) -> str:
         """
@@ -26,14 +56,20 @@ class PatternPasswordSystem:
         """
         self.entered.append(label)
 
-        if len(self.entered) < len(self.password):
-            return "INCOMPLETE"
-
-        # Tenemos ya tantos elementos como la contraseña
-        if self.entered == self.password:
+        # Avance en el trie desde el inicio del intento
+        users = self._matcher.feed_prefix(label)
+        if users:
             result = "ACCESS_GRANTED"
+            self.user = users[0]
+        elif len(self.entered) < self.engine.max_len:
+            # Aunque ya no coincida con ninguna, no se revela hasta
+            # completar la longitud máxima
+            return "INCOMPLETE"
         else:
             result = "ACCESS_DENIED"
+            self.user = None
+
+        METRICS.inc("password_attempts", result=result)
 
         # Una vez comprobado, reseteamos para el siguiente intento
         self.reset()
@@ -43,154 +79,118 @@ class PatternPasswordSystem:
         return " - ".join(self.entered)
 
 
-def main():
-    # Define aquí tu contraseña (orden de patrones)
-    PASSWORD = [
-        "red_circle",
-        "blue_triangle",
-        "green_square",
-        "yellow_line",
-    ]
+RESULT_MESSAGES = {
+    "ACCESS_GRANTED": "ACCESO CONCEDIDO ✅",
+    "ACCESS_DENIED": "ACCESO DENEGADO ❌",
+}
+
+STYLE_MAIN = TextStyle(scale=0.7)
+STYLE_SMALL = TextStyle(scale=0.6)
+STYLE_RESULT = TextStyle(scale=0.7, color=(0, 255, 255))
+
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Contraseña por secuencia de patrones color + forma")
+    parser.add_argument("--headless", action="store_true",
+                        help="sin ventana ni teclado: cada patrón nuevo se captura automáticamente")
+    frame_source.add_arguments(parser)
+    motion_gate.add_arguments(parser)
+    metrics.add_arguments(parser)
+    undistort.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     system = PatternPasswordSystem(PASSWORD)
+    tracker = ColorShapeTracker()
+    detect = tracker.detect
+
+    # Con calibración, la forma se clasifica sobre el contorno corregido
+    # (sólo se corrigen sus puntos, no el frame completo)
+    undistorter = undistort.undistorter_from_args(args)
+    if undistorter is not None:
+        detect = lambda frame: undistorter.reclassify(tracker.detect(frame), frame.shape)
+
+    # Con la escena quieta se reutiliza la última detección
+    detect = motion_gate.wrap_from_args(args, detect)
 
-    cap = cv2.VideoCapture(0)
+    cap = frame_source.open_from_args(args)
     if not cap.isOpened():
-        print("No se ha podido abrir la cámara.")
+        print("No se ha podido abrir la fuente:", args.source)
         return
 
-    status_msg = "Pulsa 'c' para capturar, 'r' para reset, 'q' para salir."
+    dumper = metrics.setup_from_args(args)
+    if args.headless:
+        status_msg = "Modo sin pantalla: cada patrón nuevo se captura. Ctrl+C para salir."
+    else:
+        status_msg = "Pulsa 'c' para capturar, 'r' para reset, 'q' para salir."
     last_result_msg = ""
+    last_label = None
 
     print("Secuencia de contraseña:", " - ".join(PASSWORD))
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("No se pudo leer frame de la cámara.")
-            break
-
-        pattern = detect_color_shape(frame)
-        frame_vis = draw_detected_pattern(frame, pattern)
-
-        if pattern is not None:
-            detected_text = f"Actual: {pattern.label}"
-        else:
-            detected_text = "Actual: (ninguno)"
-
-        # Mensajes en pantalla
-        cv2.putText(
-            frame_vis,
-            detected_text,
-            (10, 30),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.7,
-            (0, 0, 0),
-            3,
-            cv2.LINE_AA
-        )
-        cv2.putText(
-            frame_vis,
-            detected_text,
-            (10, 30),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.7,
-            (255, 255, 255),
-            1,
-            cv2.LINE_AA
-        )
-
-        cv2.putText(
-            frame_vis,
-            status_msg,
-            (10, 60),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.6,
-            (0, 0, 0),
-            3,
-            cv2.LINE_AA
-        )
-        cv2.putText(
-            frame_vis,
-            status_msg,
-            (10, 60),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.6,
-            (255, 255, 255),
-            1,
-            cv2.LINE_AA
-        )
-
-        if last_result_msg:
-            cv2.putText(
-                frame_vis,
-                last_result_msg,
-                (10, 90),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.7,
-                (0, 0, 0),
-                3,
-                cv2.LINE_AA
-            )
-            cv2.putText(
-                frame_vis,
-                last_result_msg,
-                (10, 90),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.7,
-                (0, 255, 255),
-                1,
-                cv2.LINE_AA
-            )
-
-        # Secuencia parcial introducida
-        seq_text = "Secuencia parcial: " + system.get_entered_str()
-        cv2.putText(
-            frame_vis,
-            seq_text,
-            (10, 120),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.6,
-            (0, 0, 0),
-            3,
-            cv2.LINE_AA
-        )
-        cv2.putText(
-            frame_vis,
-            seq_text,
-            (10, 120),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.6,
-            (255, 255, 255),
-            1,
-            cv2.LINE_AA
-        )
-
-        cv2.imshow("Sistema de contraseña (color + forma)", frame_vis)
-
-        key = cv2.waitKey(1) & 0xFF
-
-        if key == ord("q"):
-            break
-
-        elif key == ord("r"):
-            system.reset()
-            last_result_msg = "Secuencia reseteada."
-
-        elif key == ord("c"):
-            if pattern is None:
-                last_result_msg = "No se ha detectado ningún patrón al capturar."
-            else:
-                result = system.add_observation(pattern.label)
-                if result == "INCOMPLETE":
-                    last_result_msg = f"Capturado: {pattern.label}"
-                elif result == "ACCESS_GRANTED":
-                    last_result_msg = "ACCESO CONCEDIDO ✅"
-                elif result == "ACCESS_DENIED":
-                    last_result_msg = "ACCESO DENEGADO ❌"
+    print(status_msg)
+
+    # Los textos se rasterizan sólo cuando cambian; status_msg, una vez
+    overlay = OverlayCompositor()
+    overlay.set_text("estado", status_msg, (10, 60), STYLE_SMALL)
+
+    # Se crea fuera del try: un Ctrl+C durante la construcción sale con
+    # su propio KeyboardInterrupt, y después pipeline siempre existe
+    pipeline = LivePipeline(cap, detect)
+    try:
+        with pipeline:
+            for frame, pattern in pipeline.results():
+                label = pattern.label if pattern is not None else None
+
+                if args.headless:
+                    # Sin teclado: se captura cada vez que aparece un patrón distinto
+                    if label is not None and label != last_label:
+                        result = system.add_observation(label)
+                        print(RESULT_MESSAGES.get(result, f"Capturado: {label}"),
+                              "| Secuencia parcial:", system.get_entered_str())
+                    last_label = label
+                    continue
+
+                overlay.draw_pattern(frame, pattern)
+                overlay.set_text("actual", f"Actual: {label}" if label else "Actual: (ninguno)",
+                                 (10, 30), STYLE_MAIN)
+                overlay.set_text("resultado", last_result_msg, (10, 90), STYLE_RESULT)
+                overlay.set_text("secuencia", "Secuencia parcial: " + system.get_entered_str(),
+                                 (10, 120), STYLE_SMALL)
+                overlay.draw(frame)
+
+                cv2.imshow("Sistema de contraseña (color + forma)", frame)
+
+                key = cv2.waitKey(1) & 0xFF
+
+                if key == ord("q"):
+                    break
+
+                elif key == ord("r"):
+                    system.reset()
+                    last_result_msg = "Secuencia reseteada."
+
+                elif key == ord("c"):
+                    if pattern is None:
+                        last_result_msg = "No se ha detectado ningún patrón al capturar."
+                    else:
+                        result = system.add_observation(pattern.label)
+                        last_result_msg = RESULT_MESSAGES.get(result, f"Capturado: {pattern.label}")
+    except KeyboardInterrupt:
+        pass
+
+    if pipeline.capture_failed:
+        print("No se pudo leer frame de la cámara.")
+    print("Frames:", pipeline.stats())
+    if isinstance(detect, motion_gate.MotionGate):
+        print("Puerta de movimiento:", detect.stats())
+    if dumper is not None:
+        dumper.stop()
 
     cap.release()
-    cv2.destroyAllWindows()
+    if not args.headless:
+        cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,244 @@
+# tiled_detector.py
+#
+# Detección de color + forma por bandas en paralelo, para frames 4K o
+# panorámicos en los que una sola pasada de blur, HSV, inRange y
+# morfología sobre la imagen entera no aprovecha más de un núcleo.
+#
+# El frame se divide en bandas horizontales con un margen (halo) de
+# filas por arriba y por abajo. Cada banda se etiqueta y se limpia en
+# un hilo del pool (las funciones de OpenCV liberan el GIL) con su
+# propio ColorShapeDetector, y sólo sus filas interiores se copian a
+# la imagen de etiquetas completa. El halo cubre el radio de todas las
+# etapas (blur 5x5 + cuatro pasadas morfológicas de 2 iteraciones),
+# así que la imagen cosida es idéntica píxel a píxel a la del
+# detector sin bandas.
+#
+# Los contornos se extraen después sobre la imagen cosida, un color
+# por tarea: un contorno que cruza una frontera entre bandas sale
+# entero y no hay que unir trozos. El resultado es el mismo
+# DetectedPattern (etiqueta, área, centro y contorno) que
+# detect_color_shape(frame, min_area, use_bgr_lut).
+#
+# Ejemplo (desde la raíz del repositorio): comprueba la equivalencia
+# con data/*.jpg escaladas x2 (4K) y mide la latencia por frame.
+#   python src/tiled_detector.py "data/*.jpg" --upscale 2 --workers 4
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from color_shape_detector import (
+    KERNEL,
+    ColorShapeDetector,
+    DetectedPattern,
+    _patterns_from_mask,
+    _sample_labels,
+    _sample_stride,
+    detect_color_shape,
+)
+from metrics import METRICS
+
+BLUR_RADIUS = 2     # GaussianBlur (5, 5)
+MORPH_PASSES = 4    # erode/dilate de la apertura, dilate de la apertura, dilate y erode del cierre
+MORPH_ITERATIONS = 2
+
+
+def tile_halo(kernel: np.ndarray = KERNEL) -> int:
+    """Filas de margen para que el interior de una banda sea exacto."""
+    return BLUR_RADIUS + MORPH_PASSES * MORPH_ITERATIONS * (kernel.shape[0] // 2)
+
+
+def split_rows(height: int, tiles: int, halo: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Bandas (y0, y1, a, b): y0:y1 son las filas interiores de la banda
+    y a:b las que se procesan (interior + halo, recortado al frame).
+    """
+    tiles = max(1, min(tiles, height))
+    bounds = [round(i * height / tiles) for i in range(tiles + 1)]
+    return [
+        (y0, y1, max(0, y0 - halo), min(height, y1 + halo))
+        for y0, y1 in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+class TiledColorShapeDetector:
+    """
+    Mismo resultado que detect_color_shape(frame, min_area,
+    use_bgr_lut) (sin modo pirámide), repartiendo el etiquetado y la
+    morfología en tiles bandas sobre un pool de workers hilos.
+
+    Por defecto tiles = workers = número de núcleos. Si OpenCV ya
+    paraleliza internamente (cv2.getNumThreads() > 1) conviene
+    comparar con cv2.setNumThreads(1): las dos capas de hilos compiten
+    por los mismos núcleos.
+
+    Se usa como ColorShapeDetector (detect(frame, min_area) o como
+    detect_fn de ColorShapeTracker). Una llamada a detect() cada vez;
+    close() (o with) para el pool.
+    """
+
+    def __init__(
+        self,
+        min_area: float = 1000.0,
+        use_bgr_lut: bool = False,
+        tiles: Optional[int] = None,
+        workers: Optional[int] = None,
+        kernel: np.ndarray = KERNEL
+    ):
+        self.min_area = min_area
+        self.workers = workers or os.cpu_count() or 1
+        self.tiles = tiles or self.workers
+        self.kernel = kernel
+        self.halo = tile_halo(kernel)
+        # Un detector por banda: cada banda conserva sus buffers entre
+        # frames y nunca la procesan dos hilos a la vez
+        self._band_detectors = [ColorShapeDetector(min_area, use_bgr_lut, kernel) for _ in range(self.tiles)]
+        self.color_names = self._band_detectors[0].lut.color_names
+        self._stride = _sample_stride(kernel)
+        self._labels: Optional[np.ndarray] = None
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="tile")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "TiledColorShapeDetector":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _label_band(self, frame_bgr: np.ndarray, labels: np.ndarray, index: int, band: Tuple[int, int, int, int]):
+        y0, y1, a, b = band
+        with METRICS.time("color.tiled_band"):
+            clean = self._band_detectors[index].label_image(frame_bgr[a:b])
+            labels[y0:y1] = clean[y0 - a:y1 - a]
+
+    def label_image(self, frame_bgr: np.ndarray) -> np.ndarray:
+        """
+        Imagen de etiquetas limpia del frame completo, cosida desde las
+        bandas. Buffer interno: válida hasta la siguiente llamada.
+        """
+        h, w = frame_bgr.shape[:2]
+        if self._labels is None or self._labels.shape != (h, w):
+            self._labels = np.empty((h, w), np.uint8)
+        labels = self._labels
+
+        bands = split_rows(h, self.tiles, self.halo)
+        futures = [
+            self._executor.submit(self._label_band, frame_bgr, labels, i, band)
+            for i, band in enumerate(bands)
+        ]
+        for future in futures:
+            future.result()
+        return labels
+
+    def _color_candidates(self, labels: np.ndarray, color_idx: int, color_name: str, min_area: float):
+        mask = cv2.compare(labels, color_idx, cv2.CMP_EQ)
+        return _patterns_from_mask(mask, color_name, min_area)
+
+    def detect(self, frame_bgr: np.ndarray, min_area: Optional[float] = None) -> Optional[DetectedPattern]:
+        if frame_bgr is None or frame_bgr.size == 0:
+            return None
+        if min_area is None:
+            min_area = self.min_area
+
+        with METRICS.time("color.tiled_label"):
+            labels = self.label_image(frame_bgr)
+
+        # Presencia muestreada como en _candidates_from_labels; después
+        # un color por tarea, en el orden de color_names
+        s = self._stride
+        present = np.bincount(_sample_labels(labels, s).ravel(), minlength=len(self.color_names) + 1)
+        with METRICS.time("color.tiled_contours"):
+            futures = [
+                self._executor.submit(self._color_candidates, labels, color_idx, color_name, min_area)
+                for color_idx, color_name in enumerate(self.color_names, start=1)
+                if present[color_idx]
+            ]
+            candidates = [p for future in futures for p in future.result()]
+
+        best = max(candidates, key=lambda p: p.area) if candidates else None
+        if METRICS.enabled:
+            METRICS.inc("detections", detector="color", label=best.label if best is not None else "none")
+        return best
+
+    __call__ = detect
+
+
+# ----------------------------
+# Programa
+# ----------------------------
+
+def same_pattern(a: Optional[DetectedPattern], b: Optional[DetectedPattern]) -> bool:
+    if a is None or b is None:
+        return a is b
+    return (a.label == b.label and a.area == b.area and a.center == b.center
+            and np.array_equal(a.contour, b.contour))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detección por bandas: equivalencia y latencia")
+    parser.add_argument("images", nargs="?", default="data/*.jpg")
+    parser.add_argument("--upscale", type=float, default=2.0, help="factor de escala de las imágenes (2 = 4K)")
+    parser.add_argument("--workers", type=int, default=None, help="hilos (por defecto, núcleos)")
+    parser.add_argument("--tiles", type=int, default=None, help="bandas (por defecto, hilos)")
+    parser.add_argument("--bgr-lut", action="store_true", help="etiquetar con la LUT BGR")
+    parser.add_argument("--repeat", type=int, default=2)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = sorted(glob.glob(args.images))
+    if not paths:
+        print("No se han encontrado imágenes en", args.images)
+        return 1
+
+    frames = []
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is not None and args.upscale != 1.0:
+            frame = cv2.resize(frame, None, fx=args.upscale, fy=args.upscale, interpolation=cv2.INTER_LINEAR)
+        if frame is not None:
+            frames.append(frame)
+    h, w = frames[0].shape[:2]
+
+    def best_ms(fn) -> float:
+        fn(frames[0])
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            for frame in frames:
+                fn(frame)
+            best = min(best, (time.perf_counter() - t0) / len(frames))
+        return 1000 * best
+
+    with TiledColorShapeDetector(use_bgr_lut=args.bgr_lut, tiles=args.tiles, workers=args.workers) as tiled:
+        mismatches = [
+            path for path, frame in zip(paths, frames)
+            if not same_pattern(detect_color_shape(frame, 1000.0, args.bgr_lut), tiled(frame))
+        ]
+        print(f"{len(frames)} imágenes {w}x{h}, {tiled.tiles} bandas (halo {tiled.halo}), "
+              f"{tiled.workers} hilos, OpenCV con {cv2.getNumThreads()} hilos")
+        print(f"detect_color_shape:      {best_ms(lambda f: detect_color_shape(f, 1000.0, args.bgr_lut)):8.2f} ms/frame")
+        single = ColorShapeDetector(use_bgr_lut=args.bgr_lut)
+        print(f"ColorShapeDetector:      {best_ms(single):8.2f} ms/frame")
+        print(f"TiledColorShapeDetector: {best_ms(tiled):8.2f} ms/frame")
+
+    print(f"resultados distintos: {len(mismatches)}")
+    for path in mismatches:
+        print("  ", path)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
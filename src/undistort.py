@@ -0,0 +1,191 @@
+# undistort.py
+#
+# Carga de la calibración guardada por calibracion.py y corrección de
+# la distorsión para los pipelines en vivo:
+#   - frame completo con cv2.remap y mapas precalculados (uno por
+#     resolución, se construyen una vez y se reutilizan);
+#   - sólo los puntos del contorno detectado (cv2.undistortPoints),
+#     para clasificar la forma con la geometría corregida a coste
+#     casi nulo.
+
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple
+import datetime
+import json
+import os
+
+import cv2
+import numpy as np
+
+from color_shape_detector import DetectedPattern, _classify_shape
+
+CALIBRATION_FORMAT = "color_shape_detector/calibration"
+CALIBRATION_VERSION = 1
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibracion.json")
+
+
+# ----------------------------
+# Fichero de calibración
+# ----------------------------
+
+@dataclass
+class CameraCalibration:
+    camera_matrix: np.ndarray       # 3x3
+    dist_coeffs: np.ndarray         # 1xN
+    image_size: Tuple[int, int]     # (width, height) de las imágenes de calibración
+    rms: float
+    pattern_size: Optional[Tuple[int, int]] = None
+    n_views: int = 0
+
+
+def save_calibration(path: str, calib: CameraCalibration):
+    """
+    Guarda la calibración en JSON con número de versión. Se escribe en
+    un temporal y se renombra, así un lector nunca ve un fichero a medias.
+    """
+    data = {
+        "format": CALIBRATION_FORMAT,
+        "version": CALIBRATION_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "image_size": list(calib.image_size),
+        "camera_matrix": np.asarray(calib.camera_matrix, dtype=np.float64).tolist(),
+        "dist_coeffs": np.asarray(calib.dist_coeffs, dtype=np.float64).ravel().tolist(),
+        "rms": float(calib.rms),
+        "pattern_size": list(calib.pattern_size) if calib.pattern_size else None,
+        "n_views": int(calib.n_views),
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_calibration(path: str = CALIBRATION_FILE) -> CameraCalibration:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    if data.get("format") != CALIBRATION_FORMAT:
+        raise ValueError(f"{path} no es un fichero de calibración")
+    version = data.get("version")
+    if not isinstance(version, int) or version > CALIBRATION_VERSION:
+        raise ValueError(f"Versión de calibración no soportada: {version} (máxima {CALIBRATION_VERSION})")
+
+    return CameraCalibration(
+        camera_matrix=np.array(data["camera_matrix"], dtype=np.float64).reshape(3, 3),
+        dist_coeffs=np.array(data["dist_coeffs"], dtype=np.float64).reshape(1, -1),
+        image_size=tuple(data["image_size"]),
+        rms=float(data["rms"]),
+        pattern_size=tuple(data["pattern_size"]) if data.get("pattern_size") else None,
+        n_views=int(data.get("n_views", 0)),
+    )
+
+
+# ----------------------------
+# Corrección de la distorsión
+# ----------------------------
+
+class Undistorter:
+    """
+    Corrige la distorsión con los parámetros de una CameraCalibration.
+
+    Si el frame tiene otra resolución que las imágenes de calibración
+    (mismo encuadre, distinta escala), la matriz de cámara se escala.
+    alpha se pasa a getOptimalNewCameraMatrix (0 = sin bordes negros,
+    1 = se conserva todo el campo de visión); con None se usa la
+    propia matriz de cámara.
+    """
+
+    def __init__(self, calib: CameraCalibration, alpha: Optional[float] = None):
+        self.calib = calib
+        self.alpha = alpha
+        self._cameras: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+        self._maps: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _camera_for(self, size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(K, new_K) para la resolución (width, height)."""
+        cams = self._cameras.get(size)
+        if cams is None:
+            calib_w, calib_h = self.calib.image_size
+            K = self.calib.camera_matrix.copy()
+            K[0] *= size[0] / calib_w
+            K[1] *= size[1] / calib_h
+            K[2] = (0.0, 0.0, 1.0)
+            if self.alpha is None:
+                new_K = K
+            else:
+                new_K, _ = cv2.getOptimalNewCameraMatrix(K, self.calib.dist_coeffs, size, self.alpha, size)
+            cams = (K, new_K)
+            self._cameras[size] = cams
+        return cams
+
+    def _maps_for(self, size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        maps = self._maps.get(size)
+        if maps is None:
+            K, new_K = self._camera_for(size)
+            # CV_16SC2: mapas en punto fijo, remap más rápido que con float32
+            maps = cv2.initUndistortRectifyMap(K, self.calib.dist_coeffs, None, new_K, size, cv2.CV_16SC2)
+            self._maps[size] = maps
+        return maps
+
+    def undistort_frame(self, frame: np.ndarray) -> np.ndarray:
+        size = (frame.shape[1], frame.shape[0])
+        map1, map2 = self._maps_for(size)
+        return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR)
+
+    def undistort_points(self, points: np.ndarray, frame_shape: Tuple[int, ...]) -> np.ndarray:
+        """Puntos Nx1x2 (o Nx2) en píxeles -> Nx1x2 float32 en píxeles corregidos."""
+        size = (frame_shape[1], frame_shape[0])
+        K, new_K = self._camera_for(size)
+        pts = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+        return cv2.undistortPoints(pts, K, self.calib.dist_coeffs, P=new_K)
+
+    def reclassify(self, pattern: Optional[DetectedPattern], frame_shape: Tuple[int, ...]) -> Optional[DetectedPattern]:
+        """
+        Vuelve a clasificar la forma con el contorno corregido. El
+        contorno y el centro se mantienen en coordenadas de la imagen
+        original (para dibujar y para el seguimiento por ROI); forma,
+        etiqueta y área pasan a ser las de la geometría corregida.
+        Si el contorno corregido no es ninguna forma conocida devuelve
+        None: la etiqueta de la imagen distorsionada es justo la que la
+        calibración corrige.
+        """
+        if pattern is None:
+            return None
+        contour = np.round(self.undistort_points(pattern.contour, frame_shape)).astype(np.int32)
+        area = cv2.contourArea(contour)
+        shape = _classify_shape(contour, area)
+        if shape is None:
+            return None
+        return replace(
+            pattern,
+            shape=shape,
+            label=f"{pattern.color}_{shape}",
+            area=area,
+        )
+
+
+def load_undistorter(path: Optional[str], alpha: Optional[float] = None) -> Optional[Undistorter]:
+    """
+    Undistorter a partir del fichero de calibración, o None sin fichero
+    (los pipelines en vivo funcionan igual sin calibrar). La corrección
+    es explícita: un path que no existe es un error, no se ignora.
+    """
+    if path is None:
+        return None
+    return Undistorter(load_calibration(path), alpha)
+
+
+def add_arguments(parser):
+    """Opción --calibration común a los programas en vivo."""
+    parser.add_argument("--calibration", default=None, metavar="FICHERO.json",
+                        help="corregir la distorsión con esta calibración (de calibracion.py -o)")
+
+
+def undistorter_from_args(args) -> Optional[Undistorter]:
+    """Undistorter según --calibration (None sin la opción)."""
+    undistorter = load_undistorter(args.calibration)
+    if undistorter is not None:
+        print("Usando calibración:", args.calibration, undistorter.calib.image_size,
+              f"rms={undistorter.calib.rms:.3f}")
+    return undistorter
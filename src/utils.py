@@ -1,35 +1,105 @@
 import cv2
 import numpy as np
 
-    
-def detect_pattern(frame):
-    # Conversión a gris
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+from metrics import timed
+from pyramid import refine_roi, scaled_kernel
 
-    # Umbralización (Otsu)
-    _, thresh = cv2.threshold(gray, 0, 255,
-                              cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+KERNEL = np.ones((5, 5), np.uint8)
 
+
+def _clean_thresh(thresh, kernel=KERNEL):
     # Morfología para limpiar ruido
-    kernel = np.ones((5, 5), np.uint8)
     thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
     thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+    return thresh
+
 
+def _largest_contour(thresh, min_area):
     # Buscar contornos
     cnts, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL,
                                cv2.CHAIN_APPROX_SIMPLE)
 
     if len(cnts) == 0:
-        return None
+        return None, 0.0
 
     # Elegir el contorno más grande
     c = max(cnts, key=cv2.contourArea)
     area = cv2.contourArea(c)
 
     # Si el objeto es demasiado pequeño → no hay patrón válido
-    if area < 1000:
+    if area < min_area:
+        return None, area
+
+    return c, area
+
+
+@timed("pattern.find_largest_contour")
+def find_largest_contour(frame, min_area, pyramid_scale=1.0, full_thresh=True):
+    """
+    Umbraliza la imagen (Otsu) y devuelve (contorno, área, thresh)
+    del objeto más grande, o (None, área, thresh) si no supera min_area.
+
+    Con pyramid_scale < 1 la búsqueda se hace en la imagen reducida
+    (kernel y área escalados) y sólo el contorno ganador se refina a
+    resolución completa con el mismo umbral de Otsu; si ahí no supera
+    min_area no hay contorno. Si full_thresh
+    es False, thresh se devuelve a la resolución reducida.
+    """
+    if pyramid_scale >= 1.0:
+        # Conversión a gris
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        # Umbralización (Otsu)
+        _, thresh = cv2.threshold(gray, 0, 255,
+                                  cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        thresh = _clean_thresh(thresh)
+        c, area = _largest_contour(thresh, min_area)
+        return c, area, thresh
+
+    scale = pyramid_scale
+    small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    gray_small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    otsu, thresh_small = cv2.threshold(gray_small, 0, 255,
+                                       cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    thresh_small = _clean_thresh(thresh_small, scaled_kernel(scale, KERNEL))
+    c, area = _largest_contour(thresh_small, min_area * scale * scale)
+
+    thresh = thresh_small
+    if full_thresh:
+        frame_h, frame_w = frame.shape[:2]
+        thresh = cv2.resize(thresh_small, (frame_w, frame_h), interpolation=cv2.INTER_NEAREST)
+    if c is None:
+        return None, area / (scale * scale), thresh
+
+    # Refinamiento a resolución completa alrededor del ganador
+    x0, y0, x1, y1 = refine_roi(cv2.boundingRect(c), scale, frame.shape)
+    gray_roi = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+    _, thresh_roi = cv2.threshold(gray_roi, otsu, 255, cv2.THRESH_BINARY_INV)
+    thresh_roi = _clean_thresh(thresh_roi)
+    if full_thresh:
+        thresh[y0:y1, x0:x1] = thresh_roi
+
+    # Un ganador que no se confirma a resolución completa se descarta,
+    # como en _detect_color_shape_pyramid
+    c_full, area_full = _largest_contour(thresh_roi, min_area)
+    if c_full is None:
+        return None, area_full, thresh
+    return c_full + np.array([x0, y0], dtype=c_full.dtype), area_full, thresh
+
+
+MIN_AREA = 1000
+
+
+@timed("letter.detect_pattern")
+def detect_pattern(frame, pyramid_scale=1.0, min_area=MIN_AREA):
+    c, area, _ = find_largest_contour(frame, min_area, pyramid_scale, full_thresh=False)
+    if c is None:
         return None
+    return classify_contour(c, area)
+
 
+def classify_contour(c, area):
+    """Letra 'A'..'D' del contorno, o None; compartido con detectors.py."""
     # Bounding box para medidas geométricas
     x, y, w, h = cv2.boundingRect(c)
     aspect_ratio = w / h
@@ -0,0 +1,11 @@
+# conftest.py
+#
+# Los módulos viven planos en src/ y se importan por nombre
+# (from color_shape_detector import ...), como hacen los scripts.
+
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
@@ -0,0 +1,50 @@
+# test_calibracion.py
+#
+# La búsqueda en dos etapas (--coarse-scale) debe dar las mismas
+# esquinas que la búsqueda a resolución completa, también en las vistas
+# en las que la semilla reducida cae lejos o sale en sentido inverso.
+
+import os
+
+import numpy as np
+import pytest
+
+from calibracion import canonical_corner_order, detect_image_corners, grid_bend, GRID_MAX_BEND
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Semilla desplazada (19_34_16, 19_34_25 (2)), esquina equivocada
+# (19_55_36) y rejilla en sentido inverso (19_52_30, 19_55_57)
+VIEWS = [
+    "WIN_20251125_19_34_16_Pro.jpg",
+    "WIN_20251125_19_34_25_Pro (2).jpg",
+    "WIN_20251125_19_55_36_Pro.jpg",
+    "WIN_20251125_19_52_30_Pro.jpg",
+    "WIN_20251125_19_55_57_Pro.jpg",
+]
+
+
+@pytest.mark.parametrize("name", VIEWS)
+def test_two_stage_matches_full_resolution(name):
+    path = os.path.join(DATA, name)
+    if not os.path.exists(path):
+        pytest.skip(f"{name} no está en data/")
+    full = detect_image_corners(path)
+    two_stage = detect_image_corners(path, coarse_scale=0.5)
+    assert full.found and two_stage.found
+    assert np.abs(full.corners - two_stage.corners).max() < 0.1
+
+
+def test_canonical_order_starts_near_origin():
+    xs, ys = np.meshgrid(np.arange(7) * 30.0 + 100, np.arange(9) * 30.0 + 50)
+    grid = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2).astype(np.float32)
+    assert np.array_equal(canonical_corner_order(grid[::-1]), grid)
+    assert canonical_corner_order(grid) is grid
+
+
+def test_grid_bend_flags_misplaced_corner():
+    xs, ys = np.meshgrid(np.arange(7) * 30.0, np.arange(9) * 30.0)
+    grid = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2).astype(np.float32)
+    assert grid_bend(grid) < 1e-6
+    grid[30, 0] += (12.0, -9.0)
+    assert grid_bend(grid) > GRID_MAX_BEND
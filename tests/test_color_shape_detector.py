@@ -0,0 +1,86 @@
+# test_color_shape_detector.py
+#
+# La limpieza sobre la imagen de etiquetas debe dar lo mismo que
+# limpiar cada máscara de color por separado (_build_color_mask),
+# también con colores distintos pegados entre sí. La LUT BGR debe dar
+# las mismas etiquetas que el camino HSV.
+
+import cv2
+import numpy as np
+import pytest
+
+from color_shape_detector import (
+    ColorShapeDetector,
+    _build_color_mask,
+    _build_label_image,
+    _build_label_image_bgr,
+    _clean_label_image,
+    get_bgr_lut,
+    get_color_lut,
+)
+
+RED = (0, 0, 255)
+GREEN = (0, 255, 0)
+BLUE = (255, 0, 0)
+
+
+def _hsv(frame):
+    return cv2.cvtColor(cv2.GaussianBlur(frame, (5, 5), 0), cv2.COLOR_BGR2HSV)
+
+
+def _assert_per_color(frame):
+    hsv = _hsv(frame)
+    names = get_color_lut().color_names
+    labels = _clean_label_image(_build_label_image(hsv, get_color_lut()))
+    for idx, name in enumerate(names, start=1):
+        expected = _build_color_mask(hsv, name) > 0
+        assert np.array_equal(labels == idx, expected), name
+    assert np.array_equal(ColorShapeDetector().label_image(frame), labels)
+
+
+@pytest.mark.parametrize("gap", [1, 3, 6, 9, 14])
+def test_adjacent_colors_keep_their_gap(gap):
+    frame = np.full((200, 300, 3), 128, np.uint8)
+    cv2.rectangle(frame, (20, 50), (100, 130), RED, -1)
+    cv2.rectangle(frame, (101 + gap, 50), (181 + gap, 130), BLUE, -1)
+    _assert_per_color(frame)
+
+
+def test_interleaved_colors():
+    # Peine de dos colores: los huecos entre dientes de colores
+    # distintos no deben rellenarse con ninguno
+    frame = np.full((240, 320, 3), 128, np.uint8)
+    for i, x in enumerate(range(20, 300, 24)):
+        cv2.rectangle(frame, (x, 40), (x + 15, 200), (RED, GREEN, BLUE)[i % 3], -1)
+    cv2.circle(frame, (160, 120), 30, GREEN, -1)
+    _assert_per_color(frame)
+
+
+def test_same_color_gap_is_closed():
+    frame = np.full((200, 300, 3), 128, np.uint8)
+    cv2.rectangle(frame, (20, 50), (100, 130), RED, -1)
+    cv2.rectangle(frame, (104, 50), (184, 130), RED, -1)
+    _assert_per_color(frame)
+    labels = _clean_label_image(_build_label_image(_hsv(frame), get_color_lut()))
+    assert labels[90, 102] == get_color_lut().color_names.index("red") + 1
+
+
+@pytest.mark.parametrize("height", [1080, 1087])
+def test_strip_on_bottom_border(height):
+    # Franja con hueco entre la última fila muestreada y el borde: la
+    # muestra de _sample_labels incluye la última fila
+    frame = np.full((height, 640, 3), 128, np.uint8)
+    frame[height - 6:, 100:400] = RED
+    frame[height - 6:, 250:252] = 128
+    _assert_per_color(frame)
+    frame[200:300, 200:300] = RED
+    _assert_per_color(frame)
+
+def test_bgr_lut_matches_hsv():
+    # Ruido: cubre buena parte del cubo, también cerca de los umbrales
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+    blurred = cv2.GaussianBlur(frame, (5, 5), 0)
+    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+    assert np.array_equal(_build_label_image_bgr(blurred, get_bgr_lut()), _build_label_image(hsv, get_color_lut()))
+    assert np.array_equal(ColorShapeDetector(use_bgr_lut=True).label_image(frame), ColorShapeDetector().label_image(frame))
@@ -0,0 +1,59 @@
+# test_detectors.py
+#
+# Los detectores del registro (detectors.py) deben dar lo mismo que las
+# funciones originales con el mismo min_area, que es lo que usan
+# batch_detect --min-area y shm_ring. En modo pirámide, un objeto que
+# sólo existe en la imagen reducida no se detecta.
+
+import glob
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import main
+import utils
+from detectors import Detector
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+PATHS = sorted(glob.glob(os.path.join(DATA, "*.jpg")))[::6]
+
+
+@pytest.mark.skipif(not PATHS, reason="data/*.jpg no disponible")
+@pytest.mark.parametrize("min_area", [50.0, 800.0, 1e9])
+def test_min_area_reaches_threshold_detectors(min_area):
+    pattern = Detector("pattern", min_area=min_area)
+    letter = Detector("letter", min_area=min_area)
+    for path in PATHS:
+        frame = cv2.imread(path)
+        assert pattern(frame)[0] == main.detect_pattern(frame, min_area=min_area)[0]
+        assert letter(frame) == utils.detect_pattern(frame, min_area=min_area)
+        if min_area == 1e9:
+            assert pattern(frame)[0] is None and letter(frame) is None
+
+
+def test_pyramid_drops_blob_missing_at_full_resolution():
+    # Líneas de 1 px: reducidas a 0.25 son una mancha gris que supera el
+    # área mínima; a resolución completa la apertura las borra
+    frame = np.full((400, 400, 3), 255, np.uint8)
+    frame[100:300, 100:300:3] = 0
+    assert utils.find_largest_contour(frame, 1000, 0.25)[0] is None
+    assert utils.detect_pattern(frame, 0.25) is None
+    assert main.detect_pattern(frame, 0.25)[0] is None
+    assert Detector("pattern", pyramid_scale=0.25)(frame)[0] is None
+    assert Detector("letter", pyramid_scale=0.25)(frame) is None
+
+
+def test_color_detector_created_only_for_color_path():
+    frame = np.full((120, 160, 3), 255, np.uint8)
+    pattern = Detector("pattern")
+    pattern(frame)
+    assert pattern._color_detector is None
+    color = Detector("color")
+    assert color._color_detector is None
+    color(frame)
+    first = color._color_detector
+    assert first is not None
+    color(frame)
+    assert color._color_detector is first
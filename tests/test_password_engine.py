@@ -0,0 +1,141 @@
+# test_password_engine.py
+#
+# PasswordEngine / PasswordMatcher frente a una búsqueda por fuerza
+# bruta sobre lo observado: feed() (sufijos, con enlaces de fallo),
+# feed_prefix() (intentos anclados al inicio, gana la secuencia más
+# corta) y usuarios añadidos o quitados en caliente.
+
+import random
+
+import pytest
+
+from DetectorContrasena import DetectorContrasena
+from password_engine import DEFAULT_USER, PasswordEngine
+from test_password_sequence import PatternPasswordSystem
+
+LABELS = "ABCD"
+
+
+class BruteForce:
+    """Lo mismo que PasswordMatcher, comparando con todas las secuencias."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.users = engine.users
+        self.buffer = []
+        self.entered = []
+        self.dead = False
+
+    def _sync(self):
+        # El matcher vuelve a la raíz si cambian los usuarios
+        if self.engine.users != self.users:
+            self.users = self.engine.users
+            self.buffer = []
+
+    def feed(self, label):
+        self._sync()
+        self.buffer.append(label)
+        found = [(u, s) for u, s in ((u, self.engine.sequence(u)) for u in self.users)
+                 if tuple(self.buffer[-len(s):]) == s]
+        if found:
+            self.buffer = []
+        # Primero la secuencia más larga, y a igual longitud por orden de alta
+        found.sort(key=lambda us: -len(us[1]))
+        return tuple(u for u, _ in found)
+
+    def reset(self):
+        self.entered = []
+        self.dead = False
+
+    def feed_prefix(self, label):
+        if self.dead:
+            return None
+        self.entered.append(label)
+        entered = tuple(self.entered)
+        sequences = {u: self.engine.sequence(u) for u in self.users}
+        if not any(s[:len(entered)] == entered for s in sequences.values()):
+            self.dead = True
+            return None
+        return tuple(u for u, s in sequences.items() if s == entered)
+
+
+def _random_users(rng, n, max_len=5):
+    return {f"u{i}": [rng.choice(LABELS) for _ in range(rng.randint(1, max_len))] for i in range(n)}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_feed_matches_brute_force(seed):
+    rng = random.Random(seed)
+    engine = PasswordEngine(_random_users(rng, rng.randint(1, 12)))
+    matcher, brute = engine.matcher(), BruteForce(engine)
+    for _ in range(400):
+        label = rng.choice(LABELS + "X")   # "X" no aparece en ninguna secuencia
+        assert matcher.feed(label) == brute.feed(label)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_feed_prefix_matches_brute_force(seed):
+    rng = random.Random(seed)
+    engine = PasswordEngine(_random_users(rng, rng.randint(1, 12), max_len=4))
+    matcher, brute = engine.matcher(), BruteForce(engine)
+    for _ in range(400):
+        label = rng.choice(LABELS)
+        got = matcher.feed_prefix(label)
+        assert got == brute.feed_prefix(label)
+        if got is None or got:
+            matcher.reset()
+            brute.reset()
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_users_changed_at_runtime(seed):
+    rng = random.Random(seed)
+    engine = PasswordEngine(_random_users(rng, 4))
+    matcher, brute = engine.matcher(), BruteForce(engine)
+    next_user = 4
+    for step in range(600):
+        if step % 37 == 0:
+            if engine.users and rng.random() < 0.4:
+                engine.remove_user(rng.choice(engine.users))
+            else:
+                engine.add_user(f"u{next_user}", [rng.choice(LABELS) for _ in range(rng.randint(1, 5))])
+                next_user += 1
+        label = rng.choice(LABELS)
+        assert matcher.feed(label) == brute.feed(label)
+
+
+def test_failure_link_keeps_overlap():
+    # "AAB" dentro de "AAAB": el fallo tras la tercera A no pierde el prefijo "AA"
+    engine = PasswordEngine({"ana": "AAB"})
+    matcher = engine.matcher()
+    assert [matcher.feed(c) for c in "AAAB"] == [(), (), (), ("ana",)]
+    assert matcher.prefix == ()
+
+
+def test_suffix_sequence_reported_with_longer_one():
+    engine = PasswordEngine({"largo": "ABCD", "corto": "CD"})
+    matcher = engine.matcher()
+    assert [matcher.feed(c) for c in "ABCD"] == [(), (), (), ("largo", "corto")]
+
+
+def test_shortest_prefix_wins():
+    engine = PasswordEngine({"largo": "ABCD", "corto": "AB"})
+    system = PatternPasswordSystem(engine=engine)
+    assert [system.add_observation(c) for c in "AB"] == ["INCOMPLETE", "ACCESS_GRANTED"]
+    assert system.user == "corto"
+
+
+def test_default_sequence_without_default_user():
+    engine = PasswordEngine({"ana": ["a", "b"], "bo": ["c"]})
+    assert PatternPasswordSystem(engine=engine).password == ["a", "b"]
+    assert DetectorContrasena(engine=engine).secuencia_correcta == ["a", "b"]
+    assert PatternPasswordSystem(engine=PasswordEngine()).password == []
+    assert PatternPasswordSystem(["x", "y"]).password == ["x", "y"]
+    assert PasswordEngine({"ana": "AB", DEFAULT_USER: "CD"}).default_sequence() == ("C", "D")
+
+
+def test_empty_sequence_rejected():
+    with pytest.raises(ValueError):
+        PasswordEngine({"ana": []})
+    with pytest.raises(KeyError):
+        PasswordEngine({"ana": "A"}).remove_user("bo")
@@ -0,0 +1,104 @@
+# test_tiled_detector.py
+#
+# TiledColorShapeDetector debe dar la misma imagen de etiquetas y el
+# mismo patrón que el detector sin bandas: en data/*.jpg a 4K, con
+# figuras que cruzan las fronteras entre bandas y con más bandas que
+# núcleos (bandas más finas que el halo).
+
+import glob
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from color_shape_detector import ColorShapeDetector, detect_color_shape
+from synthetic_scenes import SceneConfig, generate_scenes
+from tiled_detector import TiledColorShapeDetector, same_pattern, split_rows
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+PATHS = sorted(glob.glob(os.path.join(DATA, "*.jpg")))
+
+RED = (0, 0, 255)
+GREEN = (0, 255, 0)
+BLUE = (255, 0, 0)
+YELLOW = (0, 255, 255)
+
+
+def _assert_same(tiled, frame, use_bgr_lut=False):
+    reference = ColorShapeDetector(use_bgr_lut=use_bgr_lut)
+    assert np.array_equal(tiled.label_image(frame), reference.label_image(frame))
+    assert same_pattern(tiled.detect(frame), detect_color_shape(frame, tiled.min_area, use_bgr_lut))
+
+
+def _border_scene(height, width, tiles, halo):
+    """Figuras centradas en cada frontera entre bandas y en los bordes de su halo."""
+    frame = np.full((height, width, 3), 128, np.uint8)
+    colors = [RED, GREEN, BLUE, YELLOW]
+    borders = [y0 for y0, _, _, _ in split_rows(height, tiles, halo)[1:]]
+    for i, y in enumerate(borders):
+        color = colors[i % len(colors)]
+        x = 40 + (i * 90) % max(1, width - 340)
+        cv2.circle(frame, (x, y), 28, color, -1)
+        cv2.rectangle(frame, (x + 40, y - halo - 3), (x + 80, y + halo + 3), colors[(i + 1) % 4], -1)
+        # Triángulo con el vértice justo en la frontera y línea fina que la cruza
+        pts = np.array([[x + 95, y], [x + 140, y + 40], [x + 95, y + 40]], np.int32)
+        cv2.fillPoly(frame, [pts], colors[(i + 2) % 4])
+        cv2.line(frame, (x + 150, y - 30), (x + 150, y + 30), colors[(i + 3) % 4], 12)
+        # Hueco del mismo color sobre la frontera (lo cierra el cierre)
+        # y franja más fina que la apertura centrada en ella
+        cv2.rectangle(frame, (x + 170, y - 40), (x + 230, y - 4), color, -1)
+        cv2.rectangle(frame, (x + 170, y + 3), (x + 230, y + 40), color, -1)
+        cv2.rectangle(frame, (x + 240, y - 3), (x + 300, y + 3), colors[(i + 1) % 4], -1)
+    return frame
+
+
+@pytest.fixture(scope="module")
+def tiled_4():
+    with TiledColorShapeDetector(tiles=4, workers=4) as tiled:
+        yield tiled
+
+
+@pytest.mark.skipif(not PATHS, reason="data/*.jpg no disponible")
+@pytest.mark.parametrize("path", PATHS, ids=os.path.basename)
+def test_data_upscaled_matches_single_pass(path, tiled_4):
+    frame = cv2.resize(cv2.imread(path), None, fx=2.0, fy=2.0, interpolation=cv2.INTER_LINEAR)
+    _assert_same(tiled_4, frame)
+
+
+@pytest.mark.parametrize("tiles", [2, 3, 7])
+def test_shapes_across_band_borders(tiles):
+    with TiledColorShapeDetector(tiles=tiles, workers=2) as tiled:
+        frame = _border_scene(480, 640, tiles, tiled.halo)
+        _assert_same(tiled, frame)
+
+
+def test_border_scene_needs_the_halo():
+    # La escena de fronteras distingue un halo corto: si no, las
+    # comprobaciones de arriba no dirían nada del halo
+    with TiledColorShapeDetector(tiles=3, workers=2) as tiled:
+        frame = _border_scene(480, 640, 3, tiled.halo)
+        tiled.halo = 4
+        assert not np.array_equal(tiled.label_image(frame), ColorShapeDetector().label_image(frame))
+
+
+def test_more_tiles_than_cores():
+    # Bandas de 2-3 filas, mucho más finas que el halo, y más tareas
+    # que hilos en el pool
+    tiles = 4 * (os.cpu_count() or 1) + 60
+    with TiledColorShapeDetector(tiles=tiles, workers=2) as tiled:
+        frame = _border_scene(240, 400, 6, tiled.halo)
+        _assert_same(tiled, frame)
+
+
+def test_synthetic_scenes():
+    config = SceneConfig(width=800, height=600, objects=(2, 4), empty=0.0)
+    with TiledColorShapeDetector(tiles=5, workers=3) as tiled:
+        for scene in generate_scenes(config, 12, seed=3):
+            _assert_same(tiled, scene.frame)
+
+
+def test_bgr_lut():
+    frame = _border_scene(360, 640, 4, 18)
+    with TiledColorShapeDetector(use_bgr_lut=True, tiles=4, workers=2) as tiled:
+        _assert_same(tiled, frame, use_bgr_lut=True)